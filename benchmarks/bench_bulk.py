@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""
+Compare transferring many small files one at a time and as an archive.
+
+Uploads a directory of files over a latency-injecting filesystem with one
+FsContentsManager.save per file, like dragging a folder into the browser,
+and with a single upload_archive of a tar archive. Then downloads them with
+one get per file and with a single download_archive, using increasing
+values of batch_concurrency.
+
+    python benchmarks/bench_bulk.py --files 500 --latency 0.005
+"""
+
+import argparse
+from base64 import b64encode
+from collections import OrderedDict
+import io
+import json
+import sys
+import tarfile
+import time
+
+from fs import open_fs
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+
+
+def make_files(nfiles, size):
+    return OrderedDict(
+        ('d{}/file{}.txt'.format(n % 10, n), b'x' * size)
+        for n in range(nfiles))
+
+
+def make_tar(files):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w') as tf:
+        for name, data in files.items():
+            tinfo = tarfile.TarInfo(name)
+            tinfo.size = len(data)
+            tf.addfile(tinfo, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def _manager(args, concurrency):
+    cm = FsContentsManager(batch_concurrency=concurrency)
+    cm.fs = LatencyFS(open_fs('mem://'), latency=args.latency,
+                      jitter=args.jitter, seed=0)
+    return cm
+
+
+def _timed(fs, func):
+    fs.reset_calls()
+    start = time.perf_counter()
+    func()
+    return OrderedDict([
+        ('backend_calls', fs.total_calls),
+        ('time', round(time.perf_counter() - start, 4)),
+    ])
+
+
+def upload_each(cm, files):
+    cm.save({'type': 'directory'}, 'each')
+    for name in sorted({name.rsplit('/', 1)[0] for name in files}):
+        cm.save({'type': 'directory'}, 'each/' + name)
+    for name, data in files.items():
+        cm.save({'type': 'file', 'format': 'base64',
+                 'content': b64encode(data).decode('ascii')},
+                'each/' + name)
+
+
+def download_each(cm, files):
+    for name in files:
+        cm.get('each/' + name, format='base64')
+
+
+def run(args):
+    files = make_files(args.files, args.size)
+    archive = make_tar(files)
+    results = OrderedDict()
+    cm = _manager(args, 1)
+    results['save_each'] = _timed(cm.fs, lambda: upload_each(cm, files))
+    results['get_each'] = _timed(cm.fs, lambda: download_each(cm, files))
+    for concurrency in args.concurrency:
+        cm = _manager(args, concurrency)
+        results['upload_archive_{}'.format(concurrency)] = _timed(
+            cm.fs, lambda: cm.upload_archive(
+                'bulk', io.BytesIO(archive), 'tar'))
+        results['download_archive_{}'.format(concurrency)] = _timed(
+            cm.fs, lambda: cm.download_archive(
+                'bulk', io.BytesIO(), 'tar'))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--files', type=int, default=500,
+                        help='Number of files')
+    parser.add_argument('--size', type=int, default=1000,
+                        help='Size of each file in bytes')
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help='Latency of each backend call in seconds')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='Maximum random extra latency in seconds')
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 4, 16],
+                        help='Values of batch_concurrency to compare')
+    parser.add_argument('--json', action='store_true',
+                        help='Output results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        for name, r in results.items():
+            print('{:22} calls={:<6} time={:.3f}s'.format(
+                name, r['backend_calls'], r['time']))
+
+
+if __name__ == '__main__':
+    main()
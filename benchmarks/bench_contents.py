@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+"""
+Benchmark FsContentsManager operations over a latency-injecting filesystem.
+
+Each benchmark records the number of backend calls and the wall time.
+Results can be saved as a baseline, or checked against a baseline in which
+case the script exits with an error if the number of backend calls increased
+or the wall time increased by more than the tolerance.
+
+    python benchmarks/bench_contents.py --output results.json
+    python benchmarks/bench_contents.py --check benchmarks/baseline.json
+    python benchmarks/bench_contents.py --update benchmarks/baseline.json
+"""
+
+import argparse
+from collections import OrderedDict
+import json
+import sys
+import time
+
+from fs import open_fs
+from nbformat.v4 import (
+    new_code_cell,
+    new_notebook,
+    new_output,
+)
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+
+
+def make_notebook(ncells):
+    nb = new_notebook()
+    for n in range(ncells):
+        cell = new_code_cell('x = {}\nprint(x)'.format(n))
+        cell.outputs.append(
+            new_output('stream', name='stdout', text='{}\n'.format(n)))
+        nb.cells.append(cell)
+    return nb
+
+
+def make_manager(latency, bandwidth):
+    fs = LatencyFS(open_fs('mem://'), latency=latency, bandwidth=bandwidth)
+    cm = FsContentsManager()
+    cm.fs = fs
+    return cm, fs
+
+
+def _timed(fs, func, repeat):
+    fs.reset_calls()
+    start = time.perf_counter()
+    for n in range(repeat):
+        func(n)
+    elapsed = (time.perf_counter() - start) / repeat
+    calls = {k: v // repeat for k, v in sorted(fs.calls.items())}
+    return OrderedDict([
+        ('calls', calls),
+        ('total_calls', sum(calls.values())),
+        ('time', round(elapsed, 6)),
+    ])
+
+
+def bench_get_directory(cm, fs, nentries, repeat):
+    d = 'dir{}'.format(nentries)
+    cm.save({'type': 'directory'}, d)
+    for n in range(nentries):
+        if n % 2:
+            cm.save({'type': 'file', 'format': 'text', 'content': 'x'},
+                    '{}/f{}.txt'.format(d, n))
+        else:
+            cm.save({'type': 'directory'}, '{}/d{}'.format(d, n))
+    return _timed(fs, lambda n: cm.get(d), repeat)
+
+
+def bench_notebook_save(cm, fs, ncells, repeat):
+    nb = make_notebook(ncells)
+    path = 'save{}.ipynb'.format(ncells)
+    return _timed(fs, lambda n: cm.save(
+        {'type': 'notebook', 'content': nb}, path), repeat)
+
+
+def bench_notebook_open(cm, fs, ncells, repeat):
+    path = 'open{}.ipynb'.format(ncells)
+    cm.save({'type': 'notebook', 'content': make_notebook(ncells)}, path)
+    return _timed(fs, lambda n: cm.get(path), repeat)
+
+
+def bench_checkpoint_create(cm, fs, repeat):
+    path = 'checkpoint.ipynb'
+    cm.save({'type': 'notebook', 'content': make_notebook(10)}, path)
+    return _timed(fs, lambda n: cm.create_checkpoint(path), repeat)
+
+
+def bench_checkpoint_restore(cm, fs, repeat):
+    path = 'restore.ipynb'
+    cm.save({'type': 'notebook', 'content': make_notebook(10)}, path)
+    cp = cm.create_checkpoint(path)
+    return _timed(
+        fs, lambda n: cm.restore_checkpoint(cp['id'], path), repeat)
+
+
+def bench_rename(cm, fs, repeat):
+    cm.save({'type': 'notebook', 'content': make_notebook(10)}, 'r0.ipynb')
+    return _timed(fs, lambda n: cm.rename(
+        'r{}.ipynb'.format(n), 'r{}.ipynb'.format(n + 1)), repeat)
+
+
+def bench_delete(cm, fs, repeat):
+    for n in range(repeat):
+        cm.save({'type': 'notebook', 'content': make_notebook(10)},
+                'd{}.ipynb'.format(n))
+    return _timed(fs, lambda n: cm.delete('d{}.ipynb'.format(n)), repeat)
+
+
+def run(latency, bandwidth, repeat, quick=False):
+    sizes = (10, 100) if quick else (10, 100, 500)
+    results = OrderedDict()
+
+    def add(name, bench, *args):
+        cm, fs = make_manager(latency, bandwidth)
+        results[name] = bench(cm, fs, *args)
+        print('{:32} calls={:<6} time={:.4f}s'.format(
+            name, results[name]['total_calls'], results[name]['time']),
+            file=sys.stderr)
+
+    for n in sizes:
+        add('get_directory_{}'.format(n), bench_get_directory, n, repeat)
+    for n in sizes:
+        add('notebook_save_{}'.format(n), bench_notebook_save, n, repeat)
+        add('notebook_open_{}'.format(n), bench_notebook_open, n, repeat)
+    add('checkpoint_create', bench_checkpoint_create, repeat)
+    add('checkpoint_restore', bench_checkpoint_restore, repeat)
+    add('rename', bench_rename, repeat)
+    add('delete', bench_delete, repeat)
+    return results
+
+
+def check(results, baseline, tolerance, slack):
+    failures = []
+    for name, base in baseline['results'].items():
+        result = results.get(name)
+        if result is None:
+            failures.append('{}: missing'.format(name))
+            continue
+        if result['total_calls'] > base['total_calls']:
+            failures.append('{}: backend calls increased {} -> {} {}'.format(
+                name, base['total_calls'], result['total_calls'],
+                result['calls']))
+        if result['time'] > base['time'] * (1 + tolerance) + slack:
+            failures.append('{}: time increased {:.4f}s -> {:.4f}s'.format(
+                name, base['time'], result['time']))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--latency', type=float, default=0.001,
+                        help='Latency per backend call (seconds)')
+    parser.add_argument('--bandwidth', type=float, default=0,
+                        help='Backend bandwidth (bytes/second), 0 unlimited')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--quick', action='store_true',
+                        help='Skip the largest sizes')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Allowed fractional increase in wall time')
+    parser.add_argument('--slack', type=float, default=0.02,
+                        help='Allowed absolute increase in wall time')
+    parser.add_argument('--output', help='Write results to this file')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--check', metavar='BASELINE',
+                       help='Fail if results regressed from this baseline')
+    group.add_argument('--update', metavar='BASELINE',
+                       help='Write results as a new baseline')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.check:
+        with open(args.check) as f:
+            baseline = json.load(f)
+        # Results are only comparable if the parameters match
+        args.latency = baseline['latency']
+        args.bandwidth = baseline['bandwidth']
+        args.repeat = baseline['repeat']
+
+    results = run(args.latency, args.bandwidth, args.repeat, args.quick)
+    doc = OrderedDict([
+        ('latency', args.latency),
+        ('bandwidth', args.bandwidth),
+        ('repeat', args.repeat),
+        ('results', results),
+    ])
+
+    for filename in (args.output, args.update):
+        if filename:
+            with open(filename, 'w') as f:
+                json.dump(doc, f, indent=2)
+                f.write('\n')
+
+    if baseline:
+        if args.quick:
+            baseline['results'] = OrderedDict(
+                (k, v) for (k, v) in baseline['results'].items()
+                if k in results)
+        failures = check(
+            results, baseline, args.tolerance, args.slack)
+        for failure in failures:
+            print('REGRESSION ' + failure, file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
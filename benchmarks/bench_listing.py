@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Compare the memory and time of directory listings as model dicts and as
+compact DirectoryListing entries.
+
+Lists a large in-memory directory with FsContentsManager.get, which returns
+a dict per child, and with FsContentsManager.list_directory, which keeps a
+DirectoryEntry per child and creates dicts only while serializing.
+
+    python benchmarks/bench_listing.py --entries 100000
+"""
+
+import argparse
+from collections import OrderedDict
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from fs import open_fs
+try:
+    from jupyter_client.jsonutil import json_default
+except ImportError:
+    from jupyter_client.jsonutil import date_default as json_default
+
+from jupyter_pyfilesystem import FsContentsManager
+
+
+def make_manager(nentries):
+    fs = open_fs('mem://')
+    fs.makedir('/big')
+    for n in range(nentries):
+        if n % 10:
+            fs.writebytes('/big/file{}.txt'.format(n), b'x')
+        else:
+            fs.makedir('/big/dir{}'.format(n))
+    cm = FsContentsManager()
+    cm.fs = fs
+    return cm
+
+
+def _measure(func):
+    # Time without tracemalloc, which slows down allocations
+    gc.collect()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, OrderedDict([
+        ('time', round(elapsed, 4)),
+        ('retained_mb', round(current / 1e6, 2)),
+        ('peak_mb', round(peak / 1e6, 2)),
+    ])
+
+
+def bench_dicts(cm, results):
+    models, results['dicts'] = _measure(
+        lambda: cm.get('big')['content'])
+    _, results['dicts_serialize'] = _measure(
+        lambda: len(json.dumps(models, default=json_default)))
+
+
+def bench_entries(cm, results):
+    listing, results['entries'] = _measure(
+        lambda: cm.list_directory('big'))
+    _, results['entries_serialize'] = _measure(
+        lambda: sum(len(chunk) for chunk in
+                    listing.iter_json(default=json_default)))
+
+
+def run(args):
+    cm = make_manager(args.entries)
+    results = OrderedDict()
+    bench_dicts(cm, results)
+    bench_entries(cm, results)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--json', action='store_true',
+                        help='Output results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        for name, r in results.items():
+            print('{:20} time={:.3f}s retained={:.1f}MB peak={:.1f}MB'.format(
+                name, r['time'], r['retained_mb'], r['peak_mb']))
+
+
+if __name__ == '__main__':
+    main()
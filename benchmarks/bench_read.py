@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Compare reading large local files with and without memory mapping.
+
+Reads text and binary files from an osfs:// directory with
+FsContentsManager.get, once with mmap_threshold=0 so files are read into a
+bytes object before they are decoded or encoded, and once with memory
+mapping. Also reads the binary file in chunks like the raw download handler.
+The peak memory doesn't include the mapped file, which is in the page cache.
+
+    python benchmarks/bench_read.py --sizes 10,100,1000,2000
+"""
+
+import argparse
+from collections import OrderedDict
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from jupyter_pyfilesystem import FsContentsManager
+
+
+MB = 1024 * 1024
+
+
+def make_files(root, size_mb):
+    line = b'0123456789abcdefghijklmnopqrstuvwxyz' * 3 + b'\n'
+    block = os.urandom(MB)
+    with open(os.path.join(root, 'text.txt'), 'wb') as f:
+        for _ in range(size_mb):
+            f.write((line * (MB // len(line) + 1))[:MB])
+    with open(os.path.join(root, 'binary.bin'), 'wb') as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def _measure(func):
+    # Time without tracemalloc, which slows down allocations
+    gc.collect()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return OrderedDict([
+        ('time', round(elapsed, 4)),
+        ('peak_mb', round(peak / 1e6, 2)),
+    ])
+
+
+class _Discard(object):
+
+    def write(self, b):
+        return len(b)
+
+
+def bench_size(root, size_mb, results):
+    url = 'osfs://{}'.format(root)
+    generic = FsContentsManager(fs_url=url, mmap_threshold=0)
+    mapped = FsContentsManager(fs_url=url, mmap_threshold=MB)
+    for name, cm in (('generic', generic), ('mmap', mapped)):
+        results['{}_text_{}mb'.format(name, size_mb)] = _measure(
+            lambda: cm.get('text.txt', format='text'))
+        results['{}_base64_{}mb'.format(name, size_mb)] = _measure(
+            lambda: cm.get('binary.bin', format='base64'))
+    results['chunked_{}mb'.format(size_mb)] = _measure(
+        lambda: mapped.download_file('binary.bin', _Discard()))
+    generic.fs_handle.close()
+    mapped.fs_handle.close()
+
+
+def run(args):
+    results = OrderedDict()
+    for size_mb in args.sizes:
+        root = tempfile.mkdtemp(dir=args.dir)
+        try:
+            make_files(root, size_mb)
+            bench_size(root, size_mb, results)
+        finally:
+            shutil.rmtree(root)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '--sizes', type=lambda s: [int(n) for n in s.split(',')],
+        default=[10, 100], help='Comma separated file sizes in MB')
+    parser.add_argument('--dir', help='Directory for the temporary files')
+    parser.add_argument('--json', action='store_true',
+                        help='Output results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        for name, r in results.items():
+            print('{:24} time={:.3f}s peak={:.1f}MB'.format(
+                name, r['time'], r['peak_mb']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Compare the cost of notebook trust signatures with and without caching.
+
+Saves and opens a large notebook with FsContentsManager, once with
+trusted_digest_cache_size=0 and signature_flush_interval=0 so every save and
+open computes the signature and reads or writes the signature database, and
+once with the trusted digest cache and batched database writes. Saves are
+either of an unchanged notebook, like an autosave, or of a notebook with one
+changed cell. The signature database is a file in a temporary directory.
+
+    python benchmarks/bench_signing.py --cells 2000 --repeat 20
+"""
+
+import argparse
+from collections import OrderedDict
+import json
+import shutil
+import sys
+import tempfile
+import time
+
+from nbformat import v4
+from traitlets.config import Config
+
+from jupyter_pyfilesystem import FsContentsManager
+
+
+def make_notebook(cells, output_kb):
+    nb = v4.new_notebook()
+    text = 'x' * 1024
+    for n in range(cells):
+        nb.cells.append(v4.new_code_cell(
+            source='print({})'.format(n), execution_count=n + 1,
+            outputs=[v4.new_output(
+                'stream', name='stdout', text=text * output_kb)],
+            # As sent by the frontend after the notebook is run
+            metadata={'trusted': True}))
+    return nb
+
+
+def _manager(data_dir, optimized):
+    config = Config()
+    config.NotebookNotary.data_dir = data_dir
+    config.NotebookNotary.secret = b'benchmark'
+    if not optimized:
+        config.FsContentsManager.trusted_digest_cache_size = 0
+    else:
+        config.FsContentsManager.signature_flush_interval = 60
+    return FsContentsManager(fs_url='mem://', config=config)
+
+
+def _time(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return round((time.perf_counter() - start) / repeat, 5)
+
+
+def bench(args, name, optimized, results):
+    data_dir = tempfile.mkdtemp(dir=args.dir)
+    try:
+        cm = _manager(data_dir, optimized)
+        nb = make_notebook(args.cells, args.output_kb)
+
+        def save():
+            cm.save({'type': 'notebook', 'content': nb}, 'large.ipynb')
+
+        def changed():
+            nb.cells[0].source += '\n'
+            save()
+
+        save()
+        results['{}_save_unchanged'.format(name)] = _time(save, args.repeat)
+        results['{}_save_changed'.format(name)] = _time(changed, args.repeat)
+        results['{}_open'.format(name)] = _time(
+            lambda: cm.get('large.ipynb'), args.repeat)
+        cm.notary.store.close()
+        cm.fs_handle.close()
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cells', type=int, default=2000,
+                        help='Number of cells in the notebook')
+    parser.add_argument('--output-kb', type=int, default=4,
+                        help='Size of the output of each cell in KB')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='Number of times each operation is timed')
+    parser.add_argument('--dir', help='Directory for the signature database')
+    parser.add_argument('--json', action='store_true',
+                        help='Output results as JSON')
+    args = parser.parse_args(argv)
+
+    results = OrderedDict()
+    bench(args, 'baseline', False, results)
+    bench(args, 'cached', True, results)
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        for name, t in results.items():
+            print('{:24} time={:.4f}s'.format(name, t))
+
+
+if __name__ == '__main__':
+    main()
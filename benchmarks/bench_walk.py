@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Compare fs.walk with ParallelWalker over a latency-injecting filesystem.
+
+Builds a tree of directories in memory, then walks it serially with fs.walk
+and with ParallelWalker using increasing numbers of workers.
+
+    python benchmarks/bench_walk.py --latency 0.01 --depth 3 --width 6
+"""
+
+import argparse
+from collections import OrderedDict
+import json
+import sys
+import time
+
+from fs import open_fs
+
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+from jupyter_pyfilesystem.walker import ParallelWalker
+
+
+def make_tree(fs, depth, width, files):
+    def make(path, level):
+        for n in range(files):
+            fs.writetext('{}/file{}.txt'.format(path, n), 'x')
+        if level < depth:
+            for n in range(width):
+                child = '{}/d{}'.format(path, n)
+                fs.makedir(child)
+                make(child, level + 1)
+    make('', 0)
+
+
+def _timed(fs, walk):
+    fs.reset_calls()
+    start = time.perf_counter()
+    nfiles = sum(len(files) for (_, _, files) in walk)
+    return OrderedDict([
+        ('files', nfiles),
+        ('scandir_calls', fs.calls['scandir']),
+        ('time', round(time.perf_counter() - start, 4)),
+    ])
+
+
+def run(args):
+    fs = open_fs('mem://')
+    make_tree(fs, args.depth, args.width, args.files)
+    fs = LatencyFS(fs, latency=args.latency, jitter=args.jitter, seed=0)
+    results = OrderedDict()
+    results['fs.walk'] = _timed(fs, fs.walk.walk('/'))
+    for workers in args.workers:
+        walker = ParallelWalker(fs, workers=workers)
+        results['parallel_{}'.format(workers)] = _timed(fs, walker.walk())
+    serial = results['fs.walk']['time']
+    for result in results.values():
+        result['speedup'] = round(serial / result['time'], 2)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help='Latency added to each backend call (seconds)')
+    parser.add_argument('--jitter', type=float, default=0)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--width', type=int, default=6,
+                        help='Number of sub-directories in each directory')
+    parser.add_argument('--files', type=int, default=5,
+                        help='Number of files in each directory')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, 4, 16, 32])
+    parser.add_argument('--json', action='store_true',
+                        help='Output results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        for name, r in results.items():
+            print('{:16} files={:<7} scandir={:<6} time={:.3f}s '
+                  'speedup={:.1f}x'.format(
+                      name, r['files'], r['scandir_calls'], r['time'],
+                      r['speedup']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+"""
+Multi-user load test for the REST contents API using FsContentsManager.
+
+Starts a notebook server in this process over a local or latency-injected
+filesystem, then simulates users browsing, opening, autosaving, uploading and
+renaming files through /api/contents. Reports throughput, p50/p95/p99 latency
+for each action, and the lag of the server event loop.
+
+    python benchmarks/loadtest.py --users 20 --duration 30 --latency 0.005
+    python benchmarks/loadtest.py --fs-url osfs:///tmp/loadtest --json
+"""
+
+import argparse
+import asyncio
+from base64 import b64encode
+from collections import (
+    defaultdict,
+    OrderedDict,
+)
+import json
+import random
+import socket
+import sys
+import threading
+import time
+
+from fs import open_fs
+from nbformat.v4 import (
+    new_code_cell,
+    new_notebook,
+)
+from notebook.notebookapp import NotebookApp
+from tornado.httpclient import (
+    AsyncHTTPClient,
+    HTTPClientError,
+)
+
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+
+
+TOKEN = 'loadtest'
+
+DEFAULT_MIX = 'browse=4,open=3,autosave=5,upload=1,rename=1'
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[k]
+
+
+def parse_mix(mix):
+    weights = OrderedDict()
+    for item in mix.split(','):
+        name, weight = item.split('=')
+        if name not in SimulatedUser.actions:
+            raise ValueError('Unknown action: {}'.format(name))
+        weights[name] = float(weight)
+    return weights
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def make_notebook(ncells):
+    nb = new_notebook()
+    for n in range(ncells):
+        nb.cells.append(new_code_cell('x = {}'.format(n)))
+    return nb
+
+
+class SimulatedUser(object):
+
+    actions = ('browse', 'open', 'autosave', 'upload', 'rename')
+
+    def __init__(self, n, base_url, client, args, stats):
+        self.name = 'user{}'.format(n)
+        self.base_url = base_url
+        self.client = client
+        self.args = args
+        self.stats = stats
+        self.random = random.Random(n)
+        self.uploads = 0
+        self.renames = 0
+        self.nb = make_notebook(args.cells)
+
+    def url(self, path):
+        return '{}api/contents/{}/{}'.format(self.base_url, self.name, path)
+
+    async def request(self, action, path, method='GET', body=None):
+        start = time.perf_counter()
+        try:
+            await self.client.fetch(
+                self.url(path), method=method,
+                body=None if body is None else json.dumps(body),
+                headers={'Authorization': 'token ' + TOKEN})
+        except HTTPClientError as e:
+            self.stats.errors[action][e.code] += 1
+        self.stats.latencies[action].append(time.perf_counter() - start)
+
+    async def browse(self):
+        await self.request('browse', '?content=1')
+
+    async def open(self):
+        await self.request('open', 'notebook.ipynb')
+
+    async def autosave(self):
+        self.nb.cells[self.random.randrange(len(self.nb.cells))].source = (
+            'x = {}'.format(self.random.random()))
+        await self.request('autosave', 'notebook.ipynb', 'PUT', {
+            'type': 'notebook', 'format': 'json', 'content': self.nb})
+
+    async def upload(self):
+        content = b64encode(
+            bytes(self.random.getrandbits(8)
+                  for _ in range(self.args.upload_size))).decode('ascii')
+        self.uploads += 1
+        await self.request(
+            'upload', 'upload-{}.bin'.format(self.uploads), 'PUT', {
+                'type': 'file', 'format': 'base64', 'content': content})
+
+    async def rename(self):
+        old = 'renamed-{}.txt'.format(self.renames)
+        self.renames += 1
+        new = 'renamed-{}.txt'.format(self.renames)
+        await self.request('rename', old, 'PATCH', {
+            'path': '{}/{}'.format(self.name, new)})
+
+    async def run(self, weights, deadline):
+        names = list(weights)
+        values = list(weights.values())
+        while time.perf_counter() < deadline:
+            action = self.random.choices(names, values)[0]
+            await getattr(self, action)()
+            if self.args.think:
+                await asyncio.sleep(self.random.expovariate(
+                    1 / self.args.think))
+
+
+class Stats(object):
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.loop_lag = []
+        self.elapsed = 0
+
+    def summary(self):
+        def describe(values):
+            return OrderedDict([
+                ('count', len(values)),
+                ('p50', percentile(values, 50)),
+                ('p95', percentile(values, 95)),
+                ('p99', percentile(values, 99)),
+                ('max', max(values) if values else None),
+            ])
+
+        total = sum(len(v) for v in self.latencies.values())
+        actions = OrderedDict()
+        for action in SimulatedUser.actions:
+            if action in self.latencies:
+                actions[action] = describe(self.latencies[action])
+                actions[action]['errors'] = dict(self.errors[action])
+        return OrderedDict([
+            ('elapsed', self.elapsed),
+            ('requests', total),
+            ('throughput', total / self.elapsed if self.elapsed else None),
+            ('actions', actions),
+            ('loop_lag', describe(self.loop_lag)),
+        ])
+
+
+def print_summary(summary, out=sys.stdout):
+    def ms(v):
+        return '-' if v is None else '{:.1f}'.format(v * 1000)
+
+    print('Requests: {requests} in {elapsed:.1f}s, {throughput:.1f} req/s'
+          .format(**summary), file=out)
+    print('{:12} {:>7} {:>9} {:>9} {:>9} {:>9} {:>7}'.format(
+        'latency(ms)', 'count', 'p50', 'p95', 'p99', 'max', 'errors'),
+        file=out)
+    rows = list(summary['actions'].items())
+    rows.append(('loop lag', summary['loop_lag']))
+    for name, d in rows:
+        print('{:12} {:>7} {:>9} {:>9} {:>9} {:>9} {:>7}'.format(
+            name, d['count'], ms(d['p50']), ms(d['p95']), ms(d['p99']),
+            ms(d['max']), sum(d.get('errors', {}).values())), file=out)
+
+
+async def drive(base_url, server_loop, args, stats):
+    AsyncHTTPClient.configure(None, max_clients=args.users)
+    client = AsyncHTTPClient()
+    weights = parse_mix(args.mix)
+    deadline = time.perf_counter() + args.duration
+
+    async def probe_lag():
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            server_loop.add_callback(
+                lambda t0=t0: stats.loop_lag.append(
+                    time.perf_counter() - t0))
+            await asyncio.sleep(args.lag_interval)
+
+    users = [SimulatedUser(n, base_url, client, args, stats)
+             for n in range(args.users)]
+    start = time.perf_counter()
+    await asyncio.gather(
+        probe_lag(), *(u.run(weights, deadline) for u in users))
+    stats.elapsed = time.perf_counter() - start
+    client.close()
+
+
+def setup_users(cm, args):
+    for n in range(args.users):
+        d = 'user{}'.format(n)
+        cm.save({'type': 'directory'}, d)
+        cm.save({'type': 'notebook', 'content': make_notebook(args.cells)},
+                d + '/notebook.ipynb')
+        cm.save({'type': 'file', 'format': 'text', 'content': 'x'},
+                d + '/renamed-0.txt')
+        for f in range(args.files):
+            cm.save({'type': 'file', 'format': 'text', 'content': str(f)},
+                    '{}/file{}.txt'.format(d, f))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--fs-url', default='mem://')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Latency added to each backend call (seconds)')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='Random jitter added to each backend call')
+    parser.add_argument('--bandwidth', type=float, default=0,
+                        help='Backend bandwidth (bytes/second), 0 unlimited')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=10,
+                        help='Length of the test (seconds)')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help='Relative weights of each action')
+    parser.add_argument('--think', type=float, default=0.1,
+                        help='Mean time between actions for each user')
+    parser.add_argument('--cells', type=int, default=50,
+                        help='Number of cells in each notebook')
+    parser.add_argument('--files', type=int, default=20,
+                        help='Number of extra files in each directory')
+    parser.add_argument('--upload-size', type=int, default=10000)
+    parser.add_argument('--lag-interval', type=float, default=0.05)
+    parser.add_argument('--json', action='store_true',
+                        help='Output results as JSON')
+    args = parser.parse_args(argv)
+
+    port = free_port()
+    app = NotebookApp()
+    app.initialize([
+        '--NotebookApp.contents_manager_class='
+        'jupyter_pyfilesystem.FsContentsManager',
+        '--FsContentsManager.fs_url=' + args.fs_url,
+        '--NotebookApp.token=' + TOKEN,
+        '--NotebookApp.open_browser=False',
+        '--NotebookApp.ip=127.0.0.1',
+        '--NotebookApp.port={}'.format(port),
+        '--NotebookApp.log_level=WARN',
+        '--NotebookApp.allow_root=True',
+    ])
+    cm = app.contents_manager
+    if args.latency or args.jitter or args.bandwidth:
+        cm.fs = LatencyFS(
+            open_fs(args.fs_url), latency=args.latency, jitter=args.jitter,
+            bandwidth=args.bandwidth, seed=0)
+    setup_users(cm, args)
+
+    stats = Stats()
+
+    def run_driver():
+        # Wait for the server loop to start
+        while getattr(app, 'io_loop', None) is None:
+            time.sleep(0.01)
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(drive(
+                'http://127.0.0.1:{}/'.format(port), app.io_loop, args,
+                stats))
+        finally:
+            loop.close()
+            app.io_loop.add_callback(app.io_loop.stop)
+
+    driver = threading.Thread(target=run_driver, daemon=True)
+    driver.start()
+    app.start()
+    driver.join()
+
+    summary = stats.summary()
+    if args.json:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    else:
+        print_summary(summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,3 +7,12 @@ __all__ = [
     'FsContentsManager',
     'FsCheckpoints',
 ]
+
+
+def _jupyter_server_extension_paths():
+    return [{'module': 'jupyter_pyfilesystem'}]
+
+
+def load_jupyter_server_extension(nbapp):
+    from .handlers import load_handlers
+    load_handlers(nbapp)
@@ -0,0 +1,151 @@
+"""
+Serve read-only archive filesystems from an index built when they're opened
+"""
+
+from collections import OrderedDict
+import io
+import threading
+
+from fs.errors import (
+    DirectoryExpected,
+    FileExpected,
+    ResourceNotFound,
+    ResourceReadOnly,
+)
+from fs.info import Info
+from fs.mode import check_writable
+import fs.path as fspath
+from fs.wrap import WrapReadOnly
+
+
+# Filesystems that can't change while they're open read-only
+ARCHIVE_SCHEMES = ('zip://', 'tar://')
+
+_INDEXED_NAMESPACES = {'basic', 'details'}
+
+
+class IndexedArchiveFS(WrapReadOnly):
+    """
+    Wrap a read-only archive filesystem, listing all members once when
+    opened. Metadata calls are answered from the index, and the contents of
+    recently read members are kept in memory.
+
+    :param cache_size: Maximum total bytes of member contents kept, members
+      larger than this aren't cached. 0 to disable
+    """
+
+    def __init__(self, wrap_fs, cache_size=64 * 1024 * 1024):
+        super().__init__(wrap_fs)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._infos = {'/': wrap_fs.getinfo('/', ['details']).raw}
+        self._children = {}
+        for dirpath, dirs, files in wrap_fs.walk.walk(
+                '/', namespaces=['details']):
+            names = []
+            for info in dirs + files:
+                self._infos[fspath.join(dirpath, info.name)] = info.raw
+                names.append(info.name)
+            self._children[dirpath] = names
+
+    def __repr__(self):
+        return 'IndexedArchiveFS({!r})'.format(self._wrap_fs)
+
+    def __len__(self):
+        return len(self._infos)
+
+    def _raw(self, path):
+        self.check()
+        _path = fspath.abspath(fspath.normpath(path))
+        try:
+            return _path, self._infos[_path]
+        except KeyError:
+            raise ResourceNotFound(path)
+
+    def _indexed(self, namespaces):
+        return _INDEXED_NAMESPACES.issuperset(namespaces or ())
+
+    def getinfo(self, path, namespaces=None):
+        if not self._indexed(namespaces):
+            return super().getinfo(path, namespaces=namespaces)
+        return Info(self._raw(path)[1])
+
+    def getdetails(self, path):
+        return self.getinfo(path, ['details'])
+
+    def exists(self, path):
+        try:
+            self._raw(path)
+        except ResourceNotFound:
+            return False
+        return True
+
+    def isdir(self, path):
+        try:
+            return self._raw(path)[1]['basic']['is_dir']
+        except ResourceNotFound:
+            return False
+
+    def isfile(self, path):
+        try:
+            return not self._raw(path)[1]['basic']['is_dir']
+        except ResourceNotFound:
+            return False
+
+    def _children_of(self, path):
+        _path, raw = self._raw(path)
+        if not raw['basic']['is_dir']:
+            raise DirectoryExpected(path)
+        return _path, self._children.get(_path, [])
+
+    def listdir(self, path):
+        return list(self._children_of(path)[1])
+
+    def scandir(self, path, namespaces=None, page=None):
+        if not self._indexed(namespaces):
+            return super().scandir(path, namespaces=namespaces, page=page)
+        _path, names = self._children_of(path)
+        if page is not None:
+            names = names[page[0]:page[1]]
+        return iter([Info(self._infos[fspath.join(_path, name)])
+                     for name in names])
+
+    def _read(self, path):
+        _path, raw = self._raw(path)
+        if raw['basic']['is_dir']:
+            raise FileExpected(path)
+        with self._cache_lock:
+            data = self._cache.get(_path)
+            if data is not None:
+                self._cache.move_to_end(_path)
+                self.hits += 1
+                return data
+            self.misses += 1
+        with self._wrap_fs.openbin(_path) as f:
+            data = f.read()
+        if len(data) <= self.cache_size:
+            with self._cache_lock:
+                if _path not in self._cache:
+                    self._cache[_path] = data
+                    self._cached_bytes += len(data)
+                while self._cached_bytes > self.cache_size:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_bytes -= len(evicted)
+        return data
+
+    def openbin(self, path, mode='r', buffering=-1, **options):
+        if check_writable(mode):
+            raise ResourceReadOnly(path)
+        return io.BytesIO(self._read(path))
+
+    def readbytes(self, path):
+        return self._read(path)
+
+    def readtext(self, path, encoding=None, errors=None, newline=''):
+        return io.TextIOWrapper(
+            io.BytesIO(self._read(path)), encoding=encoding or 'utf-8',
+            errors=errors, newline=newline).read()
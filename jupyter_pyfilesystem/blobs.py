@@ -0,0 +1,75 @@
+"""
+Store large notebook outputs as separate content-addressed blobs
+"""
+
+from hashlib import sha256
+import json
+import re
+
+
+# Output metadata key containing {mimetype: digest} for offloaded outputs
+BLOB_METADATA_KEY = 'jupyter_pyfilesystem_blobs'
+
+# https://github.com/jupyter/nbformat/blob/5.1.3/nbformat/v4/nbformat.v4.schema.json#L400
+_JSON_MIMETYPE = re.compile(r'^application/(.*\+)?json$')
+
+
+def _mimebundle_outputs(nb):
+    for cell in nb.cells:
+        if cell.cell_type != 'code':
+            continue
+        for output in cell.outputs:
+            if output.output_type in ('display_data', 'execute_result'):
+                yield output
+
+
+def _encode(mimetype, value):
+    if _JSON_MIMETYPE.match(mimetype):
+        return json.dumps(value, sort_keys=True).encode('utf8')
+    if isinstance(value, list):
+        value = ''.join(value)
+    return value.encode('utf8')
+
+
+def _decode(mimetype, data):
+    if _JSON_MIMETYPE.match(mimetype):
+        return json.loads(data.decode('utf8'))
+    return data.decode('utf8')
+
+
+def offload_outputs(nb, threshold):
+    """
+    Replace output data that is at least `threshold` bytes with a reference
+    to a blob. Modifies `nb`.
+
+    :return: A dict of {digest: bytes} of the blobs referenced by `nb`
+    """
+    blobs = {}
+    for output in _mimebundle_outputs(nb):
+        refs = {}
+        for mimetype, value in output.data.items():
+            data = _encode(mimetype, value)
+            if len(data) < threshold:
+                continue
+            digest = sha256(data).hexdigest()
+            blobs[digest] = data
+            refs[mimetype] = digest
+        if refs:
+            for mimetype in refs:
+                output.data[mimetype] = ''
+            output.metadata[BLOB_METADATA_KEY] = refs
+    return blobs
+
+
+def restore_outputs(nb, read_blob):
+    """
+    Replace references to blobs with the blob data. Modifies `nb`.
+
+    :param read_blob: A function that returns the bytes for a digest
+    """
+    for output in _mimebundle_outputs(nb):
+        refs = output.metadata.pop(BLOB_METADATA_KEY, None)
+        if not refs:
+            continue
+        for mimetype, digest in refs.items():
+            output.data[mimetype] = _decode(mimetype, read_blob(digest))
@@ -0,0 +1,289 @@
+"""
+Timeouts and a circuit breaker for calls to remote filesystems that may hang
+or become unavailable
+"""
+
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    TimeoutError,
+)
+import logging
+import threading
+import time
+
+from fs.errors import (
+    OperationTimeout,
+    RemoteConnectionError,
+)
+from fs.wrapfs import WrapFS
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# Errors that indicate the backend is unavailable rather than a problem with
+# the requested path
+FAILURES = (OperationTimeout, RemoteConnectionError, OSError)
+
+
+class CircuitOpen(RemoteConnectionError):
+    """
+    Raised without calling the filesystem while the circuit is open
+    """
+
+    default_message = 'filesystem is unavailable, circuit breaker is open'
+
+
+class CircuitBreaker(object):
+    """
+    Track consecutive failures of a filesystem. After `failure_threshold`
+    failures the circuit opens and calls fail immediately. Once
+    `reset_timeout` seconds have passed a single call is let through as a
+    probe, if it succeeds the circuit closes, otherwise it opens again.
+
+    :param failure_threshold: Number of consecutive failures that open the
+      circuit
+    :param reset_timeout: Seconds to wait before probing an open circuit
+    :param name: Name used in log messages
+    """
+
+    def __init__(self, failure_threshold, reset_timeout, name='',
+                 log=None, clock=time.monotonic):
+        if failure_threshold < 1:
+            raise ValueError('failure_threshold must be at least 1')
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.log = log or logging.getLogger(__name__)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+
+    def __repr__(self):
+        return 'CircuitBreaker({!r}, state={})'.format(self.name, self.state)
+
+    def before_call(self):
+        """
+        Raise CircuitOpen if the call mustn't be made
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if (self.state == OPEN and
+                    self._clock() - self.opened_at >= self.reset_timeout):
+                self.log.info('Probing filesystem %s', self.name)
+                self.state = HALF_OPEN
+                return
+        raise CircuitOpen(msg='{} is unavailable, retrying after {}s'.format(
+            self.name or 'filesystem', self.reset_timeout))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                self.log.warning('Filesystem %s is available again, '
+                                 'closing circuit', self.name)
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (
+                    self.state == CLOSED and
+                    self.failures >= self.failure_threshold):
+                self.log.warning(
+                    'Filesystem %s failed %d times, opening circuit for %ss',
+                    self.name, self.failures, self.reset_timeout)
+                self.state = OPEN
+                self.opened_at = self._clock()
+                self.times_opened += 1
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self.state,
+                'failures': self.failures,
+                'times_opened': self.times_opened,
+            }
+
+
+class _GuardedFile(object):
+    """
+    Proxy for a file whose reads and writes are guarded like other calls
+    """
+
+    def __init__(self, f, guardedfs):
+        self._f = f
+        self._guardedfs = guardedfs
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def read(self, *args):
+        return self._guardedfs._call(self._f.read, *args)
+
+    def readinto(self, b):
+        return self._guardedfs._call(self._f.readinto, b)
+
+    def write(self, b):
+        return self._guardedfs._call(self._f.write, b)
+
+    def close(self):
+        return self._guardedfs._call(self._f.close)
+
+
+class GuardedFS(WrapFS):
+    """
+    Wrap a filesystem so that calls fail with `OperationTimeout` if they take
+    longer than `timeout` seconds, and fail fast while `breaker` is open.
+
+    Python can't interrupt a blocked call, so with a timeout each call is run
+    in a thread of an executor and abandoned if it times out. An abandoned
+    call isn't cancelled, it keeps its thread until it returns and may still
+    complete, for example a write or remove. The executor has a fixed number
+    of threads, if they're all blocked further calls time out while waiting
+    for a thread.
+
+    `removetree` and `movedir` act on whole directory trees, which can take
+    much longer than other calls, so they're run without a timeout but still
+    fail fast while the breaker is open. Other operations on many files such
+    as `upload`, `download` and `copydir` aren't guarded.
+
+    :param timeout: Seconds to wait for each call, 0 for no timeout
+    :param breaker: Optional `CircuitBreaker` that records the result of each
+      call
+    :param max_workers: Maximum number of threads used for calls with a
+      timeout
+    """
+
+    def __init__(self, wrap_fs, timeout=0, breaker=None, max_workers=32):
+        super().__init__(wrap_fs)
+        self.timeout = timeout
+        self.breaker = breaker
+        self._executor = None
+        if timeout > 0:
+            self._executor = ThreadPoolExecutor(
+                max_workers, thread_name_prefix='fs-call')
+
+    def __repr__(self):
+        return 'GuardedFS({!r}, timeout={})'.format(
+            self._wrap_fs, self.timeout)
+
+    def _call(self, func, *args, **kwargs):
+        return self._guarded(True, func, args, kwargs)
+
+    def _call_untimed(self, func, *args, **kwargs):
+        return self._guarded(False, func, args, kwargs)
+
+    def _guarded(self, timed, func, args, kwargs):
+        breaker = self.breaker
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            if self._executor is None or not timed:
+                result = func(*args, **kwargs)
+            else:
+                future = self._executor.submit(func, *args, **kwargs)
+                try:
+                    result = future.result(self.timeout)
+                except TimeoutError:
+                    future.cancel()
+                    raise OperationTimeout(
+                        msg='{} timed out after {}s'.format(
+                            getattr(func, '__name__', 'call'), self.timeout))
+        except FAILURES:
+            if breaker is not None:
+                breaker.record_failure()
+            raise
+        except Exception:
+            # Other errors such as ResourceNotFound show the filesystem is
+            # responding
+            if breaker is not None:
+                breaker.record_success()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        super().close()
+
+    def getinfo(self, path, namespaces=None):
+        return self._call(super().getinfo, path, namespaces=namespaces)
+
+    def getdetails(self, path):
+        return self._call(self._wrap_fs.getdetails, path)
+
+    def listdir(self, path):
+        return self._call(super().listdir, path)
+
+    def scandir(self, path, namespaces=None, page=None):
+        def scan():
+            return list(WrapFS.scandir(
+                self, path, namespaces=namespaces, page=page))
+        return iter(self._call(scan))
+
+    def openbin(self, path, mode='r', buffering=-1, **options):
+        f = self._call(
+            super().openbin, path, mode=mode, buffering=buffering, **options)
+        return _GuardedFile(f, self)
+
+    def readbytes(self, path):
+        return self._call(super().readbytes, path)
+
+    def writebytes(self, path, contents):
+        return self._call(super().writebytes, path, contents)
+
+    def exists(self, path):
+        return self._call(super().exists, path)
+
+    def isdir(self, path):
+        return self._call(super().isdir, path)
+
+    def isfile(self, path):
+        return self._call(super().isfile, path)
+
+    def makedir(self, path, permissions=None, recreate=False):
+        return self._call(
+            super().makedir, path, permissions=permissions, recreate=recreate)
+
+    def makedirs(self, path, permissions=None, recreate=False):
+        return self._call(
+            super().makedirs, path, permissions=permissions, recreate=recreate)
+
+    def remove(self, path):
+        return self._call(super().remove, path)
+
+    def removedir(self, path):
+        return self._call(super().removedir, path)
+
+    def removetree(self, dir_path):
+        return self._call_untimed(super().removetree, dir_path)
+
+    def move(self, src_path, dst_path, overwrite=False, **kwargs):
+        return self._call(
+            super().move, src_path, dst_path, overwrite=overwrite, **kwargs)
+
+    def movedir(self, src_path, dst_path, create=False, **kwargs):
+        return self._call_untimed(
+            super().movedir, src_path, dst_path, create=create, **kwargs)
+
+    def setinfo(self, path, info):
+        return self._call(super().setinfo, path, info)
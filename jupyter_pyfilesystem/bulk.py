@@ -0,0 +1,182 @@
+"""
+Unpack uploaded archives and stream archives of directories, for
+transferring many files in one request
+"""
+
+from collections import deque
+import tarfile
+import time
+import zipfile
+
+import fs.path as fspath
+
+from .entries import modified_time
+
+
+ARCHIVE_FORMATS = ('tar', 'zip')
+
+# Errors raised by a corrupt or truncated archive
+ARCHIVE_ERRORS = (tarfile.TarError, zipfile.BadZipFile, EOFError)
+
+
+def archive_members(fileobj, kind):
+    """
+    Yield `(name, data)` for each directory and regular file in a tar or
+    zip archive, in archive order. `data` is None for directories. Other
+    members such as links are skipped.
+
+    Tar archives, which may be compressed, are read in a single pass,
+    zip archives must be seekable.
+    """
+    if kind == 'tar':
+        with tarfile.open(fileobj=fileobj, mode='r|*') as tf:
+            for member in tf:
+                if member.isdir():
+                    yield member.name, None
+                elif member.isfile():
+                    yield member.name, tf.extractfile(member).read()
+    elif kind == 'zip':
+        with zipfile.ZipFile(fileobj) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    yield info.filename, None
+                else:
+                    yield info.filename, zf.read(info)
+    else:
+        raise ValueError('Unknown archive format: {}'.format(kind))
+
+
+def member_path(root, name):
+    """
+    The path of archive member `name` unpacked into directory `root`
+
+    :raises ValueError: If the member would be outside `root`
+    """
+    try:
+        path = fspath.join(root, fspath.relpath(name.replace('\\', '/')))
+    except ValueError:
+        path = None
+    if path is None or not fspath.isbase(root, path) or path == root:
+        raise ValueError('Invalid archive member: {!r}'.format(name))
+    return path
+
+
+class Pipeline(object):
+    """
+    Submit calls to an executor, waiting for the oldest to finish when
+    `max_pending` calls or `max_bytes` bytes are in flight, so the caller
+    can keep producing work while earlier calls run.
+
+    :param callback: Called in the caller's thread with the result of each
+      call in the order they were submitted, instead of collecting them
+    """
+
+    def __init__(self, executor, max_pending, max_bytes=0, callback=None):
+        self.executor = executor
+        self.max_pending = max(max_pending, 1)
+        self.max_bytes = max_bytes
+        self.callback = callback
+        self._pending = deque()
+        self._bytes = 0
+        self.results = []
+
+    def _full(self):
+        return self._pending and (
+            len(self._pending) >= self.max_pending or
+            (self.max_bytes and self._bytes >= self.max_bytes))
+
+    def _finish_oldest(self):
+        future, size = self._pending.popleft()
+        self._bytes -= size
+        if self.callback is None:
+            self.results.append(future.result())
+        else:
+            self.callback(future.result())
+
+    def submit(self, size, func, *args):
+        while self._full():
+            self._finish_oldest()
+        self._pending.append((self.executor.submit(func, *args), size))
+        self._bytes += size
+
+    def wait(self):
+        """
+        Wait for all calls to finish
+
+        :return: The results of all calls in the order they were submitted
+        """
+        try:
+            while self._pending:
+                self._finish_oldest()
+        finally:
+            for future, _ in self._pending:
+                future.cancel()
+        return self.results
+
+
+class ArchiveWriter(object):
+    """
+    Write directories and files to a zip or tar archive on a file object,
+    which doesn't have to be seekable
+
+    :param compression: For tar archives, the compression such as `gz`
+    """
+
+    def __init__(self, fileobj, kind, compression=''):
+        if kind == 'zip':
+            self._archive = zipfile.ZipFile(
+                fileobj, 'w', zipfile.ZIP_DEFLATED)
+        elif kind == 'tar':
+            self._archive = tarfile.open(
+                fileobj=fileobj, mode='w|' + compression)
+        else:
+            raise ValueError('Unknown archive format: {}'.format(kind))
+        self.kind = kind
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._archive.close()
+
+    def add(self, name, info, src=None):
+        """
+        Add a directory, or a file with content read from the binary file
+        object `src`
+
+        :param info: The `Info` of the directory or file, with details
+        """
+        modified = modified_time(info)
+        if modified is None:
+            modified = time.time()
+        if self.kind == 'zip':
+            # Zip can't store times before 1980
+            date_time = max(time.localtime(modified)[:6],
+                            (1980, 1, 1, 0, 0, 0))
+            zinfo = zipfile.ZipInfo(
+                name + ('/' if info.is_dir else ''), date_time)
+            if info.is_dir:
+                self._archive.writestr(zinfo, b'')
+                return
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            with self._archive.open(
+                    zinfo, 'w', force_zip64=info.size >= 2 ** 31) as dst:
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+        else:
+            tinfo = tarfile.TarInfo(name)
+            tinfo.mtime = modified
+            if info.is_dir:
+                tinfo.type = tarfile.DIRTYPE
+                tinfo.mode = 0o755
+                self._archive.addfile(tinfo)
+            else:
+                tinfo.size = info.size
+                tinfo.mode = 0o644
+                self._archive.addfile(tinfo, src)
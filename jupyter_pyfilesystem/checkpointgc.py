@@ -0,0 +1,173 @@
+"""
+Remove checkpoints whose file no longer exists, or that are older than a
+maximum age
+"""
+
+import re
+import threading
+import time
+
+from fs.errors import FSError
+import fs.path as fspath
+from tornado.web import HTTPError
+
+from .entries import modified_time
+from .scheduler import (
+    BACKGROUND,
+    priority,
+)
+
+
+def checkpoint_pattern(template):
+    """
+    A regular expression matching checkpoint file names created with
+    `template`, with groups `basename`, `id` and `ext`
+    """
+    fields = {
+        'basename': '(?P<basename>.+)',
+        'id': '(?P<id>.*?)',
+        'ext': r'(?P<ext>(?:\.[^.]*)?)',
+    }
+    parts = re.split(r'\{(basename|id|ext)\}', template)
+    # Literal text and fields alternate
+    return re.compile('^{}$'.format(''.join(
+        fields[part] if n % 2 else re.escape(part)
+        for (n, part) in enumerate(parts))))
+
+
+class CheckpointCollector(object):
+    """
+    Find checkpoints whose file no longer exists, or that are older than
+    `max_age` seconds, by walking the filesystem, and remove them.
+
+    Filesystem calls are made at BACKGROUND priority and at most `rate`
+    checkpoints are removed per second. If `interval` is set a background
+    thread collects checkpoints at that interval (seconds).
+    """
+
+    def __init__(self, contents_manager, interval=0, max_age=0, rate=0):
+        self.contents_manager = contents_manager
+        self.interval = interval
+        self.max_age = max_age
+        self.rate = rate
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name='fs-checkpoint-gc', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        cm = self.contents_manager
+        while not self.stopped.wait(self.interval):
+            try:
+                removed = self.collect()
+                if removed:
+                    cm.log.info('Removed %d checkpoints', len(removed))
+            except Exception as e:
+                cm.log.warning('Failed to collect checkpoints: %s', e)
+
+    def _expired(self, dirpath, info, sources, pattern, now):
+        # (path, source path if it's missing, modified) if the checkpoint
+        # should be removed, otherwise None
+        m = pattern.match(info.name)
+        if m is None:
+            # Not a checkpoint
+            return None
+        path = fspath.join(dirpath, info.name)
+        source = m.group('basename') + m.group('ext')
+        modified = modified_time(info)
+        if source not in sources:
+            return path, fspath.join(fspath.dirname(dirpath), source), modified
+        if self.max_age and modified and modified < now - self.max_age:
+            return path, None, modified
+        return None
+
+    def find(self):
+        """
+        The checkpoints that should be removed, as `(path, source,
+        modified)` where `source` is the path of the missing file if the
+        checkpoint is orphaned, and the paths of checkpoint directories that
+        will then be empty
+        """
+        cm = self.contents_manager
+        checkpoint_dir = getattr(cm.checkpoints, 'checkpoint_dir', None)
+        if not checkpoint_dir:
+            return [], []
+        pattern = checkpoint_pattern(cm.checkpoints.checkpoint_template)
+        now = time.time()
+        # Names of files in directories that have a checkpoint directory
+        sources = {}
+        expired = []
+        empty = []
+        # Hidden files can have checkpoints, hidden directories are skipped
+        walker = cm.walker(
+            exclude_dirs=['.*'], include_dirs=[checkpoint_dir],
+            exclude_hidden=False, namespaces=['details'])
+        with priority(BACKGROUND):
+            for dirpath, dirs, files in walker.walk():
+                if fspath.basename(dirpath) == checkpoint_dir:
+                    names = sources.pop(fspath.dirname(dirpath), set())
+                    found = [self._expired(dirpath, info, names, pattern, now)
+                             for info in files]
+                    found = [f for f in found if f is not None]
+                    expired.extend(found)
+                    if files and not dirs and len(found) == len(files):
+                        empty.append(dirpath)
+                elif any(info.name == checkpoint_dir for info in dirs):
+                    sources[dirpath] = {info.name for info in files}
+        return expired, empty
+
+    def _unchanged(self, path, source, modified):
+        # Whether a checkpoint found by `find` should still be removed, the
+        # file may have been recreated or the checkpoint replaced since
+        fs = self.contents_manager.fs
+        try:
+            info = fs.getinfo(path, namespaces=['details'])
+        except FSError:
+            return False
+        return modified_time(info) == modified and not (
+            source is not None and fs.exists(source))
+
+    def _remove(self, path):
+        cm = self.contents_manager
+        try:
+            cm.delete_file(path)
+        except (FSError, HTTPError) as e:
+            # Changed since it was found
+            cm.log.debug('Not removing %s: %s', path, e)
+            return False
+        if self.rate > 0:
+            self.stopped.wait(1 / self.rate)
+        return True
+
+    def collect(self):
+        """
+        Remove checkpoints whose file no longer exists or that are older
+        than `max_age`, and checkpoint directories that are then empty.
+        Each checkpoint is checked again before it's removed.
+
+        :return: The paths of the removed checkpoints and directories
+        """
+        cm = self.contents_manager
+        expired, empty = self.find()
+        removed = []
+        with priority(BACKGROUND):
+            for path, source, modified in expired:
+                if self.stopped.is_set():
+                    break
+                if not self._unchanged(path, source, modified):
+                    cm.log.debug('Not removing %s: changed', path)
+                    continue
+                if self._remove(path):
+                    removed.append(path)
+            for path in empty:
+                if self.stopped.is_set():
+                    break
+                # Only removed if it's empty
+                if self._remove(path):
+                    removed.append(path)
+        return removed
@@ -0,0 +1,94 @@
+"""
+Store the cells of a notebook as separate content-addressed records
+"""
+
+from collections import OrderedDict
+from hashlib import sha256
+import json
+import threading
+
+import nbformat
+
+
+# Notebook metadata key containing the list of cell record digests
+CELLS_METADATA_KEY = 'jupyter_pyfilesystem_cells'
+
+
+def split_cells(nb):
+    """
+    Replace the cells of `nb` with a list of references to cell records, the
+    remaining notebook is a small manifest. Modifies `nb`.
+
+    :return: A dict of {digest: bytes} of the records in cell order
+    """
+    records = {}
+    digests = []
+    for cell in nb.cells:
+        cell = dict(cell, metadata=dict(cell.metadata))
+        # Transient, see nbformat.v4.rwbase.strip_transient
+        cell['metadata'].pop('trusted', None)
+        data = json.dumps(
+            cell, sort_keys=True, separators=(',', ':')).encode('utf8')
+        digest = sha256(data).hexdigest()
+        records[digest] = data
+        digests.append(digest)
+    nb.cells = []
+    nb.metadata[CELLS_METADATA_KEY] = digests
+    return records
+
+
+def join_cells(nb, read_record):
+    """
+    Replace references to cell records with the cells. Modifies `nb`.
+
+    :param read_record: A function that returns the bytes for a digest
+    :return: False if `nb` isn't chunked
+    """
+    digests = nb.metadata.pop(CELLS_METADATA_KEY, None)
+    if digests is None:
+        return False
+    nb.cells = [nbformat.from_dict(json.loads(read_record(d).decode('utf8')))
+                for d in digests]
+    return True
+
+
+class RecordCache(object):
+    """
+    The most recently read or written cell records, up to a total of
+    `max_bytes`. Records are content-addressed so they're shared by all
+    notebooks. 0 to disable.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._records = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, digest):
+        with self._lock:
+            data = self._records.get(digest)
+            if data is not None:
+                self._records.move_to_end(digest)
+            return data
+
+    def add(self, digest, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if digest in self._records:
+                self._records.move_to_end(digest)
+                return
+            self._records[digest] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._records.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self._bytes = 0
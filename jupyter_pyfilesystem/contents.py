@@ -4,12 +4,18 @@ from notebook.services.contents.checkpoints import (
     GenericCheckpointsMixin,
 )
 from traitlets import (
+    Any,
     Bool,
     default,
+    Dict,
+    Enum,
+    Float,
     Instance,
     Int,
     TraitError,
+    Type,
     Unicode,
+    validate,
 )
 from traitlets.config.configurable import LoggingConfigurable
 from tornado.ioloop import PeriodicCallback
@@ -20,22 +26,112 @@ from base64 import (
 )
 
 import atexit
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+)
 from functools import wraps
+from hashlib import sha256
+import io
+import json
 import mimetypes
 import nbformat
+from nbformat import sign
+import os
+import random
 import re
+import threading
+import time
 
 from fs import open_fs
+from fs.opener import parse as parse_fs_url
 from fs.base import FS
+from fs.subfs import SubFS
+from fs.wrap import WrapReadOnly
+from fs.wrapfs import WrapFS
 from fs.errors import (
     DestinationExists,
+    FSError,
     IllegalBackReference,
+    InvalidPath,
+    OperationTimeout,
+    RemoteConnectionError,
+    RemoveRootError,
     ResourceNotFound,
     ResourceReadOnly,
 )
 import fs.path as fspath
 
+from .archive import (
+    ARCHIVE_SCHEMES,
+    IndexedArchiveFS,
+)
+from .blobs import (
+    offload_outputs,
+    restore_outputs,
+)
+from .breaker import (
+    CircuitBreaker,
+    GuardedFS,
+)
+from .checkpointgc import CheckpointCollector
+from .chunks import (
+    join_cells,
+    RecordCache,
+    split_cells,
+)
+from .entries import (
+    DEFAULT_CREATED_DATE,
+    DirectoryEntry,
+    DirectoryListing,
+)
+from .hashes import (
+    content_hash,
+    ContentHashes,
+    DigestSet,
+    HASH_ALGORITHM,
+)
+from .mmapfile import map_file
+from .mounts import PrefixMountFS
+from .pool import (
+    FilesystemPool,
+    PooledFS,
+)
+from .scheduler import (
+    BACKGROUND,
+    CHECKPOINT,
+    current_priority,
+    LIST,
+    OPEN,
+    PriorityLimiter,
+    priority,
+    prioritized,
+    SAVE,
+    ScheduledFS,
+)
+from .signing import (
+    BatchedSignatureStore,
+    TrustedDigests,
+)
+from .tracing import (
+    activate,
+    JsonLinesSpanExporter,
+    span,
+    SpanExporter,
+    traced,
+    TracedFS,
+    Tracer,
+)
+from .validation import (
+    ALWAYS,
+    ON_CHANGE,
+    POLICIES,
+    SAMPLED,
+    validate_notebook,
+)
+from .walker import ParallelWalker
+
 
 # https://github.com/quantopian/pgcontents/blob/5fad3f6840d82e6acde97f8e3abe835765fa824b/pgcontents/api_utils.py#L25
 def _base_model(dirname, name):
@@ -48,20 +144,23 @@ def _base_model(dirname, name):
         'content': None,
         'format': None,
         'mimetype': None,
+        'hash': None,
+        'hash_algorithm': None,
         'size': 0,
         'type': None,
     }
 
 
-DEFAULT_CREATED_DATE = datetime.utcfromtimestamp(0)
-
-
 def _created_modified(details):
     created = details.created or details.modified or DEFAULT_CREATED_DATE
     modified = details.modified or details.created or DEFAULT_CREATED_DATE
     return created, modified
 
 
+def _error_model(e):
+    return {'error': str(e)}
+
+
 def wrap_fs_errors(type=None):
     """
     Decorator to convert fs.errors into HTTPErrors.
@@ -77,6 +176,10 @@ def wrap_fs_errors(type=None):
             except (ResourceNotFound, IllegalBackReference) as e:
                 self.log.debug('Caught exception: %s', e)
                 raise HTTPError(404, '{}"{}" not found: {}'.format(t, path, e))
+            except InvalidPath as e:
+                self.log.debug('Caught exception: %s', e)
+                raise HTTPError(400, '{}"{}" is invalid: {}'.format(
+                    t, path, e))
             except DestinationExists as e:
                 self.log.debug('Caught exception: {}'.format(e))
                 raise HTTPError(409, '{}"{}" conflicts: {}'.format(t, path, e))
@@ -84,36 +187,209 @@ def wrap_fs_errors(type=None):
                 self.log.debug('Caught exception: %s', e)
                 raise HTTPError(409, '{}"{}" is read-only: {}'.format(
                     t, path, e))
+            except RemoveRootError as e:
+                self.log.debug('Caught exception: %s', e)
+                raise HTTPError(
+                    409, '{}"{}" is a filesystem root: {}'.format(
+                        t, path, e))
+            except RemoteConnectionError as e:
+                self.log.warning('Caught exception: %s', e)
+                raise HTTPError(503, '{}"{}" is unavailable: {}'.format(
+                    t, path, e))
+            except OperationTimeout as e:
+                self.log.warning('Caught exception: %s', e)
+                raise HTTPError(504, '{}"{}" timed out: {}'.format(
+                    t, path, e))
         return check
     return wrap_fs_errors_with_type
 
 
 class FilesystemHandle(LoggingConfigurable):
 
-    def __init__(self, fs_url, *, create, writeable, closeonexit, keepalive):
+    def __init__(self, fs_url, *, create, writeable, closeonexit, keepalive,
+                 pool_size=1, cache_url=None, cache_mode='write-through',
+                 cache_max_size=0, cache_flush_interval=0, concurrency=0,
+                 timeout=0, failure_threshold=0, reset_timeout=30,
+                 archive_index=False, archive_cache_size=0, overlay_url=None,
+                 compact_interval=0, metadata_cache=False,
+                 metadata_cache_path=None, metadata_cache_max_age=0):
         m = re.match(r'^([a-z][a-z0-9+\-.]*)://', fs_url)
         if not m:
             raise TraitError('Invalid fs_url: {}'.format(fs_url))
         self.fs_url = fs_url
         self.fsname = m.group()
+        if pool_size > 1 and self.fsname == 'mem://':
+            self.log.warning('Ignoring pool_size for %s', self.fsname)
+            pool_size = 1
+        if overlay_url:
+            if self.fsname not in ARCHIVE_SCHEMES:
+                raise TraitError('overlay_url requires a zip:// or tar:// '
+                                 'fs_url: {}'.format(fs_url))
+            from .overlay import write_archive
+            archive_path = parse_fs_url(fs_url).resource
+            if create and not os.path.exists(archive_path):
+                write_archive(open_fs('mem://'), archive_path,
+                              self.fsname[:-3])
+            # The archive is only read, changes are made in the overlay
+            writeable = create = False
+            pool_size = 1
+        # Periodic maintenance such as flushing the cache runs in a thread
+        # so a slow backend doesn't block the IOLoop
+        self._executor = ThreadPoolExecutor(
+            1, thread_name_prefix='fs-maintenance')
+        self._running = {}
         self.log.debug('Opening filesystem %s', fs_url)
-        self.fs = open_fs(self.fs_url, writeable=writeable, create=create)
+        self.pool = FilesystemPool([
+            open_fs(self.fs_url, writeable=writeable, create=create)
+            for n in range(max(pool_size, 1))])
+        if pool_size > 1:
+            self.fs = PooledFS(self.pool)
+        else:
+            self.fs = self.pool.instances[0]
         self.log.info('Opened filesystem %s', self.fsname)
+        # Archive openers return a new empty archive if create is set
+        if (archive_index and not (writeable or create) and
+                self.fsname in ARCHIVE_SCHEMES):
+            self.fs = IndexedArchiveFS(self.fs, cache_size=archive_cache_size)
+            self.log.info('Indexed %d paths in %s', len(self.fs), self.fsname)
+        self.overlay = None
+        if overlay_url:
+            from .overlay import OverlayFS
+            self.log.debug('Opening overlay filesystem %s', overlay_url)
+            self.overlay = OverlayFS(
+                self.fs, open_fs(overlay_url, writeable=True, create=True))
+            self.fs = self.overlay
+            self.log.info('Opened overlay %s', overlay_url)
+        self.breaker = None
+        if failure_threshold > 0:
+            self.breaker = CircuitBreaker(
+                failure_threshold, reset_timeout, self.fsname, log=self.log)
+        if timeout > 0 or self.breaker is not None:
+            self.fs = GuardedFS(self.fs, timeout=timeout, breaker=self.breaker)
+        self.limiter = None
+        if concurrency > 0:
+            self.limiter = PriorityLimiter(concurrency, self.fsname)
+            self.fs = ScheduledFS(self.fs, self.limiter)
+        if cache_url:
+            from .tiered import (
+                TieredFS,
+                WRITE_BACK,
+            )
+            self.log.debug('Opening cache filesystem %s', cache_url)
+            cache_fs = open_fs(cache_url, writeable=True, create=True)
+            self.fs = tiered_fs = TieredFS(
+                self.fs, cache_fs, mode=cache_mode, max_size=cache_max_size,
+                close_wrapped=True, log=self.log)
+            self.log.info('Opened %s cache %s', cache_mode, cache_url)
+        if metadata_cache:
+            from .metacache import (
+                MetadataCacheFS,
+                MetadataStore,
+            )
+            if not metadata_cache_path:
+                from jupyter_core.paths import jupyter_runtime_dir
+                metadata_cache_path = os.path.join(
+                    jupyter_runtime_dir(), 'pyfilesystem-metadata.db')
+                os.makedirs(os.path.dirname(metadata_cache_path),
+                            exist_ok=True)
+            self.fs = MetadataCacheFS(
+                self.fs, MetadataStore(metadata_cache_path, fs_url),
+                max_age=metadata_cache_max_age, close_wrapped=True,
+                log=self.log)
+            self.log.info('Using metadata cache %s', metadata_cache_path)
         self.keepalive_cb = None
         if keepalive:
             self.enable_keepalive(keepalive)
+        self.flush_cb = None
+        if cache_url and cache_mode == WRITE_BACK and cache_flush_interval:
+            self.flush_cb = PeriodicCallback(
+                lambda: self.in_background('flush', tiered_fs.flush),
+                cache_flush_interval * 1000)
+            self.flush_cb.start()
+        self.compact_cb = None
+        if self.overlay and compact_interval:
+            self.compact_cb = PeriodicCallback(
+                lambda: self.in_background('compact', self.compact),
+                compact_interval * 1000)
+            self.compact_cb.start()
         if closeonexit:
             self.register_atexit()
 
     def close(self):
         self.log.debug('Closing filesystem %s', self.fs_url)
         self.enable_keepalive(0)
+        if self.flush_cb:
+            self.flush_cb.stop()
+            self.flush_cb = None
+        if self.compact_cb:
+            self.compact_cb.stop()
+            self.compact_cb = None
+        self._executor.shutdown()
         self.fs.close()
+        if self.overlay:
+            self.overlay.close()
+        self.pool.close()
         self.log.info('Closed filesystem %s', self.fsname)
 
+    def compact(self):
+        """
+        Write a new archive containing the changes in the overlay, replace
+        the archive at fs_url with it, and clear the overlay.
+        Waits for files that are open for writing to be closed, other calls
+        wait until this finishes.
+
+        :return: True if the archive was rewritten, False if there were no
+          changes
+        """
+        if self.overlay is None:
+            raise ValueError('{} has no overlay'.format(self.fsname))
+        archive_path = parse_fs_url(self.fs_url).resource
+        dirname, basename = os.path.split(archive_path)
+        tmp_path = os.path.join(dirname, '.compact-' + basename)
+        with self.overlay.lock():
+            # Writes that finish after the archive is written would be lost
+            self.overlay.wait_for_writers()
+            if not self.overlay.modified:
+                return False
+            from .overlay import write_archive
+            self.log.info('Compacting %s', self.fs_url)
+            write_archive(self.overlay, tmp_path, self.fsname[:-3])
+            os.replace(tmp_path, archive_path)
+            archive = open_fs(self.fs_url, writeable=False, create=False)
+            lower = archive
+            if isinstance(self.overlay.lower, IndexedArchiveFS):
+                lower = IndexedArchiveFS(
+                    archive, cache_size=self.overlay.lower.cache_size)
+            previous, self.pool = self.pool, FilesystemPool([archive])
+            self.overlay.reset(lower)
+            previous.close()
+            self.log.info('Compacted %s', self.fs_url)
+        return True
+
+    def in_background(self, name, func):
+        """
+        Call `func` in the maintenance thread with background priority,
+        unless the previous call with the same `name` hasn't finished
+
+        :return: A `Future` of the call
+        """
+        running = self._running.get(name)
+        if running is None or running.done():
+            running = self._running[name] = self._executor.submit(
+                self._call_in_background, name, func)
+        return running
+
+    def _call_in_background(self, name, func):
+        try:
+            with priority(BACKGROUND):
+                return func()
+        except Exception as e:
+            self.log.error('Failed to %s %s: %s', name, self.fs_url, e)
+
     def keepalive(self):
-        d = self.fs.getdetails('/')
-        self.log.debug('keepalive: %s', d)
+        for fs in self.pool.instances:
+            d = fs.getdetails('/')
+            self.log.debug('keepalive: %s', d)
 
     def enable_keepalive(self, interval):
         self.log.debug('enable_keepalive(%s)', interval)
@@ -128,6 +404,25 @@ class FilesystemHandle(LoggingConfigurable):
     def register_atexit(self):
         atexit.register(self.close)
 
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, fs_url, **kwargs):
+        """
+        Get a handle that is shared by all callers in this process with the
+        same fs_url and arguments, opening it if necessary
+        """
+        key = (fs_url, tuple(sorted(kwargs.items())))
+        with cls._shared_lock:
+            try:
+                return cls._shared[key]
+            except KeyError:
+                pass
+            instance = cls(fs_url, **kwargs)
+            cls._shared[key] = instance
+            return instance
+
 
 class FsContentsManager(ContentsManager):
     """
@@ -139,13 +434,172 @@ class FsContentsManager(ContentsManager):
 
     fs = Instance(FS)
 
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Used to report the time to the first response in the log
+        self._created = time.monotonic()
+        self._responded = False
+
     @default('fs')
     def _fs_default(self):
-        instance = FilesystemHandle(
-            self.fs_url, create=self.create, writeable=self.writeable,
-            closeonexit=self.closeonexit, keepalive=self.keepalive)
-        assert instance.fs_url == self.fs_url
-        return instance.fs
+        future = self._opening
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                # Already logged, try again now
+                pass
+        return self._open_fs()
+
+    def _open_fs(self):
+        start = time.monotonic()
+        if self.mounts:
+            fs = self._open_mounts()
+        else:
+            instance = self._open_handle(self.fs_url, {})
+            assert instance.fs_url == self.fs_url
+            self.fs_handle = instance
+            fs = instance.fs
+        if self.fs_subpath:
+            fs = self._open_subpath(fs)
+        self.log.info('Opened contents filesystem in %.3fs',
+                      time.monotonic() - start)
+        return self._wrap_fs(fs)
+
+    def open_in_background(self):
+        """
+        Start opening and verifying the filesystem in a background thread,
+        the first use of `fs` waits for it to finish
+        """
+        if self._opening is not None or self.trait_has_value('fs'):
+            return
+        self._opening = Future()
+        threading.Thread(
+            target=self._open_in_background, args=(self._opening,),
+            name='fs-open', daemon=True).start()
+
+    def _open_in_background(self, future):
+        try:
+            fs = self._open_fs()
+        except Exception as e:
+            self.log.error('Failed to open filesystem: %s', e)
+            future.set_exception(e)
+            return
+        try:
+            with priority(OPEN):
+                fs.getinfo('/')
+        except Exception as e:
+            # Requests will report the error if it persists
+            self.log.warning('Failed to verify filesystem: %s', e)
+        else:
+            self.log.info('Verified filesystem')
+        future.set_result(fs)
+
+    def _open_subpath(self, fs):
+        subpath = fspath.abspath(fspath.normpath(self.fs_subpath))
+        if self.create:
+            fs.makedirs(subpath, recreate=True)
+        self.log.debug('Using sub-directory %s', subpath)
+        return fs.opendir(subpath)
+
+    def _open_handle(self, fs_url, options):
+        kwargs = {
+            'create': self.create,
+            'writeable': self.writeable,
+            'closeonexit': self.closeonexit,
+            'keepalive': self.keepalive,
+            'pool_size': self.pool_size,
+            'cache_url': self.cache_url,
+            'cache_mode': self.cache_mode,
+            'cache_max_size': self.cache_max_size,
+            'cache_flush_interval': self.cache_flush_interval,
+            'concurrency': self.backend_concurrency,
+            'timeout': self.operation_timeout,
+            'failure_threshold': self.circuit_failure_threshold,
+            'reset_timeout': self.circuit_reset_timeout,
+            'archive_index': self.archive_index,
+            'archive_cache_size': self.archive_cache_size,
+            'overlay_url': self.overlay_url,
+            'compact_interval': self.overlay_compact_interval,
+            'metadata_cache': self.metadata_cache,
+            'metadata_cache_path': self.metadata_cache_path,
+            'metadata_cache_max_age': self.metadata_cache_max_age,
+        }
+        unknown = set(options).difference(kwargs)
+        if unknown:
+            raise TraitError('Invalid mount options for {}: {}'.format(
+                fs_url, ', '.join(sorted(unknown))))
+        kwargs.update(options)
+        if self.share_filesystem:
+            return FilesystemHandle.shared(fs_url, **kwargs)
+        return FilesystemHandle(fs_url, **kwargs)
+
+    def _open_mounts(self):
+        mounted = PrefixMountFS(auto_close=False)
+        mounts = dict(self.mounts)
+        if self.fs_url and '/' not in mounts:
+            mounts['/'] = self.fs_url
+        if '/' not in mounts:
+            # Paths outside the mounts are read-only instead of being kept
+            # in memory and lost on restart
+            mounted.mount('/', WrapReadOnly(open_fs('mem://')))
+            blob_dir = fspath.join(
+                '/', self.fs_subpath, fspath.relpath(self.blob_dir))
+            if ((self.blob_threshold or self.chunked_notebooks) and
+                    not any(fspath.isbase(prefix, blob_dir)
+                            for prefix in mounts)):
+                raise TraitError(
+                    'blob_dir {} must be in a mount if fs_url '
+                    'is not set'.format(blob_dir))
+        for prefix, options in sorted(mounts.items()):
+            if isinstance(options, str):
+                options = {'fs_url': options}
+            options = dict(options)
+            try:
+                fs_url = options.pop('fs_url')
+            except KeyError:
+                raise TraitError('No fs_url for mount {}'.format(prefix))
+            instance = self._open_handle(fs_url, options)
+            mounted.mount(prefix, instance.fs)
+            self.fs_handles[fspath.abspath(prefix)] = instance
+        return mounted
+
+    def backend_name(self, path):
+        """
+        The name of the filesystem backend used for path
+        """
+        if self.fs_handles:
+            mounted = self.fs
+            while not isinstance(mounted, PrefixMountFS):
+                mounted = mounted.delegate_fs()
+            if self.fs_subpath:
+                path = fspath.join(self.fs_subpath, fspath.relpath(path))
+            fs, _ = mounted.delegate(path)
+            for handle in self.fs_handles.values():
+                if handle.fs is fs:
+                    return handle.fsname
+        return self.fsname
+
+    def _is_mount_point(self, path):
+        fs = self.fs
+        while isinstance(fs, WrapFS):
+            fs, path = fs.delegate_path(path)
+        return isinstance(fs, PrefixMountFS) and fs.is_mount_point(path)
+
+    @validate('fs')
+    def _validate_fs(self, proposal):
+        return self._wrap_fs(proposal['value'])
+
+    def _wrap_fs(self, fs):
+        if isinstance(fs, TracedFS):
+            return fs
+        if self.user_limiter is not None and not (
+                isinstance(fs, ScheduledFS) and
+                fs.limiter is self.user_limiter):
+            fs = ScheduledFS(fs, self.user_limiter)
+        if self.tracer is not None and not isinstance(fs, TracedFS):
+            fs = TracedFS(fs, self.tracer)
+        return fs
 
     fs_url = Unicode(
         allow_none=False,
@@ -153,6 +607,22 @@ class FsContentsManager(ContentsManager):
         config=True,
     )
 
+    fs_subpath = Unicode(
+        default_value='',
+        help='''Use this sub-directory of the filesystem as the root, for
+        example `users/alice`. Paths can't refer to anything outside it.''',
+        config=True,
+    )
+
+    share_filesystem = Bool(
+        default_value=False,
+        help='''Share filesystems with other FsContentsManagers in the same
+        process that use the same fs_url and options, instead of opening a
+        new connection for each. Combine with fs_subpath to give each manager
+        an isolated view of a single filesystem.''',
+        config=True,
+    )
+
     create = Bool(
         default_value=True,
         help='Create filesystem if necessary',
@@ -178,10 +648,653 @@ class FsContentsManager(ContentsManager):
         config=True,
     )
 
+    mounts = Dict(
+        help='''Additional filesystems to mount at path prefixes.
+        Each key is a path, the value is either a FS URL or a dict containing
+        `fs_url` and optionally any of `create`, `writeable`, `keepalive`,
+        `pool_size`, `cache_url`, `cache_mode`, `cache_max_size`,
+        `cache_flush_interval`, `concurrency` (backend_concurrency),
+        `timeout` (operation_timeout), `failure_threshold`
+        (circuit_failure_threshold), `reset_timeout` (circuit_reset_timeout),
+        `archive_index`, `archive_cache_size`, `overlay_url`,
+        `compact_interval` (overlay_compact_interval), `metadata_cache`,
+        `metadata_cache_path` and `metadata_cache_max_age` to override the
+        defaults for that mount.
+        If `fs_url` is set it is mounted at `/`, otherwise paths outside the
+        mounts are read-only.''',
+        config=True,
+    )
+
+    pool_size = Int(
+        default_value=1,
+        help='''Number of independent connections to open to the filesystem,
+        calls are spread across them''',
+        config=True,
+    )
+
+    cache_url = Unicode(
+        default_value='',
+        help='''FS URL of a local filesystem used to cache files from fs_url,
+        for example `osfs:///tmp/cache`''',
+        config=True,
+    )
+
+    cache_mode = Enum(
+        ['write-through', 'write-back'],
+        default_value='write-through',
+        help='''Whether writes are immediately sent to fs_url (write-through)
+        or written to the cache and uploaded later (write-back)''',
+        config=True,
+    )
+
+    cache_max_size = Int(
+        default_value=0,
+        help='''Maximum size of the cache in bytes, least recently used files
+        are evicted. 0 for unlimited''',
+        config=True,
+    )
+
+    cache_flush_interval = Int(
+        default_value=30,
+        help='''Upload modified files from a write-back cache at this interval
+        (seconds)''',
+        config=True,
+    )
+
+    backend_concurrency = Int(
+        default_value=0,
+        help='''Maximum number of concurrent calls to each filesystem backend,
+        shared by all managers using it when share_filesystem is set. When
+        the limit is reached calls wait in order of priority: saves, opening
+        files, listing directories, checkpoints, then background work such as
+        search crawling. 0 for unlimited''',
+        config=True,
+    )
+
+    user_concurrency = Int(
+        default_value=0,
+        help='''Maximum number of concurrent filesystem calls made by this
+        manager, waiting in the same priority order as backend_concurrency.
+        0 for unlimited''',
+        config=True,
+    )
+
+    archive_index = Bool(
+        default_value=True,
+        help='''When a zip:// or tar:// filesystem is opened with writeable
+        and create disabled, list all its members once and answer metadata
+        calls from this index instead of the archive''',
+        config=True,
+    )
+
+    archive_cache_size = Int(
+        default_value=64 * 1024 * 1024,
+        help='''Maximum total bytes of recently read members of an indexed
+        archive kept in memory, 0 to disable''',
+        config=True,
+    )
+
+    metadata_cache = Bool(
+        default_value=False,
+        help='''Store directory listings in a local SQLite database that is
+        kept when the server restarts. After a restart stored listings are
+        used immediately and refreshed in the background''',
+        config=True,
+    )
+
+    metadata_cache_path = Unicode(
+        default_value='',
+        help='''Path of the metadata cache database, by default
+        pyfilesystem-metadata.db in the Jupyter runtime directory. It can be
+        shared by several filesystems and servers''',
+        config=True,
+    )
+
+    metadata_cache_max_age = Float(
+        default_value=0,
+        help='''Seconds that a listing read by this server is used from the
+        metadata cache before it's read from the filesystem again. Changes
+        made by this server are always seen immediately''',
+        config=True,
+    )
+
+    mmap_threshold = Int(
+        default_value=0,
+        help='''Files of at least this many bytes on a local filesystem, such
+        as osfs:// or the tiered cache, are memory mapped when their content
+        is read instead of being copied into memory first. If another
+        process truncates a file while it's mapped the server is killed by
+        SIGBUS, so only set this when files aren't modified outside the
+        server. 0 to disable''',
+        config=True,
+    )
+
+    download_chunk_size = Int(
+        default_value=4 * 1024 * 1024,
+        help='''Bytes read and sent at a time by the raw file download
+        handler, /api/pyfilesystem/raw''',
+        config=True,
+    )
+
+    overlay_url = Unicode(
+        default_value='',
+        help='''FS URL of a writable filesystem, for example `mem://` or
+        `osfs:///var/lib/jupyter/overlay`, used to record changes to a zip://
+        or tar:// fs_url. The archive is opened read-only, saved files are
+        written to the overlay and deleted files are hidden, until
+        compact_archives writes a new archive''',
+        config=True,
+    )
+
+    overlay_compact_interval = Int(
+        default_value=0,
+        help='''Write changes in the overlay to a new archive at this interval
+        (seconds), 0 to only compact when compact_archives is called''',
+        config=True,
+    )
+
+    operation_timeout = Float(
+        default_value=0,
+        help='''Fail filesystem calls, including reads and writes of open
+        files, that take longer than this (seconds) with a 504 error instead
+        of waiting for a hung backend. Calls that time out aren't cancelled
+        and may still complete. Deleting or moving a directory tree isn't
+        timed. 0 for no timeout''',
+        config=True,
+    )
+
+    circuit_failure_threshold = Int(
+        default_value=0,
+        help='''After this many consecutive connection errors or timeouts
+        from a filesystem, fail calls to it immediately with a 503 error until
+        a probe call succeeds. 0 to disable''',
+        config=True,
+    )
+
+    circuit_reset_timeout = Float(
+        default_value=30,
+        help='''Let one call through to probe a failed filesystem at this
+        interval (seconds), closing the circuit if it succeeds''',
+        config=True,
+    )
+
+    blob_threshold = Int(
+        default_value=0,
+        help='''Store notebook outputs of at least this many bytes as separate
+        content-addressed files in blob_dir instead of in the notebook, so
+        saving a notebook doesn't rewrite unchanged outputs. 0 to disable''',
+        config=True,
+    )
+
+    blob_dir = Unicode(
+        default_value='/.ipynb_blobs',
+        help='Directory used to store notebook output blobs and cell records',
+        config=True,
+    )
+
+    content_hash_cache_size = Int(
+        default_value=100000,
+        help='''Number of content hashes of files read or written recently to
+        remember, so unchanged files can be recognised without reading them.
+        0 to disable''',
+        config=True,
+    )
+
+    known_blob_cache_size = Int(
+        default_value=100000,
+        help='''Number of output blobs and cell records written or read
+        recently that are remembered to exist in blob_dir, so saving a
+        notebook doesn't check they exist. 0 to disable''',
+        config=True,
+    )
+
+    batch_concurrency = Int(
+        default_value=4,
+        help='''Maximum number of directories listed concurrently by
+        get_many, and of files written or read concurrently by
+        upload_archive and download_archive''',
+        config=True,
+    )
+
+    bulk_buffer_size = Int(
+        default_value=64 * 1024 * 1024,
+        help='''Maximum bytes of file contents waiting to be written by
+        upload_archive, or read ahead by download_archive''',
+        config=True,
+    )
+
+    walk_workers = Int(
+        default_value=8,
+        help='''Maximum number of directories listed concurrently when
+        walking the filesystem, for example by the search crawler. Combine
+        with pool_size so listings use separate connections''',
+        config=True,
+    )
+
+    chunked_notebooks = Bool(
+        default_value=False,
+        help='''Store each notebook cell as a separate content-addressed file
+        in blob_dir, the notebook file only lists the cells. Saving a notebook
+        only writes the cells that changed since it was last saved or opened.
+        Use export_notebook to create a plain notebook.''',
+        config=True,
+    )
+
+    cell_record_cache_size = Int(
+        default_value=64 * 1024 * 1024,
+        help='''Maximum total bytes of recently saved or read cell records of
+        chunked notebooks to keep in memory, so opening a notebook only reads
+        the cells that changed. 0 to disable''',
+        config=True,
+    )
+
+    trusted_digest_cache_size = Int(
+        default_value=10000,
+        help='''Number of content hashes of trusted notebooks to remember, so
+        that opening or saving a notebook that was signed or verified by this
+        server doesn't compute its signature or use the signature database.
+        0 to disable''',
+        config=True,
+    )
+
+    signature_flush_interval = Float(
+        default_value=0,
+        help='''Write new notebook signatures to the signature database in a
+        single transaction at this interval (seconds) instead of on every
+        save. Signatures that haven't been written are lost if the server
+        exits abnormally. 0 to write them immediately''',
+        config=True,
+    )
+
+    notebook_validation = Enum(
+        POLICIES,
+        default_value=ALWAYS,
+        help='''When to validate notebooks against the notebook format schema
+        when they're opened or saved: always, on-change to skip notebooks
+        whose content hash matches a notebook this server validated, or
+        sampled to also validate a fraction `validation_sample_rate` of
+        those''',
+        config=True,
+    )
+
+    validation_sample_rate = Float(
+        default_value=0.1,
+        help='''Fraction of unchanged notebooks that are validated when
+        notebook_validation is sampled''',
+        config=True,
+    )
+
+    validated_digest_cache_size = Int(
+        default_value=10000,
+        help='''Number of content hashes of validated notebooks to remember
+        for notebook_validation''',
+        config=True,
+    )
+
+    search_index = Bool(
+        default_value=False,
+        help='''Maintain a local full-text index of file paths, notebook cells
+        and text files for /api/pyfilesystem/search. The index is built by a
+        background crawler and updated when files are saved, renamed or
+        deleted''',
+        config=True,
+    )
+
+    search_index_path = Unicode(
+        default_value='',
+        help='''Path of the SQLite search index database. Defaults to a file
+        in the Jupyter runtime directory named after fs_url and fs_subpath,
+        or an in-memory database if fs_url isn't set''',
+        config=True,
+    )
+
+    search_crawl_interval = Int(
+        default_value=3600,
+        help='''Crawl the filesystem for changes made outside this server at
+        this interval (seconds), 0 to only crawl at startup''',
+        config=True,
+    )
+
+    checkpoint_gc_interval = Int(
+        default_value=0,
+        help='''Remove checkpoints whose file no longer exists, and
+        checkpoints older than checkpoint_max_age, in a background thread at
+        this interval (seconds). 0 to disable''',
+        config=True,
+    )
+
+    checkpoint_max_age = Int(
+        default_value=0,
+        help='''Remove checkpoints that haven't been updated for this many
+        seconds when checkpoints are collected. 0 to keep them while their
+        file exists''',
+        config=True,
+    )
+
+    checkpoint_gc_rate = Float(
+        default_value=10,
+        help='''Maximum number of checkpoints removed per second when
+        checkpoints are collected, 0 for unlimited''',
+        config=True,
+    )
+
+    tracing = Bool(
+        default_value=False,
+        help='''Record a span for each contents operation and each filesystem
+        call it makes, and pass them to the trace exporter''',
+        config=True,
+    )
+
+    trace_exporter_class = Type(
+        JsonLinesSpanExporter,
+        klass=SpanExporter,
+        help='Class used to export spans when tracing is enabled',
+        config=True,
+    )
+
+    slow_operation_threshold = Float(
+        default_value=0,
+        help='''Log a structured record for contents and checkpoint operations
+        that take at least this long (seconds), 0 to disable''',
+        config=True,
+    )
+
+    open_on_start = Bool(
+        default_value=False,
+        help='''Start opening the filesystem and checking that its root can be
+        read in a background thread when the server starts, instead of when
+        it's first used, so slow connections are made before the first
+        request''',
+        config=True,
+    )
+
+    allow_profiling = Bool(
+        default_value=False,
+        help='''Allow contents operations to be temporarily profiled using
+        the /api/pyfilesystem/profile endpoint''',
+        config=True,
+    )
+
+    fs_handle = Instance(FilesystemHandle, allow_none=True)
+
+    # Opening the filesystem in the background
+    _opening = Instance(Future, allow_none=True)
+
+    # Digests of blobs recently written or read from blob_dir
+    _known_blobs = Instance(DigestSet)
+
+    @default('_known_blobs')
+    def _known_blobs_default(self):
+        return DigestSet(self.known_blob_cache_size)
+
+    # Cell records recently saved or read
+    _cell_records = Instance(RecordCache)
+
+    @default('_cell_records')
+    def _cell_records_default(self):
+        return RecordCache(self.cell_record_cache_size)
+
+    content_hashes = Instance(ContentHashes)
+
+    @default('content_hashes')
+    def _content_hashes_default(self):
+        return ContentHashes(self.content_hash_cache_size)
+
+    user_limiter = Instance(PriorityLimiter, allow_none=True)
+
+    @default('user_limiter')
+    def _user_limiter_default(self):
+        if self.user_concurrency <= 0:
+            return None
+        return PriorityLimiter(
+            self.user_concurrency, 'user:{}'.format(self.fs_subpath or '/'))
+
+    _batch_executor = Instance(ThreadPoolExecutor)
+
+    @default('_batch_executor')
+    def _batch_executor_default(self):
+        return ThreadPoolExecutor(
+            self.batch_concurrency, thread_name_prefix='fs-batch')
+
+    fs_handles = Dict(
+        help='FilesystemHandles for each mount prefix',
+    )
+
+    @property
+    def fsname(self):
+        if self.fs_handle is not None:
+            return self.fs_handle.fsname
+        # fs was set directly
+        fs = self.fs
+        while isinstance(fs, WrapFS):
+            fs = fs.delegate_fs()
+        return type(fs).__name__
+
+    def scheduler_metrics(self):
+        """
+        Metrics of the concurrency limiters used by this manager, including
+        the current queue depth of each
+        """
+        limiters = [self.user_limiter]
+        handles = [self.fs_handle] + list(self.fs_handles.values())
+        limiters.extend(getattr(h, 'limiter', None) for h in handles)
+        unique = []
+        for limiter in limiters:
+            if limiter is not None and not any(
+                    limiter is u for u in unique):
+                unique.append(limiter)
+        return [limiter.metrics() for limiter in unique]
+
+    def compact_archives(self):
+        """
+        Rewrite each archive that has an overlay to include the changes
+        made since it was last compacted
+
+        :return: A list of the fs_urls of the archives that were rewritten
+        """
+        handles = [self.fs_handle] + list(self.fs_handles.values())
+        compacted = []
+        for handle in handles:
+            if getattr(handle, 'overlay', None) is not None and (
+                    handle.fs_url not in compacted and handle.compact()):
+                compacted.append(handle.fs_url)
+        return compacted
+
+    def circuit_metrics(self):
+        """
+        The state of the circuit breaker of each filesystem backend
+        """
+        handles = [self.fs_handle] + list(self.fs_handles.values())
+        breakers = []
+        for handle in handles:
+            breaker = getattr(handle, 'breaker', None)
+            if breaker is not None and not any(
+                    breaker is b for b in breakers):
+                breakers.append(breaker)
+        return [breaker.metrics() for breaker in breakers]
+
+    # A ContentsProfiler, the profiling module is only imported if enabled
+    profiler = Instance(LoggingConfigurable, allow_none=True)
+
+    @default('profiler')
+    def _profiler_default(self):
+        if not self.allow_profiling:
+            return None
+        from .profiling import ContentsProfiler
+        return ContentsProfiler(parent=self, log=self.log)
+
+    # A SearchIndex, the search module is only imported if enabled
+    search = Instance(LoggingConfigurable, allow_none=True)
+
+    @default('search')
+    def _search_default(self):
+        if not self.search_index:
+            return None
+        from .search import (
+            Crawler,
+            SearchIndex,
+        )
+        db_path = self.search_index_path
+        if not db_path and self.fs_url:
+            from jupyter_core.paths import jupyter_runtime_dir
+            key = json.dumps([self.fs_url, self.fs_subpath, self.mounts],
+                             sort_keys=True)
+            db_path = os.path.join(
+                jupyter_runtime_dir(), 'pyfilesystem-search-{}.db'.format(
+                    sha256(key.encode('utf8')).hexdigest()[:16]))
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        search = SearchIndex(
+            parent=self, log=self.log, db_path=db_path or ':memory:')
+        # Open the filesystem in this thread before the crawler uses it,
+        # unless it's being opened in the background
+        if self._opening is None:
+            self.fs
+        self.crawler = Crawler(search, self, self.search_crawl_interval)
+        self.crawler.start()
+        atexit.register(self.crawler.stop)
+        return search
+
+    # The search index Crawler
+    crawler = Any(allow_none=True)
+
+    checkpoint_collector = Instance(CheckpointCollector, allow_none=True)
+
+    @default('checkpoint_collector')
+    def _checkpoint_collector_default(self):
+        if self.checkpoint_gc_interval <= 0:
+            return None
+        collector = CheckpointCollector(
+            self, interval=self.checkpoint_gc_interval,
+            max_age=self.checkpoint_max_age, rate=self.checkpoint_gc_rate)
+        collector.start()
+        atexit.register(collector.stop)
+        return collector
+
+    def collect_checkpoints(self):
+        """
+        Remove checkpoints whose file no longer exists, checkpoints older
+        than checkpoint_max_age, and checkpoint directories that are then
+        empty
+
+        :return: The removed paths
+        """
+        return CheckpointCollector(
+            self, max_age=self.checkpoint_max_age,
+            rate=self.checkpoint_gc_rate).collect()
+
+    tracer = Instance(Tracer, allow_none=True)
+
+    @default('tracer')
+    def _tracer_default(self):
+        listeners = []
+        if self.slow_operation_threshold > 0:
+            from .profiling import SlowOperationLogger
+            listeners.append(SlowOperationLogger(
+                parent=self, log=self.log,
+                threshold=self.slow_operation_threshold))
+        if self.profiler is not None:
+            listeners.append(self.profiler)
+        if not (self.tracing or listeners):
+            return None
+        exporter = None
+        if self.tracing:
+            exporter = self.trace_exporter_class(parent=self, log=self.log)
+        tracer = Tracer(
+            parent=self, log=self.log, exporter=exporter, listeners=listeners)
+        atexit.register(tracer.close)
+        return tracer
+
     @default('checkpoints_class')
     def _checkpoints_class_default(self):
         return FsCheckpoints
 
+    trusted_digests = Instance(TrustedDigests)
+
+    @default('trusted_digests')
+    def _trusted_digests_default(self):
+        return TrustedDigests(self.trusted_digest_cache_size)
+
+    @default('notary')
+    def _notary_default(self):
+        notary = sign.NotebookNotary(parent=self)
+        if self.signature_flush_interval > 0:
+            notary.store = BatchedSignatureStore(notary.store)
+            self.signature_flush_cb = PeriodicCallback(
+                notary.store.flush, self.signature_flush_interval * 1000)
+            self.signature_flush_cb.start()
+            atexit.register(notary.store.flush)
+        return notary
+
+    signature_flush_cb = Instance(PeriodicCallback, allow_none=True)
+
+    def check_and_sign(self, nb, path='', digest=None):
+        """
+        Sign the notebook if all its cells are trusted, unless `digest`, the
+        content hash of the saved notebook, is known to be trusted
+
+        :return: Whether the notebook is trusted
+        """
+        if digest is not None and digest in self.trusted_digests:
+            return True
+        if not self.notary.check_cells(nb):
+            self.log.warning('Notebook %s is not trusted', path)
+            return False
+        self.notary.sign(nb)
+        if digest is not None:
+            self.trusted_digests.add(digest)
+        return True
+
+    def mark_trusted_cells(self, nb, path='', digest=None):
+        """
+        Mark cells as trusted if the notebook's signature matches, or if
+        `digest`, the content hash of the notebook file, is known to be
+        trusted
+        """
+        if digest is not None and digest in self.trusted_digests:
+            trusted = True
+        else:
+            trusted = self.notary.check_signature(nb)
+            if trusted and digest is not None:
+                self.trusted_digests.add(digest)
+        if not trusted:
+            self.log.warning('Notebook %s is not trusted', path)
+        self.notary.mark_cells(nb, trusted)
+
+    validated_digests = Instance(DigestSet)
+
+    @default('validated_digests')
+    def _validated_digests_default(self):
+        return DigestSet(self.validated_digest_cache_size)
+
+    def _needs_validation(self, digest):
+        if digest is None or digest not in self.validated_digests:
+            return True
+        if self.notebook_validation == ON_CHANGE:
+            return False
+        if self.notebook_validation == SAMPLED:
+            return random.random() < self.validation_sample_rate
+        return True
+
+    def validate_notebook_model(self, model, digest=None):
+        """
+        Add a failed-validation message to a notebook model, unless `digest`,
+        the content hash of the notebook file, is of a notebook that has
+        been validated and the `notebook_validation` policy allows skipping
+        it
+        """
+        if not self._needs_validation(digest):
+            return model
+        try:
+            validate_notebook(model['content'])
+        except nbformat.ValidationError as e:
+            model['message'] = 'Notebook validation failed: {}:\n{}'.format(
+                e.message, json.dumps(
+                    e.instance, indent=1, default=lambda obj: '<UNKNOWN>'))
+        else:
+            if digest is not None:
+                self.validated_digests.add(digest)
+        return model
+
     # https://github.com/quantopian/pgcontents/blob/5fad3f6840d82e6acde97f8e3abe835765fa824b/pgcontents/pgmanager.py#L115
     def guess_type(self, path, allow_directory=True):
         """
@@ -196,7 +1309,13 @@ class FsContentsManager(ContentsManager):
         else:
             return 'file'
 
-    def get(self, path, content=True, type=None, format=None):
+    @traced
+    def get(self, path, content=True, type=None, format=None,
+            known_hash=None):
+        """
+        :param known_hash: If the content hash of a file or notebook equals
+          this return the model without content
+        """
         self.log.debug('get(%s %s)', path, type)
         if type is None:
             type = self.guess_type(path)
@@ -208,7 +1327,20 @@ class FsContentsManager(ContentsManager):
             }[type]
         except KeyError:
             raise ValueError("Unknown type passed: '{}'".format(type))
-        return fn(path=path, content=content, format=format, type=type)
+        with priority(LIST if type == 'directory' else OPEN):
+            model = None
+            if content and known_hash and type != 'directory':
+                model = fn(path=path, content=False, format=format, type=type)
+                if model['hash'] != known_hash:
+                    model = None
+            if model is None:
+                model = fn(
+                    path=path, content=content, format=format, type=type)
+        if not self._responded:
+            self._responded = True
+            self.log.info('First contents response %.3fs after startup',
+                          time.monotonic() - self._created)
+        return model
 
     @wrap_fs_errors('notebook')
     def _get_notebook(self, path, content, format, *, type=None, trust=True):
@@ -217,13 +1349,23 @@ class FsContentsManager(ContentsManager):
         model = self._get_file(path, content, format)
         model['type'] = 'notebook'
         if content:
-            nb = nbformat.reads(model['content'], as_version=4)
+            with span(self.tracer, 'parse'):
+                # Validated once below instead of by nbformat.reads
+                nb = nbformat.convert(
+                    nbformat.reader.reads(model['content']), 4)
+                self._read_cells(nb)
+                restore_outputs(nb, self._read_blob)
             if trust:
-                self.mark_trusted_cells(nb, path)
+                with span(self.tracer, 'sign'):
+                    self.mark_trusted_cells(nb, path, digest=model['hash'])
             model['content'] = nb
             model['format'] = 'json'
+            # Checkpoints and notebooks read for the search index aren't
+            # shown to the user, a restored checkpoint is validated when
+            # it's saved
             if trust:
-                self.validate_notebook_model(model)
+                with span(self.tracer, 'validate'):
+                    self.validate_notebook_model(model, digest=model['hash'])
         return model
 
     @wrap_fs_errors('directory')
@@ -233,26 +1375,145 @@ class FsContentsManager(ContentsManager):
         d = self.fs.getdetails(path)
         if not d.is_dir:
             raise HTTPError(404, '"%s" not a directory', path)
+        model = self._directory_model(path, d)
 
+        if content:
+            model['content'] = self._list_directory(path).models()
+            model['format'] = 'json'
+        return model
+
+    @traced
+    @prioritized(LIST)
+    @wrap_fs_errors('directory')
+    def list_directory(self, path):
+        """
+        The children of a directory as a `DirectoryListing` of compact
+        entries, which are only converted to models when accessed
+        """
+        self.log.debug('list_directory(%s)', path)
+        return self._list_directory(self.fs.validatepath(path))
+
+    def _list_directory(self, path):
+        entries = []
+        for info in self.fs.scandir(path, ['basic', 'details']):
+            child_path = fspath.join(path, info.name)
+            if info.is_dir:
+                entries.append(DirectoryEntry.from_info(info, 'directory'))
+            else:
+                entries.append(DirectoryEntry.from_info(
+                    info, self.guess_type(child_path, allow_directory=False),
+                    self.content_hashes.get(child_path, info)))
+        return DirectoryListing(path, entries)
+
+    def walker(self, **kwargs):
+        """
+        A `ParallelWalker` over this filesystem that skips checkpoints, and
+        hidden files and directories unless allow_hidden is set.
+        Keyword arguments override the `ParallelWalker` defaults.
+        """
+        options = {
+            'workers': self.walk_workers,
+            'exclude_hidden': not self.allow_hidden,
+            'exclude_dirs': [],
+            'tracer': self.tracer,
+        }
+        checkpoint_dir = getattr(self.checkpoints, 'checkpoint_dir', None)
+        if checkpoint_dir:
+            options['exclude_dirs'].append(checkpoint_dir)
+        options.update(kwargs)
+        return ParallelWalker(self._walk_fs(), **options)
+
+    def _walk_fs(self):
+        # Borrow a separate connection from the pool for each listing, unless
+        # the pool is wrapped by caches or limits that would be bypassed
+        fs = self.fs
+        handle = self.fs_handle
+        if handle is None or not isinstance(handle.fs, PooledFS):
+            return fs
+        instances = handle.pool.instances
+        if self.fs_subpath:
+            subpath = fspath.abspath(fspath.normpath(self.fs_subpath))
+            instances = [SubFS(fs, subpath) for fs in instances]
+        return FilesystemPool([self._wrap_fs(fs) for fs in instances])
+
+    def _directory_model(self, path, d):
         model = _base_model(*fspath.split(path))
         model['type'] = 'directory'
         model['size'] = None
         model['format'] = None
         model['created'], model['last_modified'] = _created_modified(d)
-
-        if content:
-            model['content'] = []
-            model['format'] = 'json'
-            for item in self.fs.scandir(path, ['basic', 'details']):
-                child_path = fspath.join(path, item.name)
-                if item.is_dir:
-                    model['content'].append(
-                        self._get_directory(child_path, False, None))
-                if item.is_file:
-                    model['content'].append(
-                        self._get_file(child_path, False, format))
         return model
 
+    @traced
+    @prioritized(LIST)
+    def get_many(self, paths):
+        """
+        Get models without content for many paths. Paths are grouped by
+        parent directory so each directory is listed once, and directories
+        are listed concurrently.
+
+        :return: A list of models in the same order as `paths`, None for
+          paths that don't exist and `{'error': message}` for paths that are
+          invalid or couldn't be read
+        """
+        self.log.debug('get_many(%d paths)', len(paths))
+        normalized = []
+        groups = OrderedDict()
+        for path in paths:
+            try:
+                path = self.fs.validatepath(path)
+            except IllegalBackReference:
+                path = None
+            except FSError as e:
+                path = _error_model(e)
+            else:
+                groups.setdefault(fspath.dirname(path), set()).add(path)
+            normalized.append(path)
+
+        get_group = self._in_context(lambda item: self._get_group(*item))
+        models = {}
+        if len(groups) > 1:
+            results = self._batch_executor.map(get_group, groups.items())
+        else:
+            results = map(get_group, groups.items())
+        for result in results:
+            models.update(result)
+        return [p if isinstance(p, dict) else models.get(p)
+                for p in normalized]
+
+    def _get_group(self, parent, paths):
+        if len(paths) == 1 or '/' in paths:
+            infos = {}
+            for path in paths:
+                try:
+                    infos[path] = self.fs.getdetails(path)
+                except ResourceNotFound:
+                    pass
+                except FSError as e:
+                    infos[path] = e
+        else:
+            try:
+                infos = {fspath.join(parent, info.name): info for info in
+                         self.fs.scandir(parent, ['basic', 'details'])}
+            except ResourceNotFound:
+                return {}
+            except FSError as e:
+                self.log.warning('Failed to list %s: %s', parent, e)
+                return {path: _error_model(e) for path in paths}
+        models = {}
+        for path in paths:
+            info = infos.get(path)
+            if info is None:
+                continue
+            if isinstance(info, FSError):
+                self.log.warning('Failed to get %s: %s', path, info)
+                models[path] = _error_model(info)
+            elif info.is_dir:
+                models[path] = self._directory_model(path, info)
+            else:
+                models[path] = self._file_model(path, info, False, None)
+        return models
+
     @wrap_fs_errors('file')
     def _get_file(self, path, content, format, *, type=None):
         self.log.debug('_get_file(%s)', path)
@@ -267,36 +1528,233 @@ class FsContentsManager(ContentsManager):
 
     def _file_model(self, path, f, content, format):
         model = _base_model(*fspath.split(path))
-        model['type'] = self.guess_type(path)
+        model['type'] = self.guess_type(path, allow_directory=False)
         model['created'], model['last_modified'] = _created_modified(f)
         model['size'] = f.size
         if content:
-            model['content'], model['format'] = self._read_file(path, format)
+            model['content'], model['format'] = self._read_file(
+                path, format, f)
             model['mimetype'] = mimetypes.guess_type(model['path'])[0]
+        model['hash'] = self.content_hashes.get(path, f)
+        if model['hash']:
+            model['hash_algorithm'] = HASH_ALGORITHM
         return model
 
     @wrap_fs_errors('file')
-    def _read_file(self, path, format):
+    def _read_file(self, path, format, info=None):
         self.log.debug('_read_file(%s)', path)
         """
         :param format:
           - 'text': contents will be decoded as UTF-8.
           - 'base64': raw bytes contents will be encoded as base64.
           - None: try to decode as UTF-8, and fall back to base64
+        :param info: Details of the file, used to remember its content hash
+        """
+        # Local files are mapped so they are hashed and decoded or encoded
+        # without reading them into an intermediate bytes object
+        with self.fs.openbin(path, 'r') as fo, \
+                map_file(fo, self.mmap_threshold) as mapped:
+            data = fo.read() if mapped is None else mapped
+            if info is not None:
+                self.content_hashes.update(path, info, data)
+            if self.tracer is not None:
+                self.tracer.set_attribute('size', len(data))
+            if format is None or format == 'text':
+                try:
+                    return str(data, 'utf8'), 'text'
+                except UnicodeError:
+                    if format == 'text':
+                        raise HTTPError(
+                            400,
+                            "{} is not UTF-8 encoded".format(path),
+                            reason='bad format')
+            return b64encode(data).decode('ascii'), 'base64'
+
+    @traced
+    @prioritized(OPEN)
+    @wrap_fs_errors('file')
+    def download_file(self, path, fileobj):
+        """
+        Write the content of a file to the writable binary file object
+        `fileobj` in chunks of `download_chunk_size` bytes, so large files
+        can be sent with bounded memory. The file is reopened for each chunk
+        so that no filesystem slot is held while a chunk is being written.
+
+        :return: The number of bytes written
         """
-        with self.fs.openbin(path, 'r') as fo:
-            bcontent = fo.read()
-        if format is None or format == 'text':
+        self.log.debug('download_file(%s)', path)
+        path = self.fs.validatepath(path)
+        size = 0
+        while True:
+            with self.fs.openbin(path, 'r') as fo:
+                fo.seek(size)
+                chunk = fo.read(self.download_chunk_size)
+            if not chunk:
+                break
+            fileobj.write(chunk)
+            size += len(chunk)
+        if self.tracer is not None:
+            self.tracer.set_attribute('size', size)
+        return size
+
+    def _pipeline(self, callback=None):
+        from .bulk import Pipeline
+        return Pipeline(self._batch_executor, 2 * self.batch_concurrency,
+                        self.bulk_buffer_size, callback=callback)
+
+    def _in_context(self, func):
+        # Run func in another thread in the current trace span and priority
+        parent = self.tracer.current if self.tracer is not None else None
+        level = current_priority()
+
+        def run(*args):
+            with activate(self.tracer, parent), priority(level):
+                return func(*args)
+        return run
+
+    @traced
+    @prioritized(SAVE)
+    @wrap_fs_errors('directory')
+    def upload_archive(self, path, fileobj, kind='tar'):
+        """
+        Unpack a tar or zip archive of files and directories into directory
+        `path`, creating it if necessary. Members are read from the archive
+        in order while up to `batch_concurrency` files are written
+        concurrently, and the models are listed once per directory at the
+        end instead of once per file.
+
+        Hidden members are skipped unless `allow_hidden` is set.
+
+        :return: Models without content of the unpacked files and
+          directories, in archive order
+        """
+        from .bulk import (
+            ARCHIVE_ERRORS,
+            ARCHIVE_FORMATS,
+            archive_members,
+            member_path,
+        )
+        self.log.debug('upload_archive(%s, %s)', path, kind)
+        if kind not in ARCHIVE_FORMATS:
+            raise HTTPError(400, 'Unknown archive format {!r}'.format(kind))
+        root = self.fs.validatepath(path)
+        self.fs.makedirs(root, recreate=True)
+        created = {root}
+        paths = []
+        written = set()
+
+        def write(p, data):
+            with self.fs.openbin(p, 'w') as fo:
+                fo.write(data)
+
+        write = self._in_context(write)
+        pipeline = self._pipeline()
+        try:
+            for name, data in archive_members(fileobj, kind):
+                p = member_path(root, name)
+                if not self.allow_hidden and any(
+                        part.startswith('.') for part in
+                        fspath.iteratepath(fspath.relativefrom(root, p))):
+                    self.log.debug('Skipping hidden archive member %s', name)
+                    continue
+                if p in written:
+                    # Repeated in the archive, the last copy wins
+                    pipeline.wait()
+                else:
+                    paths.append(p)
+                dirpath = p if data is None else fspath.dirname(p)
+                if dirpath not in created:
+                    self.fs.makedirs(dirpath, recreate=True)
+                    created.update(fspath.recursepath(dirpath))
+                if data is not None:
+                    written.add(p)
+                    self.content_hashes.discard(p)
+                    pipeline.submit(len(data), write, p, data)
+        except (ValueError,) + ARCHIVE_ERRORS as e:
+            raise HTTPError(400, 'Invalid archive: {}'.format(e))
+        finally:
+            pipeline.wait()
+        if self.tracer is not None:
+            self.tracer.set_attribute('files', len(written))
+        models = self.get_many(paths)
+        for model in models:
+            if model is not None and self.search is not None:
+                modified = model['last_modified']
+                self._update_search(
+                    'add', model['path'], model['type'], model['size'],
+                    modified.timestamp() if modified else None, None)
+        return models
+
+    @traced
+    @prioritized(OPEN)
+    @wrap_fs_errors('directory')
+    def download_archive(self, path, fileobj, kind='zip'):
+        """
+        Write a zip or tar archive of directory `path` to the writable
+        binary file object `fileobj`, which doesn't have to be seekable.
+        Hidden files and checkpoints are skipped like in listings.
+
+        Files are read ahead concurrently by up to `batch_concurrency`
+        threads while earlier files are added to the archive. Files larger
+        than `download_chunk_size` are instead streamed into the archive
+        when their turn comes.
+
+        :return: The number of files in the archive
+        """
+        from .bulk import (
+            ARCHIVE_FORMATS,
+            ArchiveWriter,
+        )
+        self.log.debug('download_archive(%s, %s)', path, kind)
+        if kind not in ARCHIVE_FORMATS:
+            raise HTTPError(400, 'Unknown archive format {!r}'.format(kind))
+        path = self.fs.validatepath(path)
+        if not self.fs.getdetails(path).is_dir:
+            raise HTTPError(404, '"%s" not a directory', path)
+        prefix = fspath.basename(path)
+        nfiles = 0
+
+        def read(p, info):
+            if info.is_dir or info.size > self.download_chunk_size:
+                return p, info, None
+            with self.fs.openbin(p, 'r') as fo:
+                return p, info, fo.read()
+
+        with ArchiveWriter(fileobj, kind) as archive:
+            def add(result):
+                p, info, data = result
+                name = fspath.relpath(
+                    fspath.join(prefix, fspath.relpath(
+                        fspath.frombase(path, p))))
+                if data is not None:
+                    archive.add(name, info, io.BytesIO(data))
+                elif info.is_dir:
+                    archive.add(name, info)
+                else:
+                    with self.fs.openbin(p, 'r') as src:
+                        archive.add(name, info, src)
+
+            pipeline = self._pipeline(callback=add)
+            read = self._in_context(read)
             try:
-                return bcontent.decode('utf8'), 'text'
-            except UnicodeError:
-                if format == 'text':
-                    raise HTTPError(
-                        400,
-                        "{} is not UTF-8 encoded".format(path),
-                        reason='bad format')
-        return b64encode(bcontent).decode('ascii'), 'base64'
+                walker = self.walker(namespaces=['details'])
+                for dirpath, dirs, files in walker.walk(path):
+                    for info in dirs + files:
+                        size = 0 if info.is_dir else info.size
+                        if size > self.download_chunk_size:
+                            size = 0
+                        nfiles += not info.is_dir
+                        pipeline.submit(
+                            size, read, fspath.join(dirpath, info.name),
+                            info)
+            finally:
+                pipeline.wait()
+        if self.tracer is not None:
+            self.tracer.set_attribute('files', nfiles)
+        return nfiles
 
+    @traced
+    @prioritized(SAVE)
     def save(self, model, path):
         self.log.debug('save(%s %s)', path, model['type'])
         self.run_pre_save_hook(model=model, path=path)
@@ -310,17 +1768,143 @@ class FsContentsManager(ContentsManager):
             }[model['type']]
         except KeyError:
             raise ValueError("Unknown type passed: '{}'".format(type))
-        return fn(path, model)
+        # Saving may replace the content of the model
+        content, format = model.get('content'), model.get('format')
+        saved = fn(path, model)
+        if self.search is not None:
+            self._index_saved(saved, model['type'], content, format)
+        return saved
+
+    def _index_saved(self, saved, type, content, format):
+        from .search import notebook_text
+        path = saved['path']
+        if not self.search.wants_content(path, type, saved['size']):
+            content = None
+        elif type == 'notebook':
+            content = notebook_text(content)
+        elif format != 'text':
+            content = None
+        modified = saved['last_modified']
+        self._update_search(
+            'add', path, type, saved['size'],
+            modified.timestamp() if modified else None, content)
+
+    def _update_search(self, method, path, *args):
+        if self.search is None:
+            return
+        import sqlite3
+        try:
+            getattr(self.search, method)(path, *args)
+        except sqlite3.Error as e:
+            self.log.warning('Failed to update search index for %s: %s',
+                             path, e)
+
+    def index_content(self, path, type):
+        """
+        The text of a file or notebook to add to the search index
+        """
+        from .search import notebook_text
+        if type == 'notebook':
+            return notebook_text(
+                self._get_notebook(path, True, None, trust=False)['content'])
+        return self.fs.readtext(path)
 
     @wrap_fs_errors('notebook')
     def _save_notebook(self, path, model, sign=True):
         self.log.debug('_save_notebook(%s)', path)
-        nb = nbformat.from_dict(model['content'])
-        if sign:
-            self.check_and_sign(nb, path)
+        with span(self.tracer, 'parse'):
+            nb = nbformat.from_dict(model['content'])
+        with span(self.tracer, 'validate'):
+            valid = 'message' not in self.validate_notebook_model(
+                {'content': nb})
+        if not valid:
+            self.log.error('Notebook %s is invalid', path)
+        # The signature is of the whole notebook, sign it before outputs or
+        # cells are moved out of it
+        split = self.blob_threshold > 0 or self.chunked_notebooks
+        trusted = False
+        if sign and split:
+            with span(self.tracer, 'sign'):
+                trusted = self.check_and_sign(nb, path)
+        if self.blob_threshold > 0:
+            self._write_blobs(offload_outputs(nb, self.blob_threshold))
+        if self.chunked_notebooks:
+            self._write_cells(split_cells(nb))
+        with span(self.tracer, 'parse'):
+            # Validated above instead of by nbformat.writes
+            model['content'] = nbformat.versions[nb.nbformat].writes_json(nb)
+        model['format'] = 'text'
+        # The hash of the saved file, which identifies the whole notebook
+        # since cells and outputs are content-addressed
+        digest = content_hash(model['content'].encode('utf8'))
+        if valid:
+            self.validated_digests.add(digest)
+        if sign and not split:
+            with span(self.tracer, 'sign'):
+                trusted = self.check_and_sign(nb, path, digest=digest)
+        if trusted:
+            self.trusted_digests.add(digest)
+        return self._save_file(path, model, digest=digest)
+
+    def _blob_path(self, digest):
+        return fspath.join(self.blob_dir, digest[:2], digest)
+
+    def _read_blob(self, digest):
+        try:
+            data = self.fs.readbytes(self._blob_path(digest))
+        except ResourceNotFound:
+            # Removed since it was written, the next save writes it again
+            self._known_blobs.discard(digest)
+            raise
+        # Notebooks are trusted by the content hash of the notebook file,
+        # which only covers the blobs it references if they're verified
+        if content_hash(data) != digest:
+            raise HTTPError(500, 'Blob {} is corrupt'.format(digest))
+        self._known_blobs.add(digest)
+        return data
+
+    def _write_blobs(self, blobs):
+        for digest, data in blobs.items():
+            if digest in self._known_blobs:
+                continue
+            blob_path = self._blob_path(digest)
+            if not self.fs.exists(blob_path):
+                self.log.debug('Writing blob %s', digest)
+                self.fs.makedirs(fspath.dirname(blob_path), recreate=True)
+                self.fs.writebytes(blob_path, data)
+            self._known_blobs.add(digest)
+
+    def _read_cells(self, nb):
+        def read_record(digest):
+            data = self._cell_records.get(digest)
+            if data is None:
+                data = self._read_blob(digest)
+                self._cell_records.add(digest, data)
+            return data
+
+        join_cells(nb, read_record)
+
+    def _write_cells(self, records):
+        self._write_blobs(records)
+        for digest, data in records.items():
+            self._cell_records.add(digest, data)
+
+    @traced
+    @prioritized(SAVE)
+    def export_notebook(self, path, new_path):
+        """
+        Save a copy of a notebook as a plain notebook file that doesn't
+        reference cell records or output blobs
+        """
+        self.log.debug('export_notebook(%s %s)', path, new_path)
+        if self.guess_type(path, allow_directory=False) != 'notebook':
+            raise HTTPError(400, '"{}" is not a notebook'.format(path))
+        nb = self.get(path, content=True, type='notebook')['content']
+        self.check_and_sign(nb, new_path)
+        model = _base_model(*fspath.split(new_path))
         model['content'] = nbformat.writes(nb)
         model['format'] = 'text'
-        return self._save_file(path, model)
+        return self._save_file(new_path, model)
 
     @wrap_fs_errors('directory')
     def _save_directory(self, path, model):
@@ -330,7 +1914,7 @@ class FsContentsManager(ContentsManager):
         return model
 
     @wrap_fs_errors('file')
-    def _save_file(self, path, model):
+    def _save_file(self, path, model, digest=None):
         self.log.debug('_save_file(%s)', path)
         if 'content' not in model:
             raise HTTPError(400, 'No file content provided')
@@ -349,20 +1933,34 @@ class FsContentsManager(ContentsManager):
 
         with self.fs.openbin(path, 'w') as fo:
             fo.write(bcontent)
-        return self._get_file(path, False, None)
+        if self.tracer is not None:
+            self.tracer.set_attribute('size', len(bcontent))
+        path = self.fs.validatepath(path)
+        f = self.fs.getdetails(path)
+        self.content_hashes.update(path, f, bcontent, digest=digest)
+        return self._file_model(path, f, False, None)
 
+    @traced
+    @prioritized(SAVE)
     @wrap_fs_errors('file')
     def delete_file(self, path):
         # TODO: This is also used to delete directories
         self.log.debug('delete_file(%s)', path)
         path = self.fs.validatepath(path)
+        if self._is_mount_point(path):
+            raise HTTPError(409, 'Unable to delete mount point {}'.format(
+                path))
+        self.content_hashes.discard(path)
         if self.fs.isfile(path):
             self.fs.remove(path)
         elif self.fs.isdir(path):
             self.fs.removedir(path)
         else:
             raise ResourceNotFound(path)
+        self._update_search('remove', path)
 
+    @traced
+    @prioritized(SAVE)
     @wrap_fs_errors('file')
     def rename_file(self, old_path, new_path):
         self.log.debug('rename_file(%s %s)', old_path, new_path)
@@ -370,25 +1968,37 @@ class FsContentsManager(ContentsManager):
         new_path = self.fs.validatepath(new_path)
         if old_path == '/':
             raise HTTPError(409, 'Unable to rename root /')
+        if self._is_mount_point(old_path):
+            raise HTTPError(409, 'Unable to rename mount point {}'.format(
+                old_path))
         if self.fs.isdir(old_path):
             if self.fs.exists(new_path):
                 raise DestinationExists(new_path)
             self.fs.movedir(old_path, new_path, create=True)
+            self.content_hashes.discard(old_path)
         else:
             self.fs.move(old_path, new_path)
+            self.content_hashes.discard(old_path)
+        self._update_search('move', old_path, new_path)
 
+    @traced
+    @prioritized(OPEN)
     @wrap_fs_errors(None)
     def file_exists(self, path):
         self.log.debug('file_exists(%s)', path)
         path = self.fs.validatepath(path)
         return self.fs.isfile(path)
 
+    @traced
+    @prioritized(OPEN)
     @wrap_fs_errors(None)
     def dir_exists(self, path):
         self.log.debug('dir_exists(%s)', path)
         path = self.fs.validatepath(path)
         return self.fs.isdir(path)
 
+    @traced
+    @prioritized(OPEN)
     @wrap_fs_errors(None)
     def is_hidden(self, path):
         self.log.debug('is_hidden(%s)', path)
@@ -418,6 +2028,10 @@ class FsCheckpoints(GenericCheckpointsMixin, Checkpoints):
         """,
     )
 
+    @property
+    def tracer(self):
+        return self.parent.tracer
+
     def _checkpoint_path(self, checkpoint_id, path):
         """find the path to a checkpoint"""
         path = self.parent.fs.validatepath(path)
@@ -442,6 +2056,8 @@ class FsCheckpoints(GenericCheckpointsMixin, Checkpoints):
         if not self.parent.dir_exists(dirname):
             self.parent._save_directory(dirname, None)
 
+    @traced
+    @prioritized(CHECKPOINT)
     def create_file_checkpoint(self, content, format, path):
         self.log.debug('create_file_checkpoint(%s)', path)
         cp_path = self._checkpoint_path(0, path)
@@ -452,6 +2068,8 @@ class FsCheckpoints(GenericCheckpointsMixin, Checkpoints):
         f = self.parent._save_file(cp_path, model)
         return self._checkpoint_model(0, f)
 
+    @traced
+    @prioritized(CHECKPOINT)
     def create_notebook_checkpoint(self, nb, path):
         self.log.debug('create_notebook_checkpoint(%s)', path)
         cp_path = self._checkpoint_path(0, path)
@@ -461,23 +2079,31 @@ class FsCheckpoints(GenericCheckpointsMixin, Checkpoints):
         f = self.parent._save_notebook(cp_path, model, False)
         return self._checkpoint_model(0, f)
 
+    @traced
+    @prioritized(CHECKPOINT)
     def get_file_checkpoint(self, checkpoint_id, path):
         # -> {'type': 'file', 'content': <str>, 'format': {'text', 'base64'}}
         self.log.debug('get_file_checkpoint(%s %s)', checkpoint_id, path)
         cp_path = self._checkpoint_path(checkpoint_id, path)
         return self.parent._get_file(cp_path, True, None)
 
+    @traced
+    @prioritized(CHECKPOINT)
     def get_notebook_checkpoint(self, checkpoint_id, path):
         # -> {'type': 'notebook', 'content': <output of nbformat.read>}
         self.log.debug('get_notebook_checkpoint(%s %s)', checkpoint_id, path)
         cp_path = self._checkpoint_path(checkpoint_id, path)
         return self.parent._get_notebook(cp_path, True, 'text', trust=False)
 
+    @traced
+    @prioritized(CHECKPOINT)
     def delete_checkpoint(self, checkpoint_id, path):
         self.log.debug('delete_checkpoint(%s %s)', checkpoint_id, path)
         cp_path = self._checkpoint_path(checkpoint_id, path)
         self.parent.delete_file(cp_path)
 
+    @traced
+    @prioritized(CHECKPOINT)
     def list_checkpoints(self, path):
         self.log.debug('list_checkpoints(%s)', path)
         cp_path = self._checkpoint_path(0, path)
@@ -486,6 +2112,8 @@ class FsCheckpoints(GenericCheckpointsMixin, Checkpoints):
             return [self._checkpoint_model(0, f)]
         return []
 
+    @traced
+    @prioritized(CHECKPOINT)
     def rename_checkpoint(self, checkpoint_id, old_path, new_path):
         self.log.debug(
             'rename_checkpoint(%s %s %s)', checkpoint_id, old_path, new_path)
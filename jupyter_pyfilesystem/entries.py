@@ -0,0 +1,118 @@
+"""
+Compact directory entries that are converted to contents models on demand
+"""
+
+from datetime import datetime
+import json
+
+from fs.time import epoch_to_datetime
+import fs.path as fspath
+
+from .hashes import HASH_ALGORITHM
+
+
+DEFAULT_CREATED_DATE = datetime.utcfromtimestamp(0)
+
+
+def modified_time(info):
+    """
+    The modification time of a resource in seconds since the epoch, or None
+    if the filesystem doesn't report one
+
+    :param info: An `Info` with the details namespace
+    """
+    return info.raw.get('details', {}).get('modified')
+
+
+class DirectoryEntry(object):
+    """
+    A child of a directory, holding only the fields that vary between
+    entries. Times are stored as seconds since the epoch.
+    """
+
+    __slots__ = ('name', 'type', 'size', 'created', 'modified', 'hash')
+
+    def __init__(self, name, type, size=None, created=None, modified=None,
+                 hash=None):
+        self.name = name
+        self.type = type
+        self.size = size
+        self.created = created
+        self.modified = modified
+        self.hash = hash
+
+    @classmethod
+    def from_info(cls, info, type, hash=None):
+        details = info.raw.get('details', {})
+        return cls(
+            info.name, type,
+            None if type == 'directory' else details.get('size'),
+            details.get('created'), details.get('modified'), hash)
+
+    def __repr__(self):
+        return 'DirectoryEntry({!r}, {!r})'.format(self.name, self.type)
+
+    def to_model(self, dirname):
+        """
+        The contents model without content for this entry in `dirname`
+        """
+        created = self.created or self.modified
+        modified = self.modified or self.created
+        return {
+            'name': self.name,
+            'path': (dirname + '/' + self.name).strip('/'),
+            'type': self.type,
+            'writable': True,
+            'created': (DEFAULT_CREATED_DATE if created is None
+                        else epoch_to_datetime(created)),
+            'last_modified': (DEFAULT_CREATED_DATE if modified is None
+                              else epoch_to_datetime(modified)),
+            'size': self.size,
+            'content': None,
+            'format': None,
+            'mimetype': None,
+            'hash': self.hash,
+            'hash_algorithm': HASH_ALGORITHM if self.hash else None,
+        }
+
+
+class DirectoryListing(object):
+    """
+    The entries of a directory. Iterating or indexing returns models, which
+    are created when accessed rather than kept.
+    """
+
+    __slots__ = ('path', 'entries')
+
+    def __init__(self, path, entries=None):
+        self.path = fspath.abspath(path)
+        self.entries = list(entries or [])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [e.to_model(self.path) for e in self.entries[index]]
+        return self.entries[index].to_model(self.path)
+
+    def __iter__(self):
+        for entry in self.entries:
+            yield entry.to_model(self.path)
+
+    def models(self):
+        """
+        A list of the models of all entries
+        """
+        return list(self)
+
+    def iter_json(self, default=None, batch_size=1000):
+        """
+        Yield a JSON array of the models in chunks, converting `batch_size`
+        entries at a time
+        """
+        yield '['
+        for start in range(0, len(self.entries), batch_size):
+            chunk = json.dumps(self[start:start + batch_size], default=default)
+            yield (',' if start else '') + chunk[1:-1]
+        yield ']'
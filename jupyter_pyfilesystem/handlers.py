@@ -0,0 +1,441 @@
+try:
+    from jupyter_client.jsonutil import json_default
+except ImportError:
+    from jupyter_client.jsonutil import date_default as json_default
+from notebook.base.handlers import (
+    APIHandler,
+    IPythonHandler,
+    path_regex,
+)
+from notebook.utils import url_path_join
+from tornado import web
+from tornado.ioloop import IOLoop
+
+import asyncio
+import json
+import mimetypes
+import tempfile
+
+from .contents import FsContentsManager
+
+
+class FsContentsManagerMixin(object):
+    """
+    Mixin for handlers that require a FsContentsManager
+    """
+
+    @property
+    def fs_contents_manager(self):
+        cm = self.contents_manager
+        if not isinstance(cm, FsContentsManager):
+            raise web.HTTPError(404, 'FsContentsManager is not enabled')
+        return cm
+
+
+class PyfilesystemHandler(FsContentsManagerMixin, APIHandler):
+    """
+    Base class for API handlers that require a FsContentsManager
+    """
+
+
+class ProfileHandler(PyfilesystemHandler):
+    """
+    Temporarily profile contents operations.
+
+    POST starts profiling for `duration` seconds, GET returns the aggregated
+    stats, DELETE stops profiling.
+    Only available to the authenticated owner of the server, and only if
+    `FsContentsManager.allow_profiling` is enabled.
+    """
+
+    @property
+    def profiler(self):
+        profiler = self.fs_contents_manager.profiler
+        if profiler is None:
+            raise web.HTTPError(403, 'Profiling is not enabled')
+        return profiler
+
+    @web.authenticated
+    def get(self):
+        from .profiling import SORT_KEYS
+        sort = self.get_query_argument('sort', 'cumulative')
+        if sort not in SORT_KEYS:
+            raise web.HTTPError(400, 'Invalid sort {!r}'.format(sort))
+        try:
+            limit = int(self.get_query_argument('limit', '50'))
+        except ValueError:
+            raise web.HTTPError(400, 'Invalid limit')
+        if limit < 0:
+            raise web.HTTPError(400, 'Invalid limit')
+        self.finish(json.dumps(self.profiler.stats(sort=sort, limit=limit)))
+
+    @web.authenticated
+    def post(self):
+        body = self.get_json_body() or {}
+        try:
+            duration = float(body.get('duration', 60))
+        except (TypeError, ValueError):
+            raise web.HTTPError(400, 'Invalid duration')
+        self.profiler.start(duration)
+        self.set_status(202)
+        self.finish(json.dumps(self.profiler.stats()))
+
+    @web.authenticated
+    def delete(self):
+        self.profiler.stop()
+        self.set_status(204)
+        self.finish()
+
+
+class ExportHandler(PyfilesystemHandler):
+    """
+    POST `path` and `to` to save a copy of a notebook as a plain notebook
+    file, for example when `FsContentsManager.chunked_notebooks` is enabled
+    """
+
+    @web.authenticated
+    def post(self):
+        body = self.get_json_body() or {}
+        try:
+            path, to = body['path'], body['to']
+        except KeyError:
+            raise web.HTTPError(400, 'path and to are required')
+        model = self.fs_contents_manager.export_notebook(path, to)
+        self.set_status(201)
+        self.finish(json.dumps(model, default=json_default))
+
+
+class ContentsHashHandler(PyfilesystemHandler):
+    """
+    GET a model like /api/contents, but if the `hash` query argument is the
+    current content hash of a file or notebook return the model without
+    content. The hash is also sent as an ETag, a matching If-None-Match
+    header returns 304.
+    Directory contents are serialized from compact entries in batches.
+    """
+
+    @web.authenticated
+    def get(self, path=''):
+        cm = self.fs_contents_manager
+        type = self.get_query_argument('type', default=None)
+        if type not in {None, 'directory', 'file', 'notebook'}:
+            raise web.HTTPError(400, 'Type {!r} is invalid'.format(type))
+        format = self.get_query_argument('format', default=None)
+        if format not in {None, 'text', 'base64'}:
+            raise web.HTTPError(400, 'Format {!r} is invalid'.format(format))
+        known_hash = self.get_query_argument('hash', default=None)
+        etag = (self.request.headers.get('If-None-Match') or '').strip('"')
+        if cm.is_hidden(path) and not cm.allow_hidden:
+            raise web.HTTPError(404, '{!r} does not exist'.format(path))
+        if type is None:
+            type = cm.guess_type(path)
+        if type == 'directory':
+            return self._get_directory(cm, path)
+        model = cm.get(path, type=type, format=format,
+                       known_hash=known_hash or etag or None)
+        if model['hash']:
+            self.set_header('ETag', '"{}"'.format(model['hash']))
+            if etag and etag == model['hash']:
+                self.set_status(304)
+                self.finish()
+                return
+        self.finish(json.dumps(model, default=json_default))
+
+    def _get_directory(self, cm, path):
+        model = cm.get(path, content=False, type='directory')
+        listing = cm.list_directory(path)
+        model['format'] = 'json'
+        del model['content']
+        # Append the content to the serialized model without creating a model
+        # for every entry at once
+        head = json.dumps(model, default=json_default)
+        self.write(head[:-1] + ', "content": ')
+        for chunk in listing.iter_json(default=json_default):
+            self.write(chunk)
+        self.finish('}')
+
+
+class BatchHandler(PyfilesystemHandler):
+    """
+    POST a list of `paths` to get their models without content in a single
+    request. `models` in the response is in the same order, with null for
+    paths that don't exist and `{"error": message}` for paths that are
+    invalid or couldn't be read.
+    """
+
+    @web.authenticated
+    def post(self):
+        cm = self.fs_contents_manager
+        body = self.get_json_body() or {}
+        paths = body.get('paths')
+        if not isinstance(paths, list) or not all(
+                isinstance(p, str) for p in paths):
+            raise web.HTTPError(400, 'paths must be a list of strings')
+
+        def visible(path):
+            try:
+                return cm.allow_hidden or not cm.is_hidden(path)
+            except web.HTTPError as e:
+                # Invalid paths are reported by get_many
+                return e.status_code == 400
+
+        visible_paths = [p for p in paths if visible(p)]
+        models = dict(zip(visible_paths, cm.get_many(visible_paths)))
+        self.finish(json.dumps({
+            'models': [models.get(p) for p in paths],
+        }, default=json_default))
+
+
+class SearchHandler(PyfilesystemHandler):
+    """
+    GET `q` to find files whose path or content contain all the words,
+    if `FsContentsManager.search_index` is enabled
+    """
+
+    @web.authenticated
+    def get(self):
+        search = self.fs_contents_manager.search
+        if search is None:
+            raise web.HTTPError(403, 'Search index is not enabled')
+        query = self.get_query_argument('q', '')
+        try:
+            limit = int(self.get_query_argument('limit', '50'))
+        except ValueError:
+            raise web.HTTPError(400, 'Invalid limit')
+        self.finish(json.dumps({
+            'results': search.search(query, limit=limit),
+        }, default=json_default))
+
+
+class CompactHandler(PyfilesystemHandler):
+    """
+    POST to rewrite archives that have an overlay, returning the fs_urls of
+    the archives that had changes
+    """
+
+    @web.authenticated
+    async def post(self):
+        compacted = await IOLoop.current().run_in_executor(
+            None, self.fs_contents_manager.compact_archives)
+        self.finish(json.dumps({'compacted': compacted}))
+
+
+class SchedulerHandler(PyfilesystemHandler):
+    """
+    GET the metrics of the filesystem concurrency limiters, including the
+    number of calls waiting in each priority class, and the state of each
+    backend's circuit breaker
+    """
+
+    @web.authenticated
+    def get(self):
+        cm = self.fs_contents_manager
+        self.finish(json.dumps({
+            'limiters': cm.scheduler_metrics(),
+            'circuits': cm.circuit_metrics(),
+        }))
+
+
+@web.stream_request_body
+class UploadArchiveHandler(PyfilesystemHandler):
+    """
+    POST a tar (optionally compressed) or zip archive to unpack it into a
+    directory. The format is the `format` query argument, or zip if the
+    Content-Type is a zip type, otherwise tar.
+    Returns the models of the unpacked files and directories.
+
+    The archive is streamed into a temporary file that's kept in memory
+    until it's larger than `SPOOL_SIZE` bytes.
+    """
+
+    ZIP_TYPES = {'application/zip', 'application/x-zip-compressed'}
+
+    SPOOL_SIZE = 16 * 1024 * 1024
+
+    body = None
+
+    @web.authenticated
+    def prepare(self):
+        super().prepare()
+        self.body = tempfile.SpooledTemporaryFile(self.SPOOL_SIZE)
+
+    def data_received(self, chunk):
+        self.body.write(chunk)
+
+    def on_finish(self):
+        if self.body is not None:
+            self.body.close()
+
+    @web.authenticated
+    async def post(self, path=''):
+        cm = self.fs_contents_manager
+        if cm.is_hidden(path) and not cm.allow_hidden:
+            raise web.HTTPError(404, '{!r} does not exist'.format(path))
+        content_type = self.request.headers.get('Content-Type', '')
+        kind = self.get_query_argument('format', default=(
+            'zip' if content_type.split(';')[0] in self.ZIP_TYPES
+            else 'tar'))
+        self.body.seek(0)
+        models = await IOLoop.current().run_in_executor(
+            None, cm.upload_archive, path, self.body, kind)
+        self.set_status(201)
+        self.finish(json.dumps({'models': models}, default=json_default))
+
+
+class _HandlerWriter(object):
+    # A file object written by a worker thread that sends the data from a
+    # handler in chunks, waiting for each chunk to be flushed
+
+    def __init__(self, handler, chunk_size):
+        self.handler = handler
+        self.chunk_size = chunk_size
+        # Created on the IOLoop's thread
+        self.loop = asyncio.get_event_loop()
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= self.chunk_size:
+            self._send()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._buffer:
+            self._send()
+
+    async def _write(self, data):
+        self.handler.write(data)
+        await self.handler.flush()
+
+    def _send(self):
+        data, self._buffer = bytes(self._buffer), bytearray()
+        asyncio.run_coroutine_threadsafe(
+            self._write(data), self.loop).result()
+
+
+class ArchiveHandler(FsContentsManagerMixin, IPythonHandler):
+    """
+    GET a zip or tar archive of a directory, depending on the `format`
+    query argument, streamed while it's created
+    """
+
+    TYPES = {'zip': 'application/zip', 'tar': 'application/x-tar'}
+
+    @web.authenticated
+    async def get(self, path=''):
+        # Like /files, requests must originate from the same site
+        self.check_xsrf_cookie()
+        cm = self.fs_contents_manager
+        if cm.is_hidden(path) and not cm.allow_hidden:
+            raise web.HTTPError(404)
+        kind = self.get_query_argument('format', default='zip')
+        if kind not in self.TYPES:
+            raise web.HTTPError(400, 'Format {!r} is invalid'.format(kind))
+        path = path.strip('/')
+        name = path.rsplit('/', 1)[-1] or 'files'
+        # Check the directory exists before sending headers
+        cm.get(path, content=False, type='directory')
+        self.set_attachment_header('{}.{}'.format(name, kind))
+        self.set_header('Content-Type', self.TYPES[kind])
+        writer = _HandlerWriter(self, cm.download_chunk_size)
+
+        def download():
+            cm.download_archive(path, writer, kind)
+            writer.close()
+
+        await IOLoop.current().run_in_executor(None, download)
+        self.finish()
+
+
+class RawFilesHandler(FsContentsManagerMixin, IPythonHandler):
+    """
+    Serve a file like /files, but stream it in chunks of
+    `FsContentsManager.download_chunk_size` bytes instead of loading the
+    whole file, so large files can be downloaded with bounded memory
+    """
+
+    @property
+    def content_security_policy(self):
+        # Confine any Javascript in served HTML/SVG to a unique origin
+        return super().content_security_policy + '; sandbox allow-scripts'
+
+    @web.authenticated
+    def head(self, path):
+        return self.get(path, include_body=False)
+
+    @web.authenticated
+    async def get(self, path, include_body=True):
+        # Like /files, requests must originate from the same site
+        self.check_xsrf_cookie()
+        cm = self.fs_contents_manager
+        if cm.is_hidden(path) and not cm.allow_hidden:
+            raise web.HTTPError(404)
+        path = path.strip('/')
+        name = path.rsplit('/', 1)[-1]
+        model = cm.get(path, content=False, type='file')
+
+        if model['hash']:
+            self.set_header('ETag', '"{}"'.format(model['hash']))
+            etag = (self.request.headers.get('If-None-Match') or '').strip('"')
+            if etag == model['hash']:
+                self.set_status(304)
+                self.finish()
+                return
+        if self.get_argument('download', False):
+            self.set_attachment_header(name)
+        if name.lower().endswith('.ipynb'):
+            self.set_header('Content-Type', 'application/x-ipynb+json')
+        else:
+            mimetype = mimetypes.guess_type(name)[0]
+            if mimetype is None:
+                mimetype = 'application/octet-stream'
+            elif mimetype == 'text/plain':
+                mimetype = 'text/plain; charset=UTF-8'
+            self.set_header('Content-Type', mimetype)
+        self.set_header('Content-Length', model['size'])
+        if not include_body:
+            self.finish()
+            return
+
+        writer = _HandlerWriter(self, cm.download_chunk_size)
+
+        def download():
+            cm.download_file(path, writer)
+            writer.close()
+
+        await IOLoop.current().run_in_executor(None, download)
+        self.finish()
+
+
+default_handlers = [
+    (r'/api/pyfilesystem/raw{}'.format(path_regex), RawFilesHandler),
+    (r'/api/pyfilesystem/archive{}'.format(path_regex), ArchiveHandler),
+    (r'/api/pyfilesystem/upload{}'.format(path_regex), UploadArchiveHandler),
+    (r'/api/pyfilesystem/scheduler', SchedulerHandler),
+    (r'/api/pyfilesystem/search', SearchHandler),
+    (r'/api/pyfilesystem/batch', BatchHandler),
+    (r'/api/pyfilesystem/contents{}'.format(path_regex), ContentsHashHandler),
+    (r'/api/pyfilesystem/compact', CompactHandler),
+    (r'/api/pyfilesystem/export', ExportHandler),
+    (r'/api/pyfilesystem/profile', ProfileHandler),
+]
+
+
+def load_handlers(nbapp):
+    cm = nbapp.contents_manager
+    if isinstance(cm, FsContentsManager):
+        if cm.open_on_start:
+            cm.open_in_background()
+        # Start crawling for the search index and collecting checkpoints if
+        # enabled
+        cm.search
+        cm.checkpoint_collector
+    web_app = nbapp.web_app
+    base_url = web_app.settings['base_url']
+    web_app.add_handlers('.*$', [
+        (url_path_join(base_url, pattern), handler)
+        for (pattern, handler) in default_handlers
+    ])
@@ -0,0 +1,167 @@
+"""
+Content hashes of files
+"""
+
+from collections import OrderedDict
+from hashlib import sha256
+import threading
+import time
+
+import fs.path as fspath
+
+
+HASH_ALGORITHM = 'sha256'
+
+
+def content_hash(data):
+    return sha256(data).hexdigest()
+
+
+class DigestSet(object):
+    """
+    The `max_size` most recently added or found content hashes, for
+    remembering content that has been checked. 0 to disable.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._digests = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, digest):
+        with self._lock:
+            if digest not in self._digests:
+                return False
+            self._digests.move_to_end(digest)
+            return True
+
+    def __len__(self):
+        return len(self._digests)
+
+    def add(self, digest):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._digests[digest] = None
+            self._digests.move_to_end(digest)
+            while len(self._digests) > self.max_size:
+                self._digests.popitem(last=False)
+
+    def discard(self, digest):
+        with self._lock:
+            self._digests.pop(digest, None)
+
+    def clear(self):
+        with self._lock:
+            self._digests.clear()
+
+
+# Modification times without a fraction of a second may have been rounded
+# to this many seconds by the backend, for example in zip archives
+COARSE_MTIME_RESOLUTION = 2
+
+
+def _version(info):
+    return info.size, info.get('details', 'modified')
+
+
+def _changes_unseen(modified, now):
+    # Whether a later write could leave the modification time unchanged
+    if modified is None:
+        return True
+    resolution = COARSE_MTIME_RESOLUTION if modified % 1 == 0 else 0
+    return now - modified <= resolution
+
+
+class ContentHashes(object):
+    """
+    Remember the content hashes of the `max_size` files most recently read
+    or written.
+
+    A hash is only returned if the size and modification time of the file
+    match those when it was computed. Hashes are not remembered if the
+    modification time is missing, or so recent that a change within the
+    backend's time resolution wouldn't change it.
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        # path: ((size, modified), hash) ordered by least recently used
+        self._hashes = OrderedDict()
+        # directory: set of child paths that have hashes or are directories
+        # containing them, so a directory can be discarded without a scan
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def get(self, path, info):
+        """
+        The hash of `path` with details `info`, or None if not known
+        """
+        path = fspath.abspath(fspath.normpath(path))
+        with self._lock:
+            entry = self._hashes.get(path)
+            if entry and entry[0] == _version(info):
+                self._hashes.move_to_end(path)
+                return entry[1]
+        return None
+
+    def update(self, path, info, data, digest=None):
+        """
+        Remember the hash of `data` read from or written to `path`
+
+        :param digest: The hash of `data` if it's already known
+        """
+        if digest is None:
+            digest = content_hash(data)
+        path = fspath.abspath(fspath.normpath(path))
+        version = _version(info)
+        if self.max_size <= 0 or _changes_unseen(version[1], time.time()):
+            self.discard(path)
+            return digest
+        with self._lock:
+            self._hashes[path] = (version, digest)
+            self._hashes.move_to_end(path)
+            self._link(path)
+            while len(self._hashes) > self.max_size:
+                evicted, _ = self._hashes.popitem(last=False)
+                self._unlink(evicted)
+        return digest
+
+    def _link(self, path):
+        while path != '/':
+            parent = fspath.dirname(path)
+            children = self._children.setdefault(parent, set())
+            if path in children:
+                break
+            children.add(path)
+            path = parent
+
+    def _unlink(self, path):
+        # Remove path from its parent, and parents that have no other
+        # children from theirs
+        while path != '/' and path not in self._children:
+            parent = fspath.dirname(path)
+            children = self._children.get(parent)
+            if children is None:
+                break
+            children.discard(path)
+            if children:
+                break
+            del self._children[parent]
+            path = parent
+
+    def discard(self, path):
+        """
+        Forget `path` and everything under it
+        """
+        path = fspath.abspath(fspath.normpath(path))
+        with self._lock:
+            todo = [path]
+            while todo:
+                p = todo.pop()
+                self._hashes.pop(p, None)
+                todo.extend(self._children.pop(p, ()))
+            self._unlink(path)
@@ -0,0 +1,157 @@
+"""
+A filesystem wrapper that injects latency, for testing and benchmarking
+"""
+
+from collections import Counter
+import random
+import threading
+import time
+
+from fs.wrapfs import WrapFS
+
+
+class _ThrottledFile(object):
+    """
+    Proxy for a binary file that limits the read/write bandwidth
+    """
+
+    def __init__(self, f, latencyfs):
+        self._f = f
+        self._latencyfs = latencyfs
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def read(self, *args):
+        b = self._f.read(*args)
+        self._latencyfs._transfer(len(b))
+        return b
+
+    def readinto(self, b):
+        n = self._f.readinto(b)
+        self._latencyfs._transfer(n or 0)
+        return n
+
+    def write(self, b):
+        n = self._f.write(b)
+        self._latencyfs._transfer(len(b))
+        return n
+
+    def close(self):
+        self._f.close()
+
+
+class LatencyFS(WrapFS):
+    """
+    Wrap a filesystem, adding a delay to every call and counting calls.
+
+    :param latency: Delay added to every call (seconds)
+    :param jitter: Maximum random extra delay added to every call (seconds)
+    :param bandwidth: Maximum bytes per second read or written, 0 for
+      unlimited
+    :param seed: Seed for the jitter random number generator
+    """
+
+    def __init__(self, wrap_fs, latency=0, jitter=0, bandwidth=0, seed=None):
+        super().__init__(wrap_fs)
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'LatencyFS({!r}, latency={}, jitter={}, bandwidth={})'.format(
+            self._wrap_fs, self.latency, self.jitter, self.bandwidth)
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+            delay = self.latency
+            if self.jitter:
+                delay += self._random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _transfer(self, nbytes):
+        if self.bandwidth and nbytes:
+            time.sleep(nbytes / self.bandwidth)
+
+    def getinfo(self, path, namespaces=None):
+        self._call('getinfo')
+        return super().getinfo(path, namespaces=namespaces)
+
+    def getdetails(self, path):
+        self._call('getdetails')
+        return self._wrap_fs.getdetails(path)
+
+    def listdir(self, path):
+        self._call('listdir')
+        return super().listdir(path)
+
+    def scandir(self, path, namespaces=None, page=None):
+        self._call('scandir')
+        return super().scandir(path, namespaces=namespaces, page=page)
+
+    def openbin(self, path, mode='r', buffering=-1, **options):
+        self._call('openbin')
+        f = super().openbin(path, mode=mode, buffering=buffering, **options)
+        if self.bandwidth:
+            f = _ThrottledFile(f, self)
+        return f
+
+    def exists(self, path):
+        self._call('exists')
+        return self._wrap_fs.exists(path)
+
+    def isdir(self, path):
+        self._call('isdir')
+        return self._wrap_fs.isdir(path)
+
+    def isfile(self, path):
+        self._call('isfile')
+        return self._wrap_fs.isfile(path)
+
+    def makedir(self, path, permissions=None, recreate=False):
+        self._call('makedir')
+        return super().makedir(
+            path, permissions=permissions, recreate=recreate)
+
+    def remove(self, path):
+        self._call('remove')
+        return super().remove(path)
+
+    def removedir(self, path):
+        self._call('removedir')
+        return super().removedir(path)
+
+    def move(self, src_path, dst_path, overwrite=False, **kwargs):
+        self._call('move')
+        return super().move(
+            src_path, dst_path, overwrite=overwrite, **kwargs)
+
+    def movedir(self, src_path, dst_path, create=False, **kwargs):
+        self._call('movedir')
+        return super().movedir(src_path, dst_path, create=create, **kwargs)
+
+    def setinfo(self, path, info):
+        self._call('setinfo')
+        return super().setinfo(path, info)
@@ -0,0 +1,329 @@
+"""
+A persistent SQLite cache of directory listings, so that a restarted server
+can answer listings immediately and refresh them in the background
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from hashlib import sha256
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from fs.errors import (
+    DirectoryExpected,
+    ResourceNotFound,
+)
+from fs.info import Info
+from fs.mode import Mode
+import fs.path as fspath
+from fs.wrapfs import WrapFS
+
+from .scheduler import (
+    BACKGROUND,
+    priority,
+)
+from .tiered import _CallbackFile
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS listings (
+    fs TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (fs, path)
+);
+CREATE TABLE IF NOT EXISTS entries (
+    fs TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    raw TEXT NOT NULL,
+    PRIMARY KEY (fs, dir, name)
+);
+'''
+
+# Info namespaces stored for each entry
+_NAMESPACES = {'basic', 'details'}
+
+
+def _cached_namespaces(namespaces):
+    return _NAMESPACES.issuperset(namespaces or ())
+
+
+class MetadataStore(object):
+    """
+    Directory listings of one filesystem in a SQLite database that may be
+    shared by other filesystems and processes.
+
+    :param db_path: Path of the SQLite database
+    :param fs_url: The filesystem, only a hash of it is stored since it may
+      contain credentials
+    """
+
+    def __init__(self, db_path, fs_url):
+        self.key = sha256(fs_url.encode('utf8')).hexdigest()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            db_path, check_same_thread=False, timeout=30)
+        with self._lock, self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def listed(self, path):
+        """
+        Whether a listing of directory `path` is stored
+        """
+        with self._lock:
+            return self._db.execute(
+                'SELECT 1 FROM listings WHERE fs = ? AND path = ?',
+                (self.key, path)).fetchone() is not None
+
+    def get(self, path):
+        """
+        The raw infos in a stored listing of `path`, or None
+        """
+        with self._lock:
+            if self._db.execute(
+                    'SELECT 1 FROM listings WHERE fs = ? AND path = ?',
+                    (self.key, path)).fetchone() is None:
+                return None
+            return [json.loads(raw) for (raw,) in self._db.execute(
+                'SELECT raw FROM entries WHERE fs = ? AND dir = ? '
+                'ORDER BY rowid', (self.key, path))]
+
+    def get_entry(self, path):
+        """
+        The raw info of `path` from the stored listing of its directory, or
+        None
+        """
+        dirname, name = fspath.split(path)
+        with self._lock:
+            row = self._db.execute(
+                'SELECT raw FROM entries WHERE fs = ? AND dir = ? AND '
+                'name = ?', (self.key, dirname, name)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, path, raws):
+        """
+        Replace the listing of directory `path`
+        """
+        rows = [(self.key, path, raw['basic']['name'], json.dumps(raw))
+                for raw in raws]
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM entries WHERE fs = ? AND dir = ?',
+                             (self.key, path))
+            self._db.executemany(
+                'INSERT INTO entries (fs, dir, name, raw) '
+                'VALUES (?, ?, ?, ?)', rows)
+            self._db.execute(
+                'INSERT OR IGNORE INTO listings (fs, path) VALUES (?, ?)',
+                (self.key, path))
+
+    def discard(self, path):
+        """
+        Forget the listing of the directory containing `path`, and of `path`
+        and everything under it
+        """
+        prefix = fspath.forcedir(path)
+        with self._lock, self._db:
+            for table, column in (('listings', 'path'), ('entries', 'dir')):
+                self._db.execute(
+                    'DELETE FROM {0} WHERE fs = ? AND ({1} IN (?, ?) OR '
+                    'substr({1}, 1, ?) = ?)'.format(table, column),
+                    (self.key, fspath.dirname(path), path,
+                     len(prefix), prefix))
+
+
+def _invalidates(method, npaths=1):
+    # Call a method that changes the first `npaths` path arguments, and
+    # forget the listings they're in
+    @wraps(method)
+    def invalidate(self, *args, **kwargs):
+        paths = args[:npaths]
+        self._invalidate(*paths)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._invalidate(*paths)
+    return invalidate
+
+
+class MetadataCacheFS(WrapFS):
+    """
+    Answer listings and basic and details info from a MetadataStore.
+
+    A stored listing that hasn't been read from the filesystem by this
+    instance, for example one from before the server restarted, is used
+    immediately and refreshed in the background. Listings read by this
+    instance are used for `max_age` seconds, after that they're read from
+    the filesystem again. Changes made through this filesystem remove the
+    listings they affect.
+
+    :param close_wrapped: Close `wrap_fs` when this is closed
+    """
+
+    def __init__(self, wrap_fs, store, max_age=0, close_wrapped=False,
+                 log=None):
+        super().__init__(wrap_fs)
+        self.store = store
+        self.max_age = max_age
+        self.close_wrapped = close_wrapped
+        self.log = log or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # {path: time} of listings read from the filesystem
+        self._validated = {}
+        # Incremented for every change so that a refresh that started
+        # before a change doesn't store the old listing
+        self._generation = 0
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(
+            2, thread_name_prefix='fs-metadata')
+
+    def close(self):
+        if not self.isclosed():
+            self._executor.shutdown(wait=False)
+            self.store.close()
+            if self.close_wrapped:
+                self._wrap_fs.close()
+        super().close()
+
+    def _usable(self, path):
+        # Whether the stored listing of path can be used
+        validated = self._validated.get(path)
+        if validated is not None:
+            return time.monotonic() - validated < self.max_age
+        if self.store.listed(path):
+            self._refresh_later(path)
+            return True
+        return False
+
+    def _scan(self, path):
+        with self._lock:
+            generation = self._generation
+        infos = list(super().scandir(path, namespaces=['details']))
+        with self._lock:
+            if generation == self._generation:
+                self.store.put(path, [info.raw for info in infos])
+                self._validated[path] = time.monotonic()
+        return infos
+
+    def _refresh_later(self, path):
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.add(path)
+        self._executor.submit(self._refresh, path)
+
+    def _refresh(self, path):
+        try:
+            with priority(BACKGROUND):
+                self._scan(path)
+        except (DirectoryExpected, ResourceNotFound):
+            self._invalidate(path)
+        except Exception as e:
+            self.log.warning('Failed to refresh listing of %s: %s', path, e)
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+
+    def _invalidate(self, *paths):
+        with self._lock:
+            self._generation += 1
+            for path in paths:
+                _path = fspath.abspath(fspath.normpath(path))
+                prefix = fspath.forcedir(_path)
+                for p in list(self._validated):
+                    if p in (_path, fspath.dirname(_path)) or p.startswith(
+                            prefix):
+                        del self._validated[p]
+                self.store.discard(_path)
+
+    def scandir(self, path, namespaces=None, page=None):
+        if not _cached_namespaces(namespaces):
+            return super().scandir(path, namespaces=namespaces, page=page)
+        self.check()
+        _path = fspath.abspath(fspath.normpath(path))
+        raws = self.store.get(_path) if self._usable(_path) else None
+        if raws is None:
+            infos = self._scan(_path)
+        else:
+            infos = [Info(raw) for raw in raws]
+        if page is not None:
+            infos = infos[page[0]:page[1]]
+        return iter(infos)
+
+    def listdir(self, path):
+        return [info.name for info in self.scandir(path)]
+
+    def getinfo(self, path, namespaces=None):
+        _path = fspath.abspath(fspath.normpath(path))
+        if _path != '/' and _cached_namespaces(namespaces):
+            self.check()
+            dirname = fspath.dirname(_path)
+            if self._usable(dirname):
+                raw = self.store.get_entry(_path)
+                if raw is not None:
+                    return Info(raw)
+                if dirname in self._validated:
+                    raise ResourceNotFound(path)
+        return super().getinfo(path, namespaces)
+
+    def exists(self, path):
+        try:
+            self.getinfo(path)
+            return True
+        except ResourceNotFound:
+            return False
+
+    def isdir(self, path):
+        try:
+            return self.getinfo(path).is_dir
+        except ResourceNotFound:
+            return False
+
+    def isfile(self, path):
+        try:
+            return not self.getinfo(path).is_dir
+        except ResourceNotFound:
+            return False
+
+    def openbin(self, path, mode='r', buffering=-1, **options):
+        f = super().openbin(path, mode=mode, buffering=buffering, **options)
+        return self._invalidating(path, mode, f)
+
+    def open(self, path, mode='r', buffering=-1, encoding=None, errors=None,
+             newline='', **options):
+        f = super().open(path, mode=mode, buffering=buffering,
+                         encoding=encoding, errors=errors, newline=newline,
+                         **options)
+        return self._invalidating(path, mode, f)
+
+    def _invalidating(self, path, mode, f):
+        if not Mode(mode).writing:
+            return f
+        self._invalidate(path)
+        return _CallbackFile(f, lambda: self._invalidate(path))
+
+    appendbytes = _invalidates(WrapFS.appendbytes)
+    appendtext = _invalidates(WrapFS.appendtext)
+    copy = _invalidates(WrapFS.copy, 2)
+    copydir = _invalidates(WrapFS.copydir, 2)
+    create = _invalidates(WrapFS.create)
+    makedir = _invalidates(WrapFS.makedir)
+    makedirs = _invalidates(WrapFS.makedirs)
+    move = _invalidates(WrapFS.move, 2)
+    movedir = _invalidates(WrapFS.movedir, 2)
+    remove = _invalidates(WrapFS.remove)
+    removedir = _invalidates(WrapFS.removedir)
+    removetree = _invalidates(WrapFS.removetree)
+    setinfo = _invalidates(WrapFS.setinfo)
+    settimes = _invalidates(WrapFS.settimes)
+    touch = _invalidates(WrapFS.touch)
+    upload = _invalidates(WrapFS.upload)
+    writebytes = _invalidates(WrapFS.writebytes)
+    writefile = _invalidates(WrapFS.writefile)
@@ -0,0 +1,35 @@
+"""
+Map local files into memory so their content can be encoded or hashed
+without first copying it into a bytes object
+"""
+
+from contextlib import contextmanager
+import mmap
+import os
+
+
+@contextmanager
+def map_file(fo, min_size=1):
+    """
+    Map an open binary file into memory if it's a local file of at least
+    `min_size` bytes, otherwise yield None.
+    The map is closed when the context exits, so nothing that refers to its
+    memory may be kept.
+
+    :param fo: A file returned by `openbin`, it's used if it has a `fileno`
+    :param min_size: Smaller files aren't mapped, 0 to never map
+    """
+    mapped = None
+    if min_size > 0:
+        try:
+            fd = fo.fileno()
+            if os.fstat(fd).st_size >= min_size:
+                mapped = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError):
+            # Not a local file, or it can't be mapped
+            mapped = None
+    try:
+        yield mapped
+    finally:
+        if mapped is not None:
+            mapped.close()
@@ -0,0 +1,144 @@
+"""
+A filesystem that combines several filesystems mounted at path prefixes
+"""
+
+from fs.errors import (
+    DestinationExists,
+    ResourceNotFound,
+    ResourceReadOnly,
+)
+from fs.enums import ResourceType
+from fs.info import Info
+from fs.mountfs import MountFS
+import fs.move
+import fs.path as fspath
+
+
+class PrefixMountFS(MountFS):
+    """
+    Mount filesystems at path prefixes.
+
+    Unlike `fs.mountfs.MountFS` mounts may be nested, including at `/`, and
+    the filesystem for a path is found by looking up each parent of the path
+    in a dict (longest prefix first) instead of a linear scan of all mounts.
+    Parents of mount points are created in the filesystem they're in when
+    a filesystem is mounted, and are listed as directories if they can't be.
+    Moving files or directories between mounts falls back to copy and delete.
+    """
+
+    def __init__(self, auto_close=True):
+        super().__init__(auto_close=auto_close)
+        self.mount_table = {}
+
+    def __repr__(self):
+        return 'PrefixMountFS({!r})'.format(sorted(self.mount_table))
+
+    def mount(self, path, fs):
+        prefix = fspath.abspath(fspath.normpath(path))
+        if prefix in self.mount_table:
+            raise ValueError('{} is already mounted'.format(prefix))
+        self.mount_table[prefix] = fs
+        self.mounts.append((fspath.forcedir(prefix), fs))
+        self.default_fs.makedirs(prefix, recreate=True)
+        if prefix != '/':
+            parent_fs, parent = self._delegate(fspath.dirname(prefix))
+            try:
+                parent_fs.makedirs(parent, recreate=True)
+            except ResourceReadOnly:
+                pass
+
+    def _delegate(self, path):
+        path = fspath.abspath(fspath.normpath(path))
+        prefix = path
+        while True:
+            fs = self.mount_table.get(prefix)
+            if fs is not None:
+                if prefix == '/':
+                    return fs, path
+                return fs, path[len(prefix):] or '/'
+            if prefix == '/':
+                return self.default_fs, path
+            prefix = fspath.dirname(prefix)
+
+    def delegate(self, path):
+        """
+        Get the filesystem and the path in that filesystem for `path`
+        """
+        return self._delegate(path)
+
+    def is_mount_point(self, path):
+        """
+        Whether a filesystem other than the root filesystem is mounted at
+        `path`
+        """
+        path = fspath.abspath(fspath.normpath(path))
+        return path != '/' and path in self.mount_table
+
+    def _child_mounts(self, path):
+        # Names of the children of path that are or contain mount points
+        prefix = fspath.forcedir(fspath.abspath(fspath.normpath(path)))
+        return {p[len(prefix):].split('/', 1)[0]
+                for p in self.mount_table
+                if p != '/' and p.startswith(prefix)}
+
+    def getinfo(self, path, namespaces=None):
+        self.check()
+        fs, _path = self.delegate(path)
+        try:
+            info = fs.getinfo(_path, namespaces=namespaces)
+        except ResourceNotFound:
+            if not self._child_mounts(path):
+                raise
+            return Info({
+                'basic': {'name': fspath.basename(path), 'is_dir': True},
+                'details': {'type': int(ResourceType.directory), 'size': 0},
+            })
+        if _path == '/' and fspath.abspath(path) != '/':
+            # Root of a mount, use the name of the mount point
+            raw = dict(info.raw)
+            raw['basic'] = dict(raw['basic'], name=fspath.basename(path))
+            info = Info(raw)
+        return info
+
+    def scandir(self, path, namespaces=None, page=None):
+        self.check()
+        fs, _path = self.delegate(path)
+        children = self._child_mounts(path)
+        names = set()
+        try:
+            for info in fs.scandir(_path, namespaces=namespaces, page=page):
+                names.add(info.name)
+                yield info
+        except ResourceNotFound:
+            if not children:
+                raise
+        if page is None:
+            for name in sorted(children - names):
+                yield self.getinfo(
+                    fspath.join(path, name), namespaces=namespaces)
+
+    def isdir(self, path):
+        return bool(self._child_mounts(path)) or super().isdir(path)
+
+    def listdir(self, path):
+        return [info.name for info in self.scandir(path)]
+
+    def move(self, src_path, dst_path, overwrite=False, **kwargs):
+        src_fs, _src = self.delegate(src_path)
+        dst_fs, _dst = self.delegate(dst_path)
+        if src_fs is dst_fs:
+            return src_fs.move(_src, _dst, overwrite=overwrite, **kwargs)
+        if not overwrite and dst_fs.exists(_dst):
+            raise DestinationExists(dst_path)
+        fs.move.move_file(src_fs, _src, dst_fs, _dst, **kwargs)
+
+    def movedir(self, src_path, dst_path, create=False, **kwargs):
+        src_fs, _src = self.delegate(src_path)
+        dst_fs, _dst = self.delegate(dst_path)
+        if src_fs is dst_fs:
+            return src_fs.movedir(_src, _dst, create=create, **kwargs)
+        if not create and not dst_fs.exists(_dst):
+            raise ResourceNotFound(dst_path)
+        if not src_fs.isdir(_src):
+            raise ResourceNotFound(src_path)
+        fs.move.move_dir(src_fs, _src, dst_fs, _dst, **kwargs)
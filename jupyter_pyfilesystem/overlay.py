@@ -0,0 +1,334 @@
+"""
+A writable copy-on-write layer over a read-only archive filesystem
+"""
+
+from collections import OrderedDict
+import json
+import threading
+
+from fs.base import FS
+from fs.errors import (
+    DirectoryExists,
+    DirectoryExpected,
+    DirectoryNotEmpty,
+    FileExists,
+    FileExpected,
+    RemoveRootError,
+    ResourceNotFound,
+)
+from fs.mode import Mode
+import fs.path as fspath
+
+from .bulk import ArchiveWriter
+from .tiered import _CallbackFile
+
+
+# Whiteouts are stored in the upper filesystem, this file is hidden
+WHITEOUTS_FILE = '/.overlay-whiteouts.json'
+
+_TAR_COMPRESSION = [
+    ('gz', ('.tar.gz', '.tgz')),
+    ('bz2', ('.tar.bz2', '.tbz')),
+    ('xz', ('.tar.xz', '.txz')),
+]
+
+
+class OverlayFS(FS):
+    """
+    Combine a read-only `lower` filesystem with a writable `upper`
+    filesystem. Paths that exist in `upper` are read from it, otherwise from
+    `lower`. All changes are made in `upper`, a file in `lower` is copied up
+    before it's opened for updating.
+
+    Deleting a path that exists in `lower` records a whiteout that hides it.
+    A directory that is created where a deleted directory was is opaque, the
+    contents of the `lower` directory are hidden. Whiteouts are saved in
+    `upper` so an on-disk upper filesystem can be reused.
+
+    Files opened for writing are counted until they're closed, so `reset`
+    can wait for writes to finish instead of discarding them.
+    """
+
+    _meta = {
+        'case_insensitive': False,
+        'invalid_path_chars': '\0',
+        'max_path_length': None,
+        'max_sys_path_length': None,
+        'network': False,
+        'read_only': False,
+        'supports_rename': False,
+        'thread_safe': True,
+        'unicode_paths': True,
+        'virtual': False,
+    }
+
+    def __init__(self, lower, upper):
+        super().__init__()
+        self.lower = lower
+        self.upper = upper
+        self._whiteouts = set()
+        self._opaque = set()
+        self._writers = 0
+        self._writers_closed = threading.Condition()
+        if upper.exists(WHITEOUTS_FILE):
+            saved = json.loads(upper.readtext(WHITEOUTS_FILE))
+            self._whiteouts.update(saved.get('whiteouts', []))
+            self._opaque.update(saved.get('opaque', []))
+
+    def __repr__(self):
+        return 'OverlayFS({!r}, {!r})'.format(self.lower, self.upper)
+
+    @property
+    def modified(self):
+        """
+        Whether there are any changes in the upper filesystem
+        """
+        with self._lock:
+            return bool(self._whiteouts or self._opaque or any(
+                fspath.abspath(p) != WHITEOUTS_FILE
+                for p in self.upper.listdir('/')))
+
+    def _save(self):
+        if self._whiteouts or self._opaque:
+            self.upper.writetext(WHITEOUTS_FILE, json.dumps({
+                'whiteouts': sorted(self._whiteouts),
+                'opaque': sorted(self._opaque),
+            }))
+        elif self.upper.exists(WHITEOUTS_FILE):
+            self.upper.remove(WHITEOUTS_FILE)
+
+    def _lower_hidden(self, _path):
+        prefix = ''
+        for name in fspath.iteratepath(_path):
+            prefix += '/' + name
+            if prefix in self._whiteouts:
+                return True
+            if prefix in self._opaque and prefix != _path:
+                return True
+        return False
+
+    def _info(self, path, namespaces=None):
+        # The layer and info of a path
+        _path = fspath.abspath(fspath.normpath(path))
+        if _path != WHITEOUTS_FILE:
+            try:
+                return self.upper, self.upper.getinfo(_path, namespaces)
+            except ResourceNotFound:
+                pass
+            if not self._lower_hidden(_path):
+                try:
+                    return self.lower, self.lower.getinfo(_path, namespaces)
+                except ResourceNotFound:
+                    pass
+        raise ResourceNotFound(path)
+
+    def _find(self, path):
+        try:
+            return self._info(path)[1]
+        except ResourceNotFound:
+            return None
+
+    def _check_parent(self, path):
+        parent = self._find(fspath.dirname(fspath.abspath(path)))
+        if parent is None or not parent.is_dir:
+            raise ResourceNotFound(path)
+
+    def _whiteout(self, _path):
+        # Hide the lower path, whiteouts inside it are no longer needed
+        prefix = fspath.forcedir(_path)
+        self._whiteouts = {p for p in self._whiteouts
+                           if not p.startswith(prefix)}
+        self._opaque = {p for p in self._opaque if not p.startswith(prefix)}
+        self._opaque.discard(_path)
+        if not self._lower_hidden(_path) and self.lower.exists(_path):
+            self._whiteouts.add(_path)
+        self._save()
+
+    def _unwhiteout(self, _path):
+        # A new path replaces a deleted one, the deleted directory's
+        # contents must stay hidden
+        if _path in self._whiteouts:
+            self._whiteouts.discard(_path)
+            if self.lower.isdir(_path):
+                self._opaque.add(_path)
+            self._save()
+
+    def _copy_up(self, _path, info):
+        if info.is_dir:
+            self.upper.makedirs(_path, recreate=True)
+        else:
+            self.upper.makedirs(fspath.dirname(_path), recreate=True)
+            with self.lower.openbin(_path) as src:
+                self.upper.upload(_path, src)
+
+    def getinfo(self, path, namespaces=None):
+        self.check()
+        with self._lock:
+            return self._info(path, namespaces)[1]
+
+    def _scan(self, _path, namespaces=None):
+        infos = OrderedDict()
+        if self.upper.isdir(_path):
+            for info in self.upper.scandir(_path, namespaces=namespaces):
+                infos[info.name] = info
+        if not self._lower_hidden(_path) and self.lower.isdir(_path):
+            for info in self.lower.scandir(_path, namespaces=namespaces):
+                if info.name not in infos and not self._lower_hidden(
+                        fspath.join(_path, info.name)):
+                    infos[info.name] = info
+        if _path == '/':
+            infos.pop(fspath.basename(WHITEOUTS_FILE), None)
+        return list(infos.values())
+
+    def scandir(self, path, namespaces=None, page=None):
+        self.check()
+        with self._lock:
+            info = self._info(path)[1]
+            if not info.is_dir:
+                raise DirectoryExpected(path)
+            infos = self._scan(
+                fspath.abspath(fspath.normpath(path)), namespaces)
+        if page is not None:
+            infos = infos[page[0]:page[1]]
+        return iter(infos)
+
+    def listdir(self, path):
+        return [info.name for info in self.scandir(path)]
+
+    def makedir(self, path, permissions=None, recreate=False):
+        self.check()
+        _path = fspath.abspath(fspath.normpath(path))
+        with self._lock:
+            self._check_parent(path)
+            info = self._find(_path)
+            if info is not None:
+                if recreate and info.is_dir:
+                    return self.opendir(path)
+                raise DirectoryExists(path)
+            self.upper.makedirs(fspath.dirname(_path), recreate=True)
+            self.upper.makedir(_path, permissions=permissions, recreate=True)
+            self._unwhiteout(_path)
+        return self.opendir(path)
+
+    def openbin(self, path, mode='r', buffering=-1, **options):
+        self.check()
+        _mode = Mode(mode)
+        _mode.validate_bin()
+        _path = fspath.abspath(fspath.normpath(path))
+        with self._lock:
+            if not (_mode.writing or _mode.create):
+                layer, info = self._info(path)
+                if info.is_dir:
+                    raise FileExpected(path)
+                return layer.openbin(
+                    _path, mode=mode, buffering=buffering, **options)
+            self._check_parent(path)
+            try:
+                layer, info = self._info(path)
+            except ResourceNotFound:
+                if not _mode.create:
+                    raise
+                layer = info = None
+            if info is not None:
+                if info.is_dir:
+                    raise FileExpected(path)
+                if _mode.exclusive:
+                    raise FileExists(path)
+            self.upper.makedirs(fspath.dirname(_path), recreate=True)
+            if layer is self.lower and not _mode.truncate:
+                self._copy_up(_path, info)
+            self._unwhiteout(_path)
+            f = self.upper.openbin(
+                _path, mode=mode, buffering=buffering, **options)
+            with self._writers_closed:
+                self._writers += 1
+        return _CallbackFile(f, self._writer_closed)
+
+    def _writer_closed(self):
+        with self._writers_closed:
+            self._writers -= 1
+            self._writers_closed.notify_all()
+
+    def wait_for_writers(self):
+        """
+        Wait until no files are open for writing. Call this with `lock()`
+        held so no more are opened.
+        """
+        with self._writers_closed:
+            self._writers_closed.wait_for(lambda: not self._writers)
+
+    def remove(self, path):
+        self.check()
+        _path = fspath.abspath(fspath.normpath(path))
+        with self._lock:
+            if self._info(path)[1].is_dir:
+                raise FileExpected(path)
+            if self.upper.exists(_path):
+                self.upper.remove(_path)
+            self._whiteout(_path)
+
+    def removedir(self, path):
+        self.check()
+        _path = fspath.abspath(fspath.normpath(path))
+        if _path == '/':
+            raise RemoveRootError(path)
+        with self._lock:
+            if not self._info(path)[1].is_dir:
+                raise DirectoryExpected(path)
+            if self._scan(_path):
+                raise DirectoryNotEmpty(path)
+            if self.upper.isdir(_path):
+                self.upper.removedir(_path)
+            self._whiteout(_path)
+
+    def setinfo(self, path, info):
+        self.check()
+        _path = fspath.abspath(fspath.normpath(path))
+        with self._lock:
+            layer, current = self._info(path)
+            if layer is self.lower:
+                self._copy_up(_path, current)
+            self.upper.setinfo(_path, info)
+
+    def reset(self, lower):
+        """
+        Replace the lower filesystem, for example with an archive that
+        includes the changes, and discard all changes. Waits for files that
+        are open for writing to be closed.
+        """
+        with self._lock:
+            self.wait_for_writers()
+            self.lower = lower
+            for info in self.upper.scandir('/'):
+                if info.is_dir:
+                    self.upper.removetree(info.name)
+                else:
+                    self.upper.remove(info.name)
+            self._whiteouts.clear()
+            self._opaque.clear()
+
+    def close(self):
+        if not self.isclosed():
+            self.upper.close()
+        super().close()
+
+
+def write_archive(src_fs, path, kind):
+    """
+    Write all files and directories in `src_fs` to a new zip or tar archive
+    at the local path `path`. Files are streamed into the archive in a
+    single pass.
+
+    :param kind: `zip` or `tar`, tar archives are compressed according to
+      the extension of `path`
+    """
+    compression = next(
+        (c for (c, extensions) in _TAR_COMPRESSION
+         if path.endswith(extensions)), '')
+    with open(path, 'wb') as f, ArchiveWriter(f, kind, compression) as archive:
+        for p, info in src_fs.walk.info(namespaces=['details']):
+            if info.is_dir:
+                archive.add(p.lstrip('/'), info)
+                continue
+            with src_fs.openbin(p) as src:
+                archive.add(p.lstrip('/'), info, src)
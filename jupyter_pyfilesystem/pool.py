@@ -0,0 +1,76 @@
+"""
+Pools of filesystem instances opened from the same URL
+"""
+
+from contextlib import contextmanager
+import itertools
+import queue
+import threading
+
+from fs.wrapfs import WrapFS
+
+
+class FilesystemPool(object):
+    """
+    A fixed set of independently opened filesystems for the same URL.
+
+    Most filesystems serialise calls on an internal lock, and remote
+    filesystems usually use a single connection, so concurrent callers
+    should use different instances.
+    """
+
+    def __init__(self, instances):
+        if not instances:
+            raise ValueError('At least one filesystem is required')
+        self.instances = list(instances)
+        self._cycle = itertools.cycle(self.instances)
+        self._cycle_lock = threading.Lock()
+        self._free = queue.Queue()
+        for fs in self.instances:
+            self._free.put(fs)
+
+    def __len__(self):
+        return len(self.instances)
+
+    def next(self):
+        """
+        Get the next filesystem in round-robin order, it may also be used
+        by other callers
+        """
+        with self._cycle_lock:
+            return next(self._cycle)
+
+    @contextmanager
+    def borrow(self, timeout=None):
+        """
+        Exclusively use a filesystem from the pool, waiting for one to
+        become available if necessary
+        """
+        fs = self._free.get(timeout=timeout)
+        try:
+            yield fs
+        finally:
+            self._free.put(fs)
+
+    def close(self):
+        for fs in self.instances:
+            fs.close()
+
+
+class PooledFS(WrapFS):
+    """
+    Spread calls over the filesystems in a pool in round-robin order
+    """
+
+    def __init__(self, pool):
+        super().__init__(pool.instances[0])
+        self.pool = pool
+
+    def __repr__(self):
+        return 'PooledFS({!r}, size={})'.format(self._wrap_fs, len(self.pool))
+
+    def delegate_path(self, path):
+        return self.pool.next(), path
+
+    def delegate_fs(self):
+        return self.pool.next()
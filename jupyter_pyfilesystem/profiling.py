@@ -0,0 +1,150 @@
+from traitlets import (
+    Float,
+    Int,
+)
+from traitlets.config.configurable import LoggingConfigurable
+
+import cProfile
+from io import StringIO
+import json
+import pstats
+import threading
+import time
+
+
+# Names of the non-filesystem spans that are reported separately
+PHASES = ('parse', 'validate', 'sign')
+
+# Valid `sort` arguments of `ContentsProfiler.stats`
+SORT_KEYS = frozenset(pstats.Stats.sort_arg_dict_default)
+
+
+def phase_times(root):
+    """
+    Split the time spent in a root span into filesystem I/O and the named
+    phases. Filesystem spans are not descended into.
+    """
+    times = dict.fromkeys(('io',) + PHASES, 0.0)
+    todo = list(root.children)
+    while todo:
+        span = todo.pop()
+        if span.name.startswith('fs.'):
+            times['io'] += span.duration or 0
+        elif span.name in PHASES:
+            times[span.name] += span.duration or 0
+        else:
+            todo.extend(span.children)
+    return times
+
+
+class SlowOperationLogger(LoggingConfigurable):
+    """
+    Log a structured record for each contents operation that takes longer
+    than a threshold
+    """
+
+    threshold = Float(
+        0,
+        help='Log operations that take at least this long (seconds)',
+    )
+
+    def root_started(self, span):
+        pass
+
+    def root_finished(self, span):
+        if span.duration < self.threshold:
+            return
+        record = {
+            'operation': span.name,
+            'path': span.attributes.get('path'),
+            'backend': self.parent.backend_name(
+                span.attributes.get('path') or '/'),
+            'duration': round(span.duration, 6),
+            'size': span.attributes.get('size'),
+            'error': span.error,
+        }
+        for k, v in phase_times(span).items():
+            record[k] = round(v, 6)
+        self.log.warning('Slow operation: %s', json.dumps(record))
+
+
+class ContentsProfiler(LoggingConfigurable):
+    """
+    Temporarily profile contents operations with cProfile.
+    Only one profiler can be active at a time in a process, operations that
+    start while another thread is being profiled are skipped.
+    """
+
+    max_duration = Int(
+        600,
+        help='Maximum number of seconds profiling can be enabled for',
+        config=True,
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._until = 0
+        self._profiles = []
+        self._skipped = 0
+
+    @property
+    def active(self):
+        return time.monotonic() < self._until
+
+    def start(self, duration):
+        duration = max(0, min(duration, self.max_duration))
+        self.log.info('Profiling contents operations for %ss', duration)
+        with self._lock:
+            self._until = time.monotonic() + duration
+            self._profiles = []
+            self._skipped = 0
+
+    def stop(self):
+        self.log.info('Stopped profiling contents operations')
+        self._until = 0
+
+    def root_started(self, span):
+        if not self.active:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another thread is already being profiled
+            self._skipped += 1
+            return
+        span.profile = profile
+
+    def root_finished(self, span):
+        profile = getattr(span, 'profile', None)
+        if profile is None:
+            return
+        profile.disable()
+        del span.profile
+        with self._lock:
+            self._profiles.append(profile)
+
+    def stats(self, sort='cumulative', limit=50):
+        """
+        Return the aggregated stats as a dict
+
+        :param sort: One of `SORT_KEYS`
+        """
+        with self._lock:
+            profiles = list(self._profiles)
+            skipped = self._skipped
+        result = {
+            'active': self.active,
+            'operations': len(profiles),
+            'skipped': skipped,
+            'stats': '',
+        }
+        if profiles:
+            out = StringIO()
+            ps = pstats.Stats(profiles[0], stream=out)
+            for p in profiles[1:]:
+                ps.add(p)
+            ps.sort_stats(sort).print_stats(limit)
+            result['stats'] = out.getvalue()
+        return result
@@ -0,0 +1,314 @@
+"""
+Limit the number of concurrent filesystem calls, letting latency sensitive
+operations go ahead of background work when the limit is reached
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+import heapq
+import itertools
+import threading
+import time
+
+from fs.wrapfs import WrapFS
+
+
+# Priority classes, lower values are served first
+SAVE = 0
+OPEN = 1
+LIST = 2
+CHECKPOINT = 3
+BACKGROUND = 4
+
+PRIORITY_NAMES = ['save', 'open', 'list', 'checkpoint', 'background']
+
+
+_context = threading.local()
+
+
+def current_priority():
+    """
+    The priority of filesystem calls made by this thread, BACKGROUND if no
+    operation has set one
+    """
+    value = getattr(_context, 'priority', None)
+    return BACKGROUND if value is None else value
+
+
+@contextmanager
+def priority(value):
+    """
+    Make filesystem calls in this thread at priority `value`, unless an
+    outer operation has already set the priority
+    """
+    outer = getattr(_context, 'priority', None)
+    if outer is None:
+        _context.priority = value
+    try:
+        yield current_priority()
+    finally:
+        if outer is None:
+            _context.priority = None
+
+
+def prioritized(value):
+    """
+    Decorator to run a method at priority `value`
+    """
+    def decorator(func):
+        @wraps(func)
+        def run(*args, **kwargs):
+            with priority(value):
+                return func(*args, **kwargs)
+        return run
+    return decorator
+
+
+class PriorityLimiter(object):
+    """
+    A semaphore allowing at most `limit` concurrent holders, waiting callers
+    get the next free slot in order of priority then arrival.
+
+    Slots are reentrant, a thread that already holds one doesn't wait again,
+    so a filesystem method implemented using other methods can't deadlock.
+
+    :param limit: Maximum number of concurrent holders
+    :param name: Name included in the metrics
+    """
+
+    def __init__(self, limit, name=''):
+        if limit < 1:
+            raise ValueError('limit must be at least 1')
+        self.limit = limit
+        self.name = name
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        # Heap of (priority, seq, thread ident, event)
+        self._waiters = []
+        # {thread ident: number of nested acquisitions}
+        self._holders = {}
+        self.active = 0
+        self.max_queued = 0
+        self.queued = Counter()
+        self.acquired = Counter()
+        self.waited = Counter()
+        self.wait_time = Counter()
+
+    def __repr__(self):
+        return 'PriorityLimiter({!r}, limit={})'.format(self.name, self.limit)
+
+    @property
+    def queue_depth(self):
+        return len(self._waiters)
+
+    def acquire(self, priority=BACKGROUND):
+        """
+        Wait for a slot
+
+        :return: A token to pass to `release`
+        """
+        ident = threading.get_ident()
+        with self._lock:
+            depth = self._holders.get(ident)
+            if depth:
+                self._holders[ident] = depth + 1
+                return ident
+            self.acquired[priority] += 1
+            if self.active < self.limit:
+                self.active += 1
+                self._holders[ident] = 1
+                return ident
+            event = threading.Event()
+            heapq.heappush(
+                self._waiters, (priority, next(self._seq), ident, event))
+            self.queued[priority] += 1
+            self.max_queued = max(self.max_queued, len(self._waiters))
+        start = time.perf_counter()
+        # The slot is handed over by release
+        event.wait()
+        with self._lock:
+            self.waited[priority] += 1
+            self.wait_time[priority] += time.perf_counter() - start
+        return ident
+
+    def release(self, token):
+        """
+        Release a slot returned by `acquire`, possibly from another thread
+        """
+        with self._lock:
+            depth = self._holders[token] - 1
+            if depth:
+                self._holders[token] = depth
+                return
+            del self._holders[token]
+            if self._waiters:
+                priority, _, ident, event = heapq.heappop(self._waiters)
+                self.queued[priority] -= 1
+                self._holders[ident] = 1
+                event.set()
+            else:
+                self.active -= 1
+
+    @contextmanager
+    def slot(self, priority=BACKGROUND):
+        token = self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(token)
+
+    def metrics(self):
+        """
+        A dict of the current usage and queue depth, and totals since
+        creation for each priority class
+        """
+        with self._lock:
+            return {
+                'name': self.name,
+                'limit': self.limit,
+                'active': self.active,
+                'queue_depth': len(self._waiters),
+                'max_queue_depth': self.max_queued,
+                'queued': _by_name(self.queued),
+                'acquired': _by_name(self.acquired),
+                'waited': _by_name(self.waited),
+                'wait_seconds': _by_name(self.wait_time),
+            }
+
+
+def _by_name(counter):
+    return {name: counter[n] for (n, name) in enumerate(PRIORITY_NAMES)}
+
+
+class _ScheduledFile(object):
+    """
+    Proxy for a file that holds a limiter slot until it is closed
+    """
+
+    def __init__(self, f, limiter, token):
+        self._f = f
+        self._limiter = limiter
+        self._token = token
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def close(self):
+        try:
+            self._f.close()
+        finally:
+            token, self._token = self._token, None
+            if token is not None:
+                self._limiter.release(token)
+
+
+class ScheduledFS(WrapFS):
+    """
+    Wrap a filesystem so that each call waits for a slot from `limiter`,
+    at the priority of the current thread. Open files hold their slot until
+    they are closed.
+    """
+
+    def __init__(self, wrap_fs, limiter):
+        super().__init__(wrap_fs)
+        self.limiter = limiter
+
+    def __repr__(self):
+        return 'ScheduledFS({!r}, {!r})'.format(self._wrap_fs, self.limiter)
+
+    def _slot(self):
+        return self.limiter.slot(current_priority())
+
+    def getinfo(self, path, namespaces=None):
+        with self._slot():
+            return super().getinfo(path, namespaces=namespaces)
+
+    def getdetails(self, path):
+        with self._slot():
+            return self._wrap_fs.getdetails(path)
+
+    def listdir(self, path):
+        with self._slot():
+            return super().listdir(path)
+
+    def scandir(self, path, namespaces=None, page=None):
+        with self._slot():
+            infos = list(super().scandir(
+                path, namespaces=namespaces, page=page))
+        return iter(infos)
+
+    def openbin(self, path, mode='r', buffering=-1, **options):
+        token = self.limiter.acquire(current_priority())
+        try:
+            f = super().openbin(
+                path, mode=mode, buffering=buffering, **options)
+        except BaseException:
+            self.limiter.release(token)
+            raise
+        return _ScheduledFile(f, self.limiter, token)
+
+    def readbytes(self, path):
+        with self._slot():
+            return super().readbytes(path)
+
+    def writebytes(self, path, contents):
+        with self._slot():
+            return super().writebytes(path, contents)
+
+    def exists(self, path):
+        with self._slot():
+            return super().exists(path)
+
+    def isdir(self, path):
+        with self._slot():
+            return super().isdir(path)
+
+    def isfile(self, path):
+        with self._slot():
+            return super().isfile(path)
+
+    def makedir(self, path, permissions=None, recreate=False):
+        with self._slot():
+            return super().makedir(
+                path, permissions=permissions, recreate=recreate)
+
+    def makedirs(self, path, permissions=None, recreate=False):
+        with self._slot():
+            return super().makedirs(
+                path, permissions=permissions, recreate=recreate)
+
+    def remove(self, path):
+        with self._slot():
+            return super().remove(path)
+
+    def removedir(self, path):
+        with self._slot():
+            return super().removedir(path)
+
+    def removetree(self, dir_path):
+        with self._slot():
+            return super().removetree(dir_path)
+
+    def move(self, src_path, dst_path, overwrite=False, **kwargs):
+        with self._slot():
+            return super().move(
+                src_path, dst_path, overwrite=overwrite, **kwargs)
+
+    def movedir(self, src_path, dst_path, create=False, **kwargs):
+        with self._slot():
+            return super().movedir(
+                src_path, dst_path, create=create, **kwargs)
+
+    def setinfo(self, path, info):
+        with self._slot():
+            return super().setinfo(path, info)
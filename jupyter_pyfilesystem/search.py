@@ -0,0 +1,315 @@
+"""
+A local SQLite full-text index of the paths and contents of a filesystem
+"""
+
+from datetime import (
+    datetime,
+    timezone,
+)
+import sqlite3
+import threading
+
+import fs.path as fspath
+from traitlets import (
+    Int,
+    List,
+    Unicode,
+)
+from traitlets.config.configurable import LoggingConfigurable
+
+from .entries import modified_time
+from .scheduler import (
+    BACKGROUND,
+    priority,
+)
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    type TEXT NOT NULL,
+    size INTEGER,
+    modified REAL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(path, name, content);
+'''
+
+
+def notebook_text(nb):
+    """
+    The text of all cells in a notebook dict
+    """
+    sources = []
+    for cell in nb.get('cells', []):
+        source = cell.get('source', '')
+        if isinstance(source, list):
+            source = ''.join(source)
+        sources.append(source)
+    return '\n'.join(sources)
+
+
+def _match_query(query):
+    # Match documents containing all terms as prefixes, quoting each term so
+    # FTS5 query syntax in user input isn't interpreted
+    return ' '.join('"{}"*'.format(term.replace('"', '""'))
+                    for term in query.split())
+
+
+def _is_hidden(path):
+    return any(part.startswith('.') for part in fspath.iteratepath(path))
+
+
+class SearchIndex(LoggingConfigurable):
+    """
+    Index of file paths, names and text content.
+
+    Notebooks are indexed by the source of their cells, files with one of
+    `content_extensions` by their text. Hidden files and directories are not
+    indexed.
+    """
+
+    db_path = Unicode(
+        ':memory:',
+        help='Path of the SQLite database',
+        config=True,
+    )
+
+    content_extensions = List(
+        Unicode(),
+        default_value=['.md', '.txt', '.py', '.rst'],
+        help='Extensions of files whose text content is indexed',
+        config=True,
+    )
+
+    max_content_size = Int(
+        default_value=1024 * 1024,
+        help='Only index the content of files up to this size in bytes',
+        config=True,
+    )
+
+    batch_size = Int(
+        default_value=500,
+        help='Number of files indexed by the crawler in each transaction',
+        config=True,
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def wants_content(self, path, type, size):
+        if type == 'notebook':
+            return True
+        return (type == 'file' and
+                (size or 0) <= self.max_content_size and
+                fspath.splitext(path)[1].lower() in self.content_extensions)
+
+    def _upsert(self, path, type, size, modified, content):
+        row = self._db.execute(
+            'SELECT id FROM files WHERE path = ?', (path,)).fetchone()
+        if row:
+            self._db.execute(
+                'UPDATE files SET type = ?, size = ?, modified = ? '
+                'WHERE id = ?', (type, size, modified, row[0]))
+            self._db.execute('DELETE FROM fts WHERE rowid = ?', (row[0],))
+            rowid = row[0]
+        else:
+            rowid = self._db.execute(
+                'INSERT INTO files (path, type, size, modified) '
+                'VALUES (?, ?, ?, ?)', (path, type, size, modified)).lastrowid
+        self._db.execute(
+            'INSERT INTO fts (rowid, path, name, content) VALUES (?, ?, ?, ?)',
+            (rowid, path, fspath.basename(path), content or ''))
+
+    def add(self, path, type, size=None, modified=None, content=None):
+        """
+        Add or update a file, notebook or directory
+        """
+        path = fspath.abspath(path)
+        if _is_hidden(path):
+            return
+        with self._lock, self._db:
+            self._upsert(path, type, size, modified, content)
+
+    def remove(self, path):
+        """
+        Remove `path` and everything under it
+        """
+        path = fspath.abspath(path)
+        with self._lock, self._db:
+            self._db.execute(
+                'DELETE FROM fts WHERE rowid IN (SELECT id FROM files '
+                'WHERE path = ? OR substr(path, 1, ?) = ?)',
+                (path, len(path) + 1, fspath.forcedir(path)))
+            self._db.execute(
+                'DELETE FROM files WHERE path = ? OR substr(path, 1, ?) = ?',
+                (path, len(path) + 1, fspath.forcedir(path)))
+
+    def move(self, src_path, dst_path):
+        """
+        Update the paths of `src_path` and everything under it
+        """
+        src_path = fspath.abspath(src_path)
+        dst_path = fspath.abspath(dst_path)
+        if _is_hidden(dst_path):
+            return self.remove(src_path)
+        with self._lock, self._db:
+            rows = self._db.execute(
+                'SELECT id, path FROM files '
+                'WHERE path = ? OR substr(path, 1, ?) = ?',
+                (src_path, len(src_path) + 1, fspath.forcedir(src_path)))
+            for rowid, path in rows.fetchall():
+                new_path = dst_path + path[len(src_path):]
+                self._db.execute(
+                    'DELETE FROM fts WHERE rowid IN '
+                    '(SELECT id FROM files WHERE path = ?)', (new_path,))
+                self._db.execute(
+                    'DELETE FROM files WHERE path = ?', (new_path,))
+                self._db.execute(
+                    'UPDATE files SET path = ? WHERE id = ?',
+                    (new_path, rowid))
+                self._db.execute(
+                    'UPDATE fts SET path = ?, name = ? WHERE rowid = ?',
+                    (new_path, fspath.basename(new_path), rowid))
+
+    def search(self, query, limit=50):
+        """
+        Find files whose path or content contain all words in `query`
+
+        :return: A list of dicts with `path`, `name`, `type`, `size`,
+          `last_modified` and `snippet` of the best matches
+        """
+        match = _match_query(query)
+        if not match:
+            return []
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT files.path, files.type, files.size, files.modified, '
+                "snippet(fts, 2, '', '', '...', 16) FROM fts "
+                'JOIN files ON files.id = fts.rowid '
+                'WHERE fts MATCH ? ORDER BY rank LIMIT ?',
+                (match, limit)).fetchall()
+        return [{
+            'path': path.lstrip('/'),
+            'name': fspath.basename(path),
+            'type': type,
+            'size': size,
+            'last_modified': (
+                None if modified is None else
+                datetime.fromtimestamp(modified, timezone.utc)),
+            'snippet': snippet,
+        } for (path, type, size, modified, snippet) in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT count(*) FROM files').fetchone()[0]
+
+    def crawl(self, walker, guess_type, read_content, stop=None):
+        """
+        Walk a filesystem and index files that are new or whose size or
+        modification time changed, then remove files that no longer exist.
+
+        :param walker: A `ParallelWalker` for the filesystem
+        :param guess_type: A function like `FsContentsManager.guess_type`
+          that returns the contents type of a file path
+        :param read_content: A function that returns the text to index for a
+          path and type
+        :param stop: A `threading.Event` that stops the crawl when set
+        """
+        with self._lock:
+            known = {path: (size, modified) for (path, size, modified) in
+                     self._db.execute(
+                         'SELECT path, size, modified FROM files')}
+        seen = set()
+        pending = []
+        walker.namespaces = ['details']
+        walker.exclude_hidden = True
+        walker.ignore_errors = True
+        for dirpath, dirs, files in walker.walk('/'):
+            if stop is not None and stop.is_set():
+                return False
+            for info in dirs:
+                path = fspath.join(dirpath, info.name)
+                seen.add(path)
+                if path not in known:
+                    pending.append((path, 'directory', None, None, None))
+            for info in files:
+                path = fspath.join(dirpath, info.name)
+                seen.add(path)
+                version = (info.size, modified_time(info))
+                if known.get(path) == version:
+                    continue
+                type = guess_type(path, allow_directory=False)
+                content = None
+                if self.wants_content(path, type, info.size):
+                    try:
+                        content = read_content(path, type)
+                    except Exception as e:
+                        self.log.debug('Not indexing content of %s: %s',
+                                       path, e)
+                pending.append((path, type) + version + (content,))
+            if len(pending) >= self.batch_size:
+                self._add_many(pending)
+                pending = []
+        self._add_many(pending)
+        with self._lock, self._db:
+            for path in set(known).difference(seen):
+                self._db.execute(
+                    'DELETE FROM fts WHERE rowid IN '
+                    '(SELECT id FROM files WHERE path = ?)', (path,))
+                self._db.execute('DELETE FROM files WHERE path = ?', (path,))
+        return True
+
+    def _add_many(self, rows):
+        if rows:
+            with self._lock, self._db:
+                for row in rows:
+                    self._upsert(*row)
+
+
+class Crawler(object):
+    """
+    Background thread that crawls a filesystem into a `SearchIndex` at an
+    interval
+    """
+
+    def __init__(self, index, contents_manager, interval=0):
+        self.index = index
+        self.contents_manager = contents_manager
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.crawled = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name='fs-search-crawler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        cm = self.contents_manager
+        while not self.stopped.is_set():
+            try:
+                cm.log.info('Indexing %s', cm.fs)
+                with priority(BACKGROUND):
+                    crawled = self.index.crawl(
+                        cm.walker(), cm.guess_type, cm.index_content,
+                        self.stopped)
+                if crawled:
+                    cm.log.info('Indexed %d paths', len(self.index))
+            except Exception as e:
+                cm.log.warning('Failed to index %s: %s', cm.fs, e)
+            self.crawled.set()
+            if not self.interval:
+                break
+            self.stopped.wait(self.interval)
@@ -0,0 +1,108 @@
+"""
+Reduce the cost of notebook trust signatures: remember the content hashes
+of notebooks known to be trusted, and batch writes to the signature database
+"""
+
+from collections import OrderedDict
+from datetime import (
+    datetime,
+    timezone,
+)
+import threading
+
+from nbformat.sign import (
+    SignatureStore,
+    SQLiteSignatureStore,
+)
+
+from .hashes import DigestSet
+
+
+class TrustedDigests(DigestSet):
+    """
+    The content hashes of the most recently signed or verified notebooks.
+    Only trusted notebooks are remembered, since a notebook can become
+    trusted without being saved.
+    """
+
+
+class BatchedSignatureStore(SignatureStore):
+    """
+    Wrap a signature store so that signatures are written in a single
+    transaction when `flush` is called instead of one per save, and checks
+    don't write the last seen time of the signature immediately.
+
+    Signatures waiting to be written are trusted by `check_signature`.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        # {(algorithm, signature): True if new, False to only update the
+        # last seen time}
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def store_signature(self, digest, algorithm):
+        with self._lock:
+            self._pending[(algorithm, digest)] = True
+
+    def check_signature(self, digest, algorithm):
+        key = (algorithm, digest)
+        with self._lock:
+            if key in self._pending:
+                return True
+        db = getattr(self.store, 'db', None)
+        if not isinstance(self.store, SQLiteSignatureStore) or db is None:
+            return self.store.check_signature(digest, algorithm)
+        found = db.execute(
+            'SELECT id FROM nbsignatures WHERE algorithm = ? AND '
+            'signature = ?', key).fetchone() is not None
+        if found:
+            with self._lock:
+                self._pending.setdefault(key, False)
+        return found
+
+    def remove_signature(self, digest, algorithm):
+        with self._lock:
+            self._pending.pop((algorithm, digest), None)
+        self.store.remove_signature(digest, algorithm)
+
+    def flush(self):
+        """
+        Write the pending signatures
+
+        :return: The number of signatures written
+        """
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+        if not pending:
+            return 0
+        db = getattr(self.store, 'db', None)
+        if not isinstance(self.store, SQLiteSignatureStore) or db is None:
+            for (algorithm, digest) in pending:
+                self.store.store_signature(digest, algorithm)
+            return len(pending)
+        now = datetime.now(tz=timezone.utc)
+        with db:
+            for (algorithm, digest), new in pending.items():
+                updated = db.execute(
+                    'UPDATE nbsignatures SET last_seen = ? WHERE '
+                    'algorithm = ? AND signature = ?',
+                    (now, algorithm, digest)).rowcount
+                if new and not updated:
+                    db.execute(
+                        'INSERT INTO nbsignatures (algorithm, signature, '
+                        'last_seen) VALUES (?, ?, ?)',
+                        (algorithm, digest, now))
+        (n,) = db.execute('SELECT Count(*) FROM nbsignatures').fetchone()
+        if n > self.store.cache_size:
+            self.store.cull_db()
+            db.commit()
+        return len(pending)
+
+    def close(self):
+        self.flush()
+        self.store.close()
@@ -0,0 +1,462 @@
+"""
+A filesystem that caches files from a remote filesystem on a local filesystem
+"""
+
+from collections import OrderedDict
+import json
+import logging
+import threading
+import time
+
+from fs.base import FS
+from fs.errors import ResourceNotFound
+from fs.mode import Mode
+import fs.path as fspath
+from fs.wrapfs import WrapFS
+
+from .entries import modified_time
+
+
+WRITE_THROUGH = 'write-through'
+WRITE_BACK = 'write-back'
+
+INDEX_PATH = '/index.json'
+FILES_DIR = '/files'
+
+
+class _CallbackFile(object):
+    """
+    Proxy for a file that calls a function after the file is closed
+    """
+
+    def __init__(self, f, on_close):
+        self._f = f
+        self._on_close = on_close
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+            self._on_close()
+
+
+class TieredFS(WrapFS):
+    """
+    Serve reads of a remote filesystem from a local cache.
+
+    Cached files are validated against the size and modification time of the
+    remote file before being used. Writes either go to the remote filesystem
+    immediately (write-through) or are written to the cache and uploaded by
+    `flush` (write-back). The least recently used unmodified files are evicted
+    when the cache exceeds `max_size` bytes.
+
+    :param remote_fs: The remote filesystem
+    :param cache_fs: A local filesystem used to store cached files
+    :param mode: `write-through` or `write-back`
+    :param max_size: Maximum size of the cache in bytes, 0 for unlimited
+    :param close_wrapped: Close the remote and cache filesystems when this
+      filesystem is closed
+    :param index_save_interval: Minimum seconds between writes of the index
+      when only unmodified files were cached or evicted. Files modified in
+      write-back mode are always saved to the index immediately so they're
+      uploaded after a crash
+    """
+
+    def __init__(self, remote_fs, cache_fs, mode=WRITE_THROUGH, max_size=0,
+                 close_wrapped=False, log=None, index_save_interval=5):
+        super().__init__(remote_fs)
+        if mode not in (WRITE_THROUGH, WRITE_BACK):
+            raise ValueError('Invalid cache mode: {}'.format(mode))
+        self.cache_fs = cache_fs
+        self.mode = mode
+        self.max_size = max_size
+        self.close_wrapped = close_wrapped
+        self.log = log or logging.getLogger(__name__)
+        self._index_lock = threading.RLock()
+        # path: {'size', 'modified', 'dirty'} ordered by least recently used
+        # `dirty` is False or an increasing write counter
+        self._index = OrderedDict()
+        # Total size of the files in the index
+        self._size = 0
+        self._version = 0
+        self.index_save_interval = index_save_interval
+        self._saved_at = time.monotonic()
+        self._unsaved = False
+        # {path: Event} of files being downloaded
+        self._downloading = {}
+        # {path: count} of cached files being opened, which aren't evicted
+        self._pinned = {}
+        self.cache_fs.makedir(FILES_DIR, recreate=True)
+        self.check_consistency()
+
+    def __repr__(self):
+        return 'TieredFS({!r}, {!r}, mode={!r})'.format(
+            self._wrap_fs, self.cache_fs, self.mode)
+
+    @property
+    def cache_size(self):
+        return self._size
+
+    def _set_entry(self, path, entry):
+        with self._index_lock:
+            previous = self._index.pop(path, None)
+            if previous is not None:
+                self._size -= previous['size']
+            self._index[path] = entry
+            self._size += entry['size']
+
+    def _pop_entry(self, path):
+        with self._index_lock:
+            entry = self._index.pop(path, None)
+            if entry is not None:
+                self._size -= entry['size']
+            return entry
+
+    def _cache_path(self, path):
+        return fspath.join(FILES_DIR, fspath.relpath(path))
+
+    def _load_index(self):
+        try:
+            index = json.loads(self.cache_fs.readtext(INDEX_PATH))
+        except ResourceNotFound:
+            return OrderedDict()
+        except ValueError as e:
+            self.log.warning('Ignoring invalid cache index: %s', e)
+            return OrderedDict()
+        return OrderedDict(index)
+
+    def _save_index(self):
+        with self._index_lock:
+            self.cache_fs.writetext(
+                INDEX_PATH, json.dumps(list(self._index.items())))
+            self._saved_at = time.monotonic()
+            self._unsaved = False
+
+    def _index_changed(self):
+        # Save the index if it hasn't been saved recently, otherwise leave it
+        # for a later change or close. Losing an unsaved change only loses
+        # cached copies of unmodified files.
+        with self._index_lock:
+            self._unsaved = True
+            if (time.monotonic() - self._saved_at >=
+                    self.index_save_interval):
+                self._save_index()
+
+    def check_consistency(self):
+        """
+        Check the cache is consistent with its index: drop index entries
+        whose cached file is missing or the wrong size, delete cached files
+        that aren't in the index, and upload files that were modified but not
+        flushed before the cache was last closed.
+        """
+        with self._index_lock:
+            index = self._load_index()
+            for path, entry in list(index.items()):
+                cache_path = self._cache_path(path)
+                try:
+                    size = self.cache_fs.getsize(cache_path)
+                except ResourceNotFound:
+                    size = None
+                if size != entry['size']:
+                    self.log.warning('Dropping inconsistent cache entry %s',
+                                     path)
+                    del index[path]
+            known = set(self._cache_path(p) for p in index)
+            for cache_path in list(self.cache_fs.walk.files(FILES_DIR)):
+                if cache_path not in known:
+                    self.log.debug('Removing unindexed cache file %s',
+                                   cache_path)
+                    self.cache_fs.remove(cache_path)
+            self._index = index
+            self._size = sum(e['size'] for e in index.values())
+            self._version = max(
+                [e['dirty'] for e in index.values()] + [0])
+            self._save_index()
+        self.flush()
+
+    def _pin(self, path):
+        with self._index_lock:
+            self._pinned[path] = self._pinned.get(path, 0) + 1
+
+    def _unpin(self, path):
+        with self._index_lock:
+            self._pinned[path] -= 1
+            if not self._pinned[path]:
+                del self._pinned[path]
+
+    def _cache_file(self, path, cache_large=True):
+        """
+        Ensure the cached copy of `path` is valid, downloading it if
+        necessary. Returns the cache path, the file is pinned so it isn't
+        evicted until the caller calls `_unpin`.
+
+        :param cache_large: If False files larger than `max_size` aren't
+          cached and None is returned
+        """
+        path = fspath.abspath(fspath.normpath(path))
+        cache_path = self._cache_path(path)
+        with self._index_lock:
+            entry = self._index.get(path)
+            if entry and entry['dirty']:
+                self._index.move_to_end(path)
+                self._pin(path)
+                return cache_path
+        while True:
+            info = self._wrap_fs.getdetails(path)
+            with self._index_lock:
+                entry = self._index.get(path)
+                if (entry and entry['size'] == info.size and
+                        entry['modified'] == modified_time(info)):
+                    self._index.move_to_end(path)
+                    self._pin(path)
+                    return cache_path
+                if (not cache_large and self.max_size and
+                        info.size > self.max_size):
+                    return None
+                downloading = self._downloading.get(path)
+                if downloading is None:
+                    downloading = self._downloading[path] = threading.Event()
+                    break
+            # Wait for the other download, then check it's still valid
+            downloading.wait()
+        try:
+            self.log.debug('Caching %s', path)
+            self.cache_fs.makedirs(fspath.dirname(cache_path), recreate=True)
+            with self._wrap_fs.openbin(path, 'r') as src:
+                self.cache_fs.upload(cache_path, src)
+            with self._index_lock:
+                self._set_entry(path, {
+                    'size': info.size,
+                    'modified': modified_time(info),
+                    'dirty': False,
+                })
+                self._pin(path)
+                self._evict()
+                self._index_changed()
+        finally:
+            with self._index_lock:
+                del self._downloading[path]
+            downloading.set()
+        return cache_path
+
+    def _written(self, path):
+        cache_path = self._cache_path(path)
+        size = self.cache_fs.getsize(cache_path)
+        with self._index_lock:
+            self._version += 1
+            self._set_entry(path, {
+                'size': size,
+                'modified': None,
+                'dirty': self._version,
+            })
+            if self.mode == WRITE_BACK:
+                self._save_index()
+        if self.mode == WRITE_THROUGH:
+            self._upload(path)
+        with self._index_lock:
+            self._evict()
+
+    def _upload(self, path):
+        cache_path = self._cache_path(path)
+        with self._index_lock:
+            version = self._index[path]['dirty']
+        with self.cache_fs.openbin(cache_path, 'r') as src:
+            self._wrap_fs.upload(path, src)
+        info = self._wrap_fs.getdetails(path)
+        with self._index_lock:
+            entry = self._index.get(path)
+            # Only mark as clean if it wasn't written again during the upload
+            if entry and entry['dirty'] == version:
+                entry['modified'] = modified_time(info)
+                entry['dirty'] = False
+            # If this is lost the file is uploaded again after a restart
+            self._index_changed()
+
+    def _evict(self):
+        if not self.max_size:
+            return
+        with self._index_lock:
+            total = self._size
+            evicted = []
+            for path, entry in self._index.items():
+                if total <= self.max_size:
+                    break
+                if not entry['dirty'] and path not in self._pinned:
+                    evicted.append(path)
+                    total -= entry['size']
+            for path in evicted:
+                self._drop(path)
+
+    def _drop(self, path):
+        with self._index_lock:
+            if self._pop_entry(path) is not None:
+                try:
+                    self.cache_fs.remove(self._cache_path(path))
+                except ResourceNotFound:
+                    pass
+
+    def _dirty_under(self, path):
+        prefix = fspath.forcedir(path)
+        with self._index_lock:
+            return [p for (p, e) in self._index.items()
+                    if e['dirty'] and (p == path or p.startswith(prefix))]
+
+    def _drop_under(self, path):
+        prefix = fspath.forcedir(path)
+        with self._index_lock:
+            for p in list(self._index):
+                if p == path or p.startswith(prefix):
+                    self._drop(p)
+
+    def flush(self, path='/'):
+        """
+        Upload modified files under `path` to the remote filesystem
+        """
+        for p in self._dirty_under(fspath.abspath(path)):
+            self.log.debug('Flushing %s', p)
+            self._upload(p)
+
+    def _is_dirty(self, path):
+        with self._index_lock:
+            entry = self._index.get(fspath.abspath(fspath.normpath(path)))
+            return bool(entry and entry['dirty'])
+
+    def openbin(self, path, mode='r', buffering=-1, **options):
+        self.check()
+        path = fspath.abspath(fspath.normpath(path))
+        _mode = Mode(mode)
+        cache_path = self._cache_path(path)
+        if not _mode.writing:
+            cache_path = self._cache_file(path, cache_large=False)
+            if cache_path is None:
+                # Too large to cache
+                return self._wrap_fs.openbin(path, mode)
+            try:
+                return self.cache_fs.openbin(cache_path, mode)
+            finally:
+                self._unpin(path)
+
+        if _mode.truncate:
+            if not self._wrap_fs.isdir(fspath.dirname(path)):
+                raise ResourceNotFound(path)
+            self.cache_fs.makedirs(fspath.dirname(cache_path), recreate=True)
+            self._pin(path)
+        else:
+            try:
+                self._cache_file(path)
+            except ResourceNotFound:
+                if not _mode.create:
+                    raise
+                self.cache_fs.makedirs(
+                    fspath.dirname(cache_path), recreate=True)
+                self._pin(path)
+        try:
+            f = self.cache_fs.openbin(cache_path, mode, buffering=buffering)
+        except BaseException:
+            self._unpin(path)
+            raise
+
+        def on_close():
+            # Pinned until written so it isn't evicted while it's open
+            self._unpin(path)
+            self._written(path)
+
+        return _CallbackFile(f, on_close)
+
+    # Use the generic FS implementations which are built on openbin so that
+    # they go through the cache instead of directly to the remote filesystem
+    open = FS.open
+    readbytes = FS.readbytes
+    writebytes = FS.writebytes
+    readtext = FS.readtext
+    writetext = FS.writetext
+    appendbytes = FS.appendbytes
+    appendtext = FS.appendtext
+    upload = FS.upload
+    download = FS.download
+    writefile = FS.writefile
+
+    def getinfo(self, path, namespaces=None):
+        if self.mode == WRITE_BACK and self._is_dirty(path):
+            return self.cache_fs.getinfo(
+                self._cache_path(path), namespaces=namespaces)
+        return super().getinfo(path, namespaces=namespaces)
+
+    def exists(self, path):
+        return self._is_dirty(path) or self._wrap_fs.exists(path)
+
+    def isfile(self, path):
+        return self._is_dirty(path) or self._wrap_fs.isfile(path)
+
+    def scandir(self, path, namespaces=None, page=None):
+        names = set()
+        for info in super().scandir(path, namespaces=namespaces, page=page):
+            names.add(info.name)
+            if self.mode == WRITE_BACK and self._is_dirty(
+                    fspath.join(path, info.name)):
+                info = self.getinfo(
+                    fspath.join(path, info.name), namespaces=namespaces)
+            yield info
+        if page is None:
+            # Files that only exist in the cache
+            parent = fspath.abspath(fspath.normpath(path))
+            for p in self._dirty_under(parent):
+                if fspath.dirname(p) == parent and \
+                        fspath.basename(p) not in names:
+                    yield self.getinfo(p, namespaces=namespaces)
+
+    def listdir(self, path):
+        return [info.name for info in self.scandir(path)]
+
+    def remove(self, path):
+        path = fspath.abspath(fspath.normpath(path))
+        try:
+            super().remove(path)
+        except ResourceNotFound:
+            if not self._is_dirty(path):
+                raise
+        self._drop(path)
+
+    def removedir(self, path):
+        super().removedir(path)
+        self._drop_under(path)
+
+    def removetree(self, path):
+        super().removetree(path)
+        self._drop_under(path)
+
+    def move(self, src_path, dst_path, overwrite=False, **kwargs):
+        self.flush(src_path)
+        super().move(src_path, dst_path, overwrite=overwrite, **kwargs)
+        self._drop_under(fspath.abspath(src_path))
+        self._drop_under(fspath.abspath(dst_path))
+
+    def movedir(self, src_path, dst_path, create=False, **kwargs):
+        self.flush(src_path)
+        super().movedir(src_path, dst_path, create=create, **kwargs)
+        self._drop_under(fspath.abspath(src_path))
+        self._drop_under(fspath.abspath(dst_path))
+
+    def close(self):
+        if not self.isclosed():
+            try:
+                if not (self._wrap_fs.isclosed() or self.cache_fs.isclosed()):
+                    self.flush()
+                    if self._unsaved:
+                        self._save_index()
+            finally:
+                if self.close_wrapped:
+                    self.cache_fs.close()
+                    self._wrap_fs.close()
+        super().close()
@@ -0,0 +1,387 @@
+from traitlets import (
+    Instance,
+    List,
+    Unicode,
+)
+from traitlets.config.configurable import LoggingConfigurable
+
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+import inspect
+import json
+import threading
+import time
+import uuid
+
+from fs.wrapfs import WrapFS
+
+
+class Span(object):
+    """
+    A single timed operation, optionally nested inside a parent span
+    """
+
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.children = []
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': datetime.utcfromtimestamp(self.start_time).isoformat(),
+            'duration': self.duration,
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+class SpanExporter(LoggingConfigurable):
+    """
+    Base class for span exporters, subclasses must implement `export`
+    """
+
+    def export(self, span):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """
+    Append each finished span as a line of JSON to a local file
+    """
+
+    filename = Unicode(
+        'jupyter-pyfilesystem-trace.jsonl',
+        help='File that spans are appended to',
+        config=True,
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._fo = None
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            if self._fo is None:
+                self._fo = open(self.filename, 'a')
+            self._fo.write(line + '\n')
+            self._fo.flush()
+
+    def close(self):
+        with self._lock:
+            if self._fo is not None:
+                self._fo.close()
+                self._fo = None
+
+
+class Tracer(LoggingConfigurable):
+    """
+    Creates nested spans and passes finished spans to an exporter.
+    Each thread has its own stack of active spans.
+    """
+
+    exporter = Instance(SpanExporter, allow_none=True)
+
+    listeners = List(
+        help='''Objects with `root_started(span)` and `root_finished(span)`
+        methods that are called at the start and end of each root span''',
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._local = threading.local()
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    @property
+    def current(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def set_attribute(self, key, value):
+        span = self.current
+        if span is not None:
+            span.set_attribute(key, value)
+
+    def start(self, name, **attributes):
+        """
+        Start a child of the current span without making it the current
+        span, for work that continues after the call that started it such as
+        reading an open file. It must be finished with `end`.
+        """
+        parent = self.current
+        if parent is None:
+            span = Span(name, uuid.uuid4().hex, None, attributes)
+            for listener in self.listeners:
+                listener.root_started(span)
+        else:
+            span = Span(name, parent.trace_id, parent.span_id, attributes)
+            parent.children.append(span)
+        return span
+
+    def end(self, span):
+        span.finish()
+        self._finished(span)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span = self.start(name, **attributes)
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = '{}: {}'.format(e.__class__.__name__, e)
+            raise
+        finally:
+            stack.pop()
+            self.end(span)
+
+    @contextmanager
+    def activate(self, span):
+        """
+        Make `span` the current span in this thread, so work done for it in
+        another thread is recorded as its children
+        """
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            stack.pop()
+
+    def _finished(self, span):
+        if span.parent_id is None:
+            for listener in self.listeners:
+                try:
+                    listener.root_finished(span)
+                except Exception as e:
+                    self.log.warning(
+                        'Span listener failed for %s: %s', span.name, e)
+        if self.exporter is not None:
+            try:
+                self.exporter.export(span)
+            except Exception as e:
+                self.log.warning('Failed to export span %s: %s', span.name, e)
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+
+@contextmanager
+def span(tracer, name, **attributes):
+    """
+    Open a span on `tracer`, or do nothing if `tracer` is None
+    """
+    if tracer is None:
+        yield None
+    else:
+        with tracer.span(name, **attributes) as s:
+            yield s
+
+
+@contextmanager
+def activate(tracer, span):
+    """
+    Make `span` the current span of `tracer` in this thread, or do nothing if
+    either is None
+    """
+    if tracer is None or span is None:
+        yield span
+    else:
+        with tracer.activate(span):
+            yield span
+
+
+def traced(func):
+    """
+    Decorator to run a method inside a span named after the method.
+    The instance must have a `tracer` attribute, if it is None the method is
+    called directly. If the method has a `path` or `old_path` argument it's
+    added to the span.
+    """
+    argnames = list(inspect.signature(func).parameters)[1:]
+    pathname = next(
+        (a for a in ('path', 'old_path') if a in argnames), None)
+
+    @wraps(func)
+    def trace(self, *args, **kwargs):
+        tracer = self.tracer
+        if tracer is None:
+            return func(self, *args, **kwargs)
+        attributes = {}
+        if pathname in kwargs:
+            attributes['path'] = kwargs[pathname]
+        elif pathname and argnames.index(pathname) < len(args):
+            attributes['path'] = args[argnames.index(pathname)]
+        with tracer.span(func.__name__, **attributes):
+            return func(self, *args, **kwargs)
+    return trace
+
+
+class _TracedFile(object):
+    """
+    Proxy for a file that counts the bytes read and written, and ends a span
+    when the file is closed
+    """
+
+    def __init__(self, f, tracer, span):
+        self._f = f
+        self._tracer = tracer
+        self._span = span
+        self._bytes = 0
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        for line in self._f:
+            self._bytes += len(line)
+            yield line
+
+    def read(self, *args):
+        data = self._f.read(*args)
+        self._bytes += len(data)
+        return data
+
+    def readinto(self, b):
+        n = self._f.readinto(b)
+        self._bytes += n or 0
+        return n
+
+    def write(self, b):
+        n = self._f.write(b)
+        self._bytes += len(b) if n is None else n
+        return n
+
+    def close(self):
+        if self._f.closed:
+            return
+        try:
+            self._f.close()
+        except Exception as e:
+            self._span.error = '{}: {}'.format(e.__class__.__name__, e)
+            raise
+        finally:
+            self._span.set_attribute('bytes', self._bytes)
+            self._tracer.end(self._span)
+
+
+class TracedFS(WrapFS):
+    """
+    Wrap a filesystem so that calls made by the contents manager are recorded
+    as child spans of the current span
+    """
+
+    def __init__(self, wrap_fs, tracer):
+        super().__init__(wrap_fs)
+        self._tracer = tracer
+
+    def _span(self, name, path, **attributes):
+        return self._tracer.span('fs.' + name, path=path, **attributes)
+
+    def validatepath(self, path):
+        with self._span('validatepath', path):
+            return super().validatepath(path)
+
+    def getinfo(self, path, namespaces=None):
+        with self._span('getinfo', path) as span:
+            info = super().getinfo(path, namespaces=namespaces)
+            if info.has_namespace('details'):
+                span.set_attribute('size', info.size)
+            return info
+
+    def getdetails(self, path):
+        with self._span('getdetails', path) as span:
+            info = self._wrap_fs.getdetails(path)
+            span.set_attribute('size', info.size)
+            return info
+
+    def scandir(self, path, namespaces=None, page=None):
+        with self._span('scandir', path) as span:
+            infos = list(super().scandir(
+                path, namespaces=namespaces, page=page))
+            span.set_attribute('count', len(infos))
+        return iter(infos)
+
+    def openbin(self, path, mode='r', buffering=-1, **options):
+        # The span lasts until the file is closed so reads and writes are
+        # timed
+        span = self._tracer.start('fs.openbin', path=path, mode=mode)
+        try:
+            f = super().openbin(
+                path, mode=mode, buffering=buffering, **options)
+        except Exception as e:
+            span.error = '{}: {}'.format(e.__class__.__name__, e)
+            self._tracer.end(span)
+            raise
+        return _TracedFile(f, self._tracer, span)
+
+    def exists(self, path):
+        with self._span('exists', path):
+            return super().exists(path)
+
+    def isdir(self, path):
+        with self._span('isdir', path):
+            return super().isdir(path)
+
+    def isfile(self, path):
+        with self._span('isfile', path):
+            return super().isfile(path)
+
+    def makedir(self, path, permissions=None, recreate=False):
+        with self._span('makedir', path):
+            return super().makedir(
+                path, permissions=permissions, recreate=recreate)
+
+    def remove(self, path):
+        with self._span('remove', path):
+            return super().remove(path)
+
+    def removedir(self, path):
+        with self._span('removedir', path):
+            return super().removedir(path)
+
+    def move(self, src_path, dst_path, overwrite=False, **kwargs):
+        with self._span('move', src_path, dst=dst_path):
+            return super().move(
+                src_path, dst_path, overwrite=overwrite, **kwargs)
+
+    def movedir(self, src_path, dst_path, create=False, **kwargs):
+        with self._span('movedir', src_path, dst=dst_path):
+            return super().movedir(
+                src_path, dst_path, create=create, **kwargs)
@@ -0,0 +1,51 @@
+"""
+Validate notebooks against the notebook format schema, with a compiled
+validator when one is available
+"""
+
+import nbformat
+from nbformat import validator as nbvalidator
+from nbformat.reader import get_version
+
+
+ALWAYS = 'always'
+ON_CHANGE = 'on-change'
+SAMPLED = 'sampled'
+POLICIES = (ALWAYS, ON_CHANGE, SAMPLED)
+
+
+def compiled_validator(version, version_minor):
+    """
+    The fastjsonschema validator for a notebook format version, or None if
+    fastjsonschema or a schema for the version isn't available
+    """
+    try:
+        return nbvalidator.get_validator(
+            version, version_minor, name='fastjsonschema')
+    except (TypeError, ValueError, ImportError):
+        # TypeError: nbformat doesn't support choosing a validator
+        return None
+
+
+def _duplicate_ids(nb):
+    ids = [cell['id'] for cell in nb.get('cells', ()) if 'id' in cell]
+    return len(ids) != len(set(ids))
+
+
+def validate_notebook(nb):
+    """
+    Validate a notebook, raising `nbformat.ValidationError` if it's invalid.
+
+    Valid notebooks are only checked by the compiled validator if there is
+    one. Invalid notebooks, and notebooks with duplicate cell IDs that
+    nbformat repairs, are validated by `nbformat.validate` which gives more
+    detailed errors.
+    """
+    validator = compiled_validator(*get_version(nb))
+    if validator is not None and not _duplicate_ids(nb):
+        try:
+            validator.validate(nb)
+            return
+        except nbformat.ValidationError:
+            pass
+    nbformat.validate(nb)
@@ -0,0 +1,149 @@
+"""
+Walk a directory tree listing many directories concurrently
+"""
+
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import contextmanager
+from fnmatch import fnmatch
+
+from fs.errors import FSError
+import fs.path as fspath
+
+from .pool import FilesystemPool
+from .scheduler import (
+    current_priority,
+    priority,
+)
+from .tracing import activate
+
+
+class ParallelWalker(object):
+    """
+    Breadth-first walk that runs `scandir` on up to `workers` directories
+    at the same time.
+
+    Unlike `fs.walk` results are yielded as soon as each directory has been
+    listed, so the order of directories isn't deterministic.
+
+    :param fs: A filesystem, or a `FilesystemPool` in which case each listing
+      borrows a filesystem from the pool
+    :param workers: Maximum number of concurrent listings
+    :param max_depth: Maximum depth below the starting directory to walk,
+      None for unlimited. 0 only lists the starting directory
+    :param exclude_dirs: Patterns of directory names to skip
+    :param include_dirs: Patterns of directory names to walk even if they're
+      hidden or match `exclude_dirs`
+    :param exclude: Patterns of file names to skip
+    :param exclude_hidden: Skip files and directories starting with `.`
+    :param namespaces: Info namespaces to request
+    :param ignore_errors: Skip directories that can't be listed instead of
+      raising the error
+    :param tracer: Optional tracer, listings are recorded under the span that
+      is current when the walk starts
+
+    Listings are made at the priority of the thread that starts the walk.
+    """
+
+    def __init__(self, fs, workers=8, max_depth=None, exclude_dirs=None,
+                 include_dirs=None, exclude=None, exclude_hidden=False,
+                 namespaces=None, ignore_errors=False, tracer=None):
+        self.fs = fs
+        self.workers = workers
+        self.max_depth = max_depth
+        self.exclude_dirs = list(exclude_dirs or [])
+        self.include_dirs = list(include_dirs or [])
+        self.exclude = list(exclude or [])
+        self.exclude_hidden = exclude_hidden
+        self.namespaces = namespaces
+        self.ignore_errors = ignore_errors
+        self.tracer = tracer
+
+    def _excluded(self, name, patterns):
+        if self.exclude_hidden and name.startswith('.'):
+            return True
+        return any(fnmatch(name, p) for p in patterns)
+
+    def _walked(self, name):
+        if any(fnmatch(name, p) for p in self.include_dirs):
+            return True
+        return not self._excluded(name, self.exclude_dirs)
+
+    @contextmanager
+    def _borrow(self):
+        if isinstance(self.fs, FilesystemPool):
+            with self.fs.borrow() as fs:
+                yield fs
+        else:
+            yield self.fs
+
+    def _scan(self, path, parent_span, level):
+        with activate(self.tracer, parent_span), priority(level), \
+                self._borrow() as fs:
+            dirs = []
+            files = []
+            for info in fs.scandir(path, namespaces=self.namespaces):
+                if info.is_dir:
+                    if self._walked(info.name):
+                        dirs.append(info)
+                elif not self._excluded(info.name, self.exclude):
+                    files.append(info)
+            return dirs, files
+
+    def walk(self, path='/'):
+        """
+        Yield a `(dirpath, dirs, files)` tuple of `Info` lists for each
+        directory
+        """
+        path = fspath.abspath(fspath.normpath(path))
+        parent_span = None if self.tracer is None else self.tracer.current
+        level = current_priority()
+        frontier = deque([(path, 0)])
+        running = {}
+        executor = ThreadPoolExecutor(
+            self.workers, thread_name_prefix='fs-walk')
+        try:
+            while frontier or running:
+                while frontier and len(running) < self.workers:
+                    dirpath, depth = frontier.popleft()
+                    future = executor.submit(
+                        self._scan, dirpath, parent_span, level)
+                    running[future] = (dirpath, depth)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dirpath, depth = running.pop(future)
+                    try:
+                        dirs, files = future.result()
+                    except FSError:
+                        if self.ignore_errors:
+                            continue
+                        raise
+                    if self.max_depth is None or depth < self.max_depth:
+                        frontier.extend(
+                            (fspath.join(dirpath, info.name), depth + 1)
+                            for info in dirs)
+                    yield dirpath, dirs, files
+        finally:
+            for future in running:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def files(self, path='/'):
+        """
+        Yield the path of each file
+        """
+        for dirpath, _, files in self.walk(path):
+            for info in files:
+                yield fspath.join(dirpath, info.name)
+
+    def dirs(self, path='/'):
+        """
+        Yield the path of each directory below `path`
+        """
+        for dirpath, dirs, _ in self.walk(path):
+            for info in dirs:
+                yield fspath.join(dirpath, info.name)
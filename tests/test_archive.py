@@ -0,0 +1,102 @@
+from fs import open_fs
+from fs.errors import (
+    DirectoryExpected,
+    FileExpected,
+    ResourceNotFound,
+    ResourceReadOnly,
+)
+import pytest
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.archive import IndexedArchiveFS
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+
+
+@pytest.fixture(params=['zip', 'tar'])
+def archive_url(request, tmp_path):
+    url = '{}://{}/test.{}'.format(request.param, tmp_path, request.param)
+    with open_fs(url, create=True) as fs:
+        fs.makedirs('/d/e')
+        fs.writetext('/d/e/a.txt', 'a' * 10)
+        fs.writetext('/d/b.txt', 'b' * 10)
+        fs.writetext('/c.txt', 'c' * 10)
+        fs.writetext('/n.ipynb', '{}')
+    return url
+
+
+def _indexed(url, cache_size=100):
+    archive = LatencyFS(open_fs(url, writeable=False))
+    fs = IndexedArchiveFS(archive, cache_size=cache_size)
+    archive.reset_calls()
+    return fs, archive
+
+
+def test_metadata_from_index(archive_url):
+    fs, archive = _indexed(archive_url)
+    assert len(fs) == 7
+    assert sorted(fs.listdir('/')) == ['c.txt', 'd', 'n.ipynb']
+    assert sorted(i.name for i in fs.scandir('/d', ['details'])) == [
+        'b.txt', 'e']
+    assert fs.getdetails('/d/e/a.txt').size == 10
+    assert fs.getinfo('d').is_dir
+    assert fs.isdir('/d/e')
+    assert fs.isfile('/c.txt')
+    assert fs.exists('/n.ipynb')
+    assert not fs.exists('/missing')
+    assert archive.total_calls == 0
+
+    with pytest.raises(ResourceNotFound):
+        fs.getinfo('/missing')
+    with pytest.raises(DirectoryExpected):
+        fs.listdir('/c.txt')
+    with pytest.raises(FileExpected):
+        fs.readbytes('/d')
+
+
+def test_read_cache(archive_url):
+    fs, archive = _indexed(archive_url, cache_size=25)
+    assert fs.readbytes('/c.txt') == b'c' * 10
+    with fs.openbin('/c.txt') as f:
+        assert f.read() == b'c' * 10
+    assert fs.readtext('/c.txt') == 'c' * 10
+    assert archive.calls['openbin'] == 1
+    assert (fs.hits, fs.misses) == (2, 1)
+
+    # Least recently used members are evicted
+    fs.readbytes('/d/b.txt')
+    fs.readbytes('/d/e/a.txt')
+    fs.readbytes('/c.txt')
+    assert archive.calls['openbin'] == 4
+
+
+def test_read_only(archive_url):
+    fs, _ = _indexed(archive_url)
+    with pytest.raises(ResourceReadOnly):
+        fs.openbin('/c.txt', 'w')
+    with pytest.raises(ResourceReadOnly):
+        fs.writetext('/new.txt', 'x')
+
+
+def test_manager(archive_url):
+    cm = FsContentsManager(
+        fs_url=archive_url, writeable=False, create=False,
+        closeonexit=False)
+    assert sorted(m['name'] for m in cm.get('d')['content']) == [
+        'b.txt', 'e']
+    assert cm.get('c.txt')['content'] == 'c' * 10
+    assert isinstance(cm.fs_handle.fs, IndexedArchiveFS)
+
+
+def test_disabled(archive_url):
+    cm = FsContentsManager(
+        fs_url=archive_url, writeable=False, create=False,
+        closeonexit=False, archive_index=False)
+    cm.fs
+    assert not isinstance(cm.fs_handle.fs, IndexedArchiveFS)
+
+
+def test_not_indexed_when_created(archive_url):
+    cm = FsContentsManager(
+        fs_url=archive_url, writeable=False, create=True, closeonexit=False)
+    cm.fs
+    assert not isinstance(cm.fs_handle.fs, IndexedArchiveFS)
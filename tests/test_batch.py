@@ -0,0 +1,87 @@
+from fs import open_fs
+from fs.errors import PermissionDenied
+from traitlets.config import Config
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+from jupyter_pyfilesystem.tracing import SpanExporter
+
+
+def _manager(**kwargs):
+    fs = LatencyFS(open_fs('mem://'))
+    cm = FsContentsManager(**kwargs)
+    cm.fs = fs
+    for d in ('a', 'b'):
+        cm.save({'type': 'directory'}, d)
+        for n in range(5):
+            cm.save({'type': 'file', 'format': 'text', 'content': d},
+                    '{}/{}.txt'.format(d, n))
+    cm.save({'type': 'notebook', 'content': {
+        'cells': [], 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 5,
+    }}, 'a/n.ipynb')
+    fs.reset_calls()
+    return cm, fs
+
+
+def test_get_many():
+    cm, fs = _manager()
+    paths = ['a/0.txt', 'a/1.txt', 'a/n.ipynb', 'b/0.txt', 'b/3.txt',
+             'a/missing', 'a', '', '../x', 'missing/x']
+    models = cm.get_many(paths)
+    for path, model in zip(paths[:5], models):
+        expected = cm.get(path, content=False)
+        assert model == expected
+    assert models[2]['type'] == 'notebook'
+    assert models[5] is None
+    assert models[6]['type'] == 'directory'
+    assert models[7]['path'] == ''
+    assert models[8] is None
+    assert models[9] is None
+
+
+def test_errors_per_path(monkeypatch):
+    cm, fs = _manager()
+
+    def scandir(path, *args, **kwargs):
+        if path == '/b':
+            raise PermissionDenied(path)
+        return iter([])
+
+    monkeypatch.setattr(fs, 'scandir', scandir)
+    models = cm.get_many(['a\0.txt', 'b/0.txt', 'b/1.txt', 'a/0.txt'])
+    assert 'error' in models[0]
+    assert 'error' in models[1]
+    assert 'error' in models[2]
+    assert models[3]['type'] == 'file'
+
+
+def test_one_scandir_per_directory():
+    cm, fs = _manager()
+    cm.get_many(['a/{}.txt'.format(n) for n in range(5)] +
+                ['b/{}.txt'.format(n) for n in range(5)])
+    assert fs.calls['scandir'] == 2
+    assert fs.calls['getdetails'] == 0
+    assert fs.calls['getinfo'] == 0
+
+
+class _Exporter(SpanExporter):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+def test_traced_across_threads():
+    c = Config()
+    c.FsContentsManager.tracing = True
+    c.FsContentsManager.trace_exporter_class = _Exporter
+    cm, fs = _manager(config=c)
+    cm.tracer.exporter.spans.clear()
+    cm.get_many(['a/0.txt', 'a/1.txt', 'b/0.txt', 'b/1.txt'])
+    roots = [s for s in cm.tracer.exporter.spans if s.parent_id is None]
+    assert [s.name for s in roots] == ['get_many']
+    names = [child.name for child in roots[0].children]
+    assert names.count('fs.scandir') == 2
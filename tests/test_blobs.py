@@ -0,0 +1,126 @@
+from fs import open_fs
+from nbformat.v4 import (
+    new_code_cell,
+    new_notebook,
+    new_output,
+)
+import pytest
+from tornado.web import HTTPError
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.blobs import (
+    BLOB_METADATA_KEY,
+    offload_outputs,
+    restore_outputs,
+)
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+from . import test_pyfilesystem
+from .utils import TEST_FS_URL
+
+
+class BlobManagerTestCase(test_pyfilesystem.FSManagerTestCase):
+
+    def setUp(self):
+        self.contents_manager = FsContentsManager(blob_threshold=1)
+        self.contents_manager.fs = open_fs(TEST_FS_URL)
+
+
+def _notebook(png='iVBORw0KGgo' * 100, text='small'):
+    nb = new_notebook()
+    nb.cells.append(new_code_cell('plot()', outputs=[
+        new_output('display_data', data={
+            'image/png': png,
+            'text/plain': text,
+            'application/json': {'a': [1, 2, 3]},
+        }),
+        new_output('stream', text='x' * 1000),
+    ], id='cell'))
+    return nb
+
+
+def test_offload_restore():
+    nb = _notebook()
+    original = _notebook()
+    blobs = offload_outputs(nb, 100)
+    assert len(blobs) == 1
+    data = nb.cells[0].outputs[0].data
+    assert data['image/png'] == ''
+    assert data['text/plain'] == 'small'
+    restore_outputs(nb, blobs.__getitem__)
+    assert nb == original
+    assert BLOB_METADATA_KEY not in nb.cells[0].outputs[0].metadata
+
+
+def test_offload_json():
+    nb = _notebook()
+    blobs = offload_outputs(nb, 1)
+    assert len(blobs) == 3
+    restore_outputs(nb, blobs.__getitem__)
+    assert nb == _notebook()
+
+
+def test_unchanged_outputs_not_rewritten():
+    fs = LatencyFS(open_fs('mem://'))
+    cm = FsContentsManager(blob_threshold=100)
+    cm.fs = fs
+    cm.save({'type': 'notebook', 'content': _notebook()}, 'a.ipynb')
+    assert fs.calls['exists'] == 1
+    assert len(fs.listdir('/.ipynb_blobs')) == 1
+    assert b'iVBORw0KGgo' not in fs.readbytes('a.ipynb')
+
+    nb = _notebook()
+    nb.cells[0].source = 'plot(1)'
+    fs.reset_calls()
+    cm.save({'type': 'notebook', 'content': nb}, 'a.ipynb')
+    assert fs.calls['exists'] == 0
+
+    # Identical outputs in another notebook share the blob
+    cm2 = FsContentsManager(blob_threshold=100)
+    cm2.fs = fs
+    fs.reset_calls()
+    cm2.save({'type': 'notebook', 'content': _notebook()}, 'b.ipynb')
+    assert fs.calls['exists'] == 1
+    assert len(fs.listdir('/.ipynb_blobs')) == 1
+
+    got = cm2.get('a.ipynb')['content']
+    assert got.cells[0].source == 'plot(1)'
+    assert got.cells[0].outputs[0].data['image/png'] == (
+        'iVBORw0KGgo' * 100)
+
+
+def test_removed_blobs_rewritten():
+    cm = FsContentsManager(blob_threshold=100)
+    cm.fs = open_fs('mem://')
+    cm.save({'type': 'notebook', 'content': _notebook()}, 'a.ipynb')
+    cm.fs.removetree('/.ipynb_blobs')
+    with pytest.raises(HTTPError) as e:
+        cm.get('a.ipynb')
+    assert e.value.status_code == 404
+    cm.save({'type': 'notebook', 'content': _notebook()}, 'a.ipynb')
+    assert cm.get('a.ipynb')['content'].cells[0].outputs == (
+        _notebook().cells[0].outputs)
+
+
+def test_known_blobs_bounded():
+    cm = FsContentsManager(blob_threshold=100, known_blob_cache_size=1)
+    cm.fs = open_fs('mem://')
+    cm.save({'type': 'notebook', 'content': _notebook(png='x' * 200)},
+            'a.ipynb')
+    cm.save({'type': 'notebook', 'content': _notebook(png='y' * 200)},
+            'b.ipynb')
+    assert len(cm._known_blobs) == 1
+
+
+def test_rename_and_checkpoint():
+    cm = FsContentsManager(blob_threshold=100)
+    cm.fs = open_fs('mem://')
+    cm.save({'type': 'directory'}, 'd')
+    cm.save({'type': 'notebook', 'content': _notebook()}, 'a.ipynb')
+    cp = cm.create_checkpoint('a.ipynb')
+    cm.rename('a.ipynb', 'd/b.ipynb')
+    outputs = _notebook().cells[0].outputs
+    assert cm.get('d/b.ipynb')['content'].cells[0].outputs == outputs
+    cm.save({'type': 'notebook', 'content': _notebook(png='x' * 200)},
+            'd/b.ipynb')
+    cm.restore_checkpoint(cp['id'], 'd/b.ipynb')
+    assert cm.get('d/b.ipynb')['content'].cells[0].outputs == outputs
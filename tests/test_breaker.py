@@ -0,0 +1,151 @@
+from fs import open_fs
+from fs.errors import (
+    OperationTimeout,
+    ResourceNotFound,
+)
+import pytest
+
+import unittest
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.breaker import (
+    CircuitBreaker,
+    CircuitOpen,
+    CLOSED,
+    GuardedFS,
+    HALF_OPEN,
+    OPEN,
+)
+from jupyter_pyfilesystem.contents import FilesystemHandle
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+from . import test_pyfilesystem
+from .utils import (
+    assertRaisesHTTPError,
+    TEST_FS_URL,
+)
+
+
+class GuardedManagerTestCase(test_pyfilesystem.FSManagerTestCase):
+
+    def setUp(self):
+        self.contents_manager = FsContentsManager()
+        self.contents_manager.fs = GuardedFS(
+            open_fs(TEST_FS_URL), timeout=10, breaker=CircuitBreaker(3, 30))
+
+
+class _Clock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def _guarded(threshold=2, timeout=0.05):
+    slow = LatencyFS(open_fs('mem://'))
+    slow.writetext('/a.txt', 'a')
+    clock = _Clock()
+    breaker = CircuitBreaker(threshold, 10, 'slow', clock=clock)
+    return GuardedFS(slow, timeout=timeout, breaker=breaker), slow, clock
+
+
+def test_timeout():
+    fs, slow, _ = _guarded(threshold=10)
+    assert fs.readtext('/a.txt') == 'a'
+    slow.latency = 0.5
+    with pytest.raises(OperationTimeout):
+        fs.getinfo('/a.txt')
+    with pytest.raises(OperationTimeout):
+        fs.openbin('/a.txt')
+    assert fs.breaker.state == CLOSED
+    assert fs.breaker.failures == 2
+
+
+def test_bulk_operations_not_timed_out():
+    fs, slow, _ = _guarded(threshold=1)
+    fs.makedirs('/d/e')
+    for n in range(5):
+        fs.writetext('/d/e/{}.txt'.format(n), 'x')
+    slow.latency = 0.1
+    fs.movedir('/d', '/f', create=True)
+    fs.removetree('/f')
+    slow.latency = 0
+    assert not fs.exists('/f')
+    assert fs.breaker.state == CLOSED
+
+
+def test_open_and_probe():
+    fs, slow, clock = _guarded()
+    slow.latency = 0.5
+    for n in range(2):
+        with pytest.raises(OperationTimeout):
+            fs.exists('/a.txt')
+    assert fs.breaker.state == OPEN
+    slow.reset_calls()
+    with pytest.raises(CircuitOpen):
+        fs.exists('/a.txt')
+    assert slow.total_calls == 0
+
+    # A failed probe opens the circuit again
+    clock.now = 10
+    with pytest.raises(OperationTimeout):
+        fs.exists('/a.txt')
+    assert fs.breaker.state == OPEN
+    with pytest.raises(CircuitOpen):
+        fs.exists('/a.txt')
+
+    clock.now = 20
+    slow.latency = 0
+    assert fs.exists('/a.txt')
+    assert fs.breaker.state == CLOSED
+    assert fs.breaker.metrics() == {
+        'name': 'slow', 'state': CLOSED, 'failures': 0, 'times_opened': 2}
+
+
+def test_one_probe_at_a_time():
+    breaker = CircuitBreaker(1, 10, clock=_Clock())
+    breaker.record_failure()
+    breaker._clock.now = 10
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+
+def test_path_errors_are_not_failures():
+    fs, _, _ = _guarded(threshold=1)
+    with pytest.raises(ResourceNotFound):
+        fs.getinfo('/missing')
+    assert fs.breaker.state == CLOSED
+
+
+class HttpErrorTestCase(unittest.TestCase):
+
+    def test_http_errors(self):
+        fs, slow, clock = _guarded()
+        cm = FsContentsManager()
+        cm.fs = fs
+        slow.latency = 0.5
+        with assertRaisesHTTPError(self, 504):
+            cm.get('a.txt', type='file')
+        with assertRaisesHTTPError(self, 504):
+            cm.get('a.txt', type='file')
+        with assertRaisesHTTPError(self, 503):
+            cm.get('a.txt', type='file')
+
+
+def test_handle_options():
+    handle = FilesystemHandle(
+        'mem://', create=True, writeable=True, closeonexit=False,
+        keepalive=0, timeout=5, failure_threshold=3, reset_timeout=60)
+    assert isinstance(handle.fs, GuardedFS)
+    assert handle.breaker.failure_threshold == 3
+    assert handle.breaker.reset_timeout == 60
+    handle.close()
+
+    cm = FsContentsManager(
+        fs_url='mem://', closeonexit=False, circuit_failure_threshold=2)
+    cm.save({'type': 'file', 'format': 'text', 'content': 'a'}, 'a.txt')
+    assert cm.circuit_metrics() == [{
+        'name': 'mem://', 'state': CLOSED, 'failures': 0, 'times_opened': 0}]
@@ -0,0 +1,204 @@
+from fs import open_fs
+import pytest
+from tornado.web import HTTPError
+
+from concurrent.futures import ThreadPoolExecutor
+import io
+import tarfile
+import threading
+import zipfile
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.bulk import (
+    member_path,
+    Pipeline,
+)
+
+
+@pytest.mark.parametrize('name,path', [
+    ('a.txt', '/d/a.txt'),
+    ('/a/b.txt', '/d/a/b.txt'),
+    ('a/../b/', '/d/b'),
+    ('a\\b.txt', '/d/a/b.txt'),
+])
+def test_member_path(name, path):
+    assert member_path('/d', name) == path
+
+
+@pytest.mark.parametrize('name', ['../a.txt', 'a/../../b', '.', ''])
+def test_invalid_member_path(name):
+    with pytest.raises(ValueError):
+        member_path('/d', name)
+
+
+def test_pipeline():
+    executor = ThreadPoolExecutor(4)
+    running = []
+    lock = threading.Lock()
+
+    def work(n):
+        with lock:
+            running.append(n)
+        return n
+
+    pipeline = Pipeline(executor, 2, max_bytes=10)
+    for n in range(10):
+        pipeline.submit(3, work, n)
+        assert len(pipeline._pending) <= 2
+    assert pipeline.wait() == list(range(10))
+    assert sorted(running) == list(range(10))
+
+    results = []
+    pipeline = Pipeline(executor, 3, callback=results.append)
+    for n in range(5):
+        pipeline.submit(0, work, n)
+    assert pipeline.wait() == []
+    assert results == list(range(5))
+
+
+def test_pipeline_error():
+    def fail():
+        raise OSError('failed')
+
+    pipeline = Pipeline(ThreadPoolExecutor(1), 2)
+    pipeline.submit(0, fail)
+    with pytest.raises(OSError):
+        pipeline.wait()
+
+
+def _tar(files, mode='w'):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode=mode) as tf:
+        for name, data in files:
+            tinfo = tarfile.TarInfo(name)
+            if data is None:
+                tinfo.type = tarfile.DIRTYPE
+                tf.addfile(tinfo)
+            else:
+                tinfo.size = len(data)
+                tf.addfile(tinfo, io.BytesIO(data))
+    buf.seek(0)
+    return buf
+
+
+def _zip(files):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as zf:
+        for name, data in files:
+            zf.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+
+@pytest.fixture
+def cm():
+    cm = FsContentsManager(batch_concurrency=2)
+    cm.fs = open_fs('mem://')
+    return cm
+
+
+@pytest.mark.parametrize('archive', [
+    lambda files: _tar(files),
+    lambda files: _tar(files, 'w:gz'),
+    _zip,
+])
+def test_upload_archive(cm, archive):
+    kind = 'zip' if archive is _zip else 'tar'
+    files = [('a/b{}.txt'.format(n), str(n).encode()) for n in range(20)]
+    models = cm.upload_archive('up', archive(files + [('c.txt', b'c')]), kind)
+    assert [m['path'] for m in models] == [
+        'up/a/b{}.txt'.format(n) for n in range(20)] + ['up/c.txt']
+    assert models[0]['type'] == 'file'
+    assert cm.fs.readbytes('up/a/b7.txt') == b'7'
+    assert cm.fs.readbytes('up/c.txt') == b'c'
+
+
+def test_upload_directories_and_duplicates(cm):
+    cm.fs.makedirs('up')
+    cm.fs.writetext('up/a.txt', 'old')
+    models = cm.upload_archive('up', _tar([
+        ('e', None), ('a.txt', b'1'), ('a.txt', b'2')]), 'tar')
+    assert [(m['path'], m['type']) for m in models] == [
+        ('up/e', 'directory'), ('up/a.txt', 'file')]
+    assert cm.fs.readtext('up/a.txt') == '2'
+
+
+def test_upload_hidden_skipped(cm):
+    archive = [('.hidden.txt', b'h'), ('d/.ipynb_checkpoints/a.txt', b'c'),
+               ('d/a.txt', b'a')]
+    models = cm.upload_archive('up', _tar(archive), 'tar')
+    assert [m['path'] for m in models] == ['up/d/a.txt']
+    assert not cm.fs.exists('up/.hidden.txt')
+    assert not cm.fs.exists('up/d/.ipynb_checkpoints')
+
+    cm.allow_hidden = True
+    models = cm.upload_archive('up', _tar(archive), 'tar')
+    assert len(models) == 3
+    assert cm.fs.readbytes('up/.hidden.txt') == b'h'
+
+
+def test_upload_invalid(cm):
+    with pytest.raises(HTTPError) as e:
+        cm.upload_archive('', _tar([('../x.txt', b'x')]), 'tar')
+    assert e.value.status_code == 400
+    assert not cm.fs.exists('/x.txt')
+    with pytest.raises(HTTPError) as e:
+        cm.upload_archive('', io.BytesIO(b'not an archive'), 'zip')
+    assert e.value.status_code == 400
+    with pytest.raises(HTTPError) as e:
+        cm.upload_archive('', _tar([]), 'rar')
+    assert e.value.status_code == 400
+
+
+@pytest.mark.parametrize('kind', ['tar', 'zip'])
+def test_download_archive(cm, kind):
+    cm.fs.makedirs('d/e')
+    cm.fs.makedirs('d/.hidden')
+    cm.fs.writetext('d/.hidden/x.txt', 'x')
+    cm.fs.writetext('d/e/small.txt', 's')
+    cm.fs.writebytes('d/large.bin', b'l' * 1000)
+    cm.create_checkpoint('d/e/small.txt')
+    cm.download_chunk_size = 100
+
+    class Unseekable(object):
+        def __init__(self):
+            self.data = bytearray()
+
+        def write(self, b):
+            self.data += b
+            return len(b)
+
+        def flush(self):
+            pass
+
+    out = Unseekable()
+    assert cm.download_archive('d', out, kind) == 2
+    buf = io.BytesIO(bytes(out.data))
+    if kind == 'tar':
+        with tarfile.open(fileobj=buf) as tf:
+            names = tf.getnames()
+            assert tf.extractfile('d/large.bin').read() == b'l' * 1000
+            assert tf.extractfile('d/e/small.txt').read() == b's'
+    else:
+        with zipfile.ZipFile(buf) as zf:
+            names = [n.rstrip('/') for n in zf.namelist()]
+            assert zf.read('d/large.bin') == b'l' * 1000
+            assert zf.read('d/e/small.txt') == b's'
+    assert sorted(names) == ['d/e', 'd/e/small.txt', 'd/large.bin']
+
+
+def test_download_zip_before_1980(cm):
+    cm.fs.makedirs('d')
+    cm.fs.writetext('d/a.txt', 'a')
+    cm.fs.setinfo('d/a.txt', {'details': {'modified': 365 * 86400}})
+    buf = io.BytesIO()
+    cm.download_archive('d', buf, 'zip')
+    with zipfile.ZipFile(buf) as zf:
+        assert zf.getinfo('d/a.txt').date_time == (1980, 1, 1, 0, 0, 0)
+
+
+def test_download_not_a_directory(cm):
+    cm.fs.writetext('a.txt', 'a')
+    with pytest.raises(HTTPError) as e:
+        cm.download_archive('a.txt', io.BytesIO())
+    assert e.value.status_code == 404
@@ -0,0 +1,113 @@
+from fs import open_fs
+import pytest
+
+from datetime import (
+    datetime,
+    timedelta,
+    timezone,
+)
+import time
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.checkpointgc import (
+    checkpoint_pattern,
+    CheckpointCollector,
+)
+
+
+@pytest.mark.parametrize('name,source', [
+    ('a-checkpoint.ipynb', 'a.ipynb'),
+    ('a.b-checkpoint0.ipynb', 'a.b.ipynb'),
+    ('a.tar-checkpoint.gz', 'a.tar.gz'),
+    ('Makefile-checkpoint', 'Makefile'),
+    ('.hidden-checkpoint.txt', '.hidden.txt'),
+    ('a-b-checkpoint.txt', 'a-b.txt'),
+])
+def test_checkpoint_pattern(name, source):
+    m = checkpoint_pattern('{basename}-checkpoint{id}{ext}').match(name)
+    assert m.group('basename') + m.group('ext') == source
+
+
+def test_not_a_checkpoint():
+    pattern = checkpoint_pattern('{basename}-checkpoint{id}{ext}')
+    assert pattern.match('notes.txt') is None
+
+
+def _manager():
+    cm = FsContentsManager(checkpoint_gc_rate=0)
+    cm.fs = open_fs('mem://')
+    cm.fs.makedirs('d')
+    cm.fs.makedirs('.hidden')
+    for path in ['a.ipynb', 'd/b.txt', 'd/.c.txt', '.hidden/e.txt']:
+        if path.endswith('.ipynb'):
+            cm.new(path=path)
+        else:
+            cm.fs.writetext(path, 'x')
+        cm.create_checkpoint(path)
+    return cm
+
+
+def test_collect_orphans():
+    cm = _manager()
+    cm.fs.remove('a.ipynb')
+    cm.fs.remove('d/b.txt')
+    cm.fs.remove('.hidden/e.txt')
+    cm.fs.writetext('d/.ipynb_checkpoints/notes.txt', 'not a checkpoint')
+    assert sorted(cm.collect_checkpoints()) == [
+        '/.ipynb_checkpoints',
+        '/.ipynb_checkpoints/a-checkpoint0.ipynb',
+        '/d/.ipynb_checkpoints/b-checkpoint0.txt',
+    ]
+    # Checkpoints in hidden directories are skipped
+    assert cm.fs.listdir('.hidden/.ipynb_checkpoints') == ['e-checkpoint0.txt']
+    assert sorted(cm.fs.listdir('d/.ipynb_checkpoints')) == [
+        '.c-checkpoint0.txt', 'notes.txt']
+    assert cm.collect_checkpoints() == []
+
+
+def test_collect_old():
+    cm = _manager()
+    assert cm.collect_checkpoints() == []
+    cm.checkpoint_max_age = 60
+    cm.fs.settimes('d/.ipynb_checkpoints/b-checkpoint0.txt',
+                   modified=datetime.now(timezone.utc) - timedelta(minutes=2))
+    assert cm.collect_checkpoints() == [
+        '/d/.ipynb_checkpoints/b-checkpoint0.txt']
+    assert cm.list_checkpoints('d/b.txt') == []
+    assert len(cm.list_checkpoints('d/.c.txt')) == 1
+
+
+def test_background_collector():
+    cm = FsContentsManager()
+    cm.fs = open_fs('mem://')
+    cm.fs.writetext('a.txt', 'x')
+    cm.create_checkpoint('a.txt')
+    cm.fs.remove('a.txt')
+    collector = CheckpointCollector(cm, interval=0.01)
+    collector.start()
+    try:
+        deadline = time.monotonic() + 5
+        while cm.fs.exists('.ipynb_checkpoints'):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        collector.stop()
+
+
+def test_changed_after_found_not_removed():
+    cm = _manager()
+    cm.fs.remove('a.ipynb')
+    cm.fs.remove('d/b.txt')
+    collector = CheckpointCollector(cm)
+    expired, empty = collector.find()
+    assert sorted(p for (p, _, _) in expired) == [
+        '/.ipynb_checkpoints/a-checkpoint0.ipynb',
+        '/d/.ipynb_checkpoints/b-checkpoint0.txt']
+    # The notebook is created again and the file's checkpoint replaced
+    cm.new(path='a.ipynb')
+    cm.fs.settimes('d/.ipynb_checkpoints/b-checkpoint0.txt',
+                   modified=datetime.now(timezone.utc) + timedelta(minutes=1))
+    collector.find = lambda: (expired, empty)
+    assert collector.collect() == []
+    assert cm.fs.exists('.ipynb_checkpoints/a-checkpoint0.ipynb')
+    assert cm.fs.exists('d/.ipynb_checkpoints/b-checkpoint0.txt')
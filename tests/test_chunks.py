@@ -0,0 +1,127 @@
+from fs import open_fs
+import nbformat
+from nbformat.v4 import (
+    new_code_cell,
+    new_markdown_cell,
+    new_notebook,
+)
+import pytest
+from tornado.web import HTTPError
+
+import json
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.chunks import (
+    CELLS_METADATA_KEY,
+    join_cells,
+    RecordCache,
+    split_cells,
+)
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+from . import test_pyfilesystem
+from .utils import TEST_FS_URL
+
+
+class ChunkedManagerTestCase(test_pyfilesystem.FSManagerTestCase):
+
+    def setUp(self):
+        self.contents_manager = FsContentsManager(
+            chunked_notebooks=True, blob_threshold=1)
+        self.contents_manager.fs = open_fs(TEST_FS_URL)
+
+
+def _notebook(ncells):
+    nb = new_notebook()
+    for n in range(ncells):
+        nb.cells.append(new_code_cell('x = {}'.format(n), id=str(n)))
+    nb.cells.append(new_markdown_cell('# Title', id='md'))
+    return nb
+
+
+def test_split_join():
+    nb = _notebook(3)
+    records = split_cells(nb)
+    assert len(records) == 4
+    assert nb.cells == []
+    assert nb.metadata[CELLS_METADATA_KEY] == list(records)
+    assert join_cells(nb, records.__getitem__)
+    assert nb == _notebook(3)
+    assert not join_cells(_notebook(1), records.__getitem__)
+
+
+def test_only_changed_cells_written():
+    fs = LatencyFS(open_fs('mem://'))
+    cm = FsContentsManager(chunked_notebooks=True)
+    cm.fs = fs
+    cm.save({'type': 'notebook', 'content': _notebook(100)}, 'a.ipynb')
+    assert fs.calls['exists'] == 101
+    assert len(fs.readbytes('a.ipynb')) < 10000
+
+    nb = _notebook(100)
+    nb.cells[50].source = 'y = 1'
+    fs.reset_calls()
+    cm.save({'type': 'notebook', 'content': nb}, 'a.ipynb')
+    # Only the new record is checked and written
+    assert fs.calls['exists'] == 1
+
+    # Another manager reads the records then only writes changes
+    cm2 = FsContentsManager(chunked_notebooks=True)
+    cm2.fs = fs
+    got = cm2.get('a.ipynb')['content']
+    assert got.cells[50].source == 'y = 1'
+    assert len(got.cells) == 101
+    nb.cells[0].source = 'z = 1'
+    fs.reset_calls()
+    cm2.save({'type': 'notebook', 'content': nb}, 'a.ipynb')
+    assert fs.calls['exists'] == 1
+    fs.reset_calls()
+    assert cm2.get('a.ipynb')['content'].cells[0].source == 'z = 1'
+    assert fs.calls['openbin'] == 1
+
+
+def test_export():
+    cm = FsContentsManager(chunked_notebooks=True)
+    cm.fs = open_fs('mem://')
+    cm.save({'type': 'notebook', 'content': _notebook(3)}, 'a.ipynb')
+    cm.export_notebook('a.ipynb', 'plain.ipynb')
+    nb = nbformat.reads(cm.fs.readtext('plain.ipynb'), as_version=4)
+    assert nb == _notebook(3)
+    assert cm.get('plain.ipynb')['content'].cells[0].metadata['trusted']
+
+
+def test_export_not_a_notebook():
+    cm = FsContentsManager(chunked_notebooks=True)
+    cm.fs = open_fs('mem://')
+    cm.fs.writetext('a.txt', '{}')
+    with pytest.raises(HTTPError) as e:
+        cm.export_notebook('a.txt', 'plain.ipynb')
+    assert e.value.status_code == 400
+    assert not cm.fs.exists('plain.ipynb')
+
+
+def test_record_cache():
+    cache = RecordCache(max_bytes=10)
+    cache.add('a', b'aaaa')
+    cache.add('b', b'bbbb')
+    assert cache.get('a') == b'aaaa'
+    cache.add('c', b'cccc')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'aaaa'
+    cache.add('d', b'd' * 11)
+    assert cache.get('d') is None
+    assert len(cache) == 2
+
+
+def test_corrupt_record():
+    cm = FsContentsManager(chunked_notebooks=True)
+    cm.fs = open_fs('mem://')
+    cm.save({'type': 'notebook', 'content': _notebook(3)}, 'a.ipynb')
+    digest = json.loads(
+        cm.fs.readtext('a.ipynb'))['metadata'][CELLS_METADATA_KEY][0]
+    cm.fs.writebytes(cm._blob_path(digest), b'{"cell_type": "markdown"}')
+
+    cm2 = FsContentsManager(chunked_notebooks=True)
+    cm2.fs = cm.fs
+    with pytest.raises(HTTPError) as e:
+        cm2.get('a.ipynb')
+    assert e.value.status_code == 500
@@ -0,0 +1,64 @@
+from fs import open_fs
+import json
+import sys
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.entries import (
+    DirectoryEntry,
+    DirectoryListing,
+)
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+
+
+def _manager():
+    fs = LatencyFS(open_fs('mem://'))
+    cm = FsContentsManager()
+    cm.fs = fs
+    cm.save({'type': 'directory'}, 'd')
+    cm.save({'type': 'directory'}, 'd/sub')
+    cm.save({'type': 'file', 'format': 'text', 'content': 'x'}, 'd/a.txt')
+    cm.save({'type': 'notebook', 'content': {
+        'cells': [], 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 5,
+    }}, 'd/n.ipynb')
+    fs.reset_calls()
+    return cm, fs
+
+
+def test_listing_matches_models():
+    cm, fs = _manager()
+    listing = cm.list_directory('d')
+    assert len(listing) == 3
+    expected = sorted(
+        (cm.get(m['path'], content=False) for m in listing),
+        key=lambda m: m['name'])
+    assert sorted(listing, key=lambda m: m['name']) == expected
+    assert listing[0] == listing.models()[0]
+    assert len(listing[1:]) == 2
+
+
+def test_directory_calls():
+    cm, fs = _manager()
+    model = cm.get('d')
+    assert len(model['content']) == 3
+    assert fs.calls['scandir'] == 1
+    # guess_type and the directory itself, but nothing for each child
+    assert fs.total_calls == 3
+
+
+def test_iter_json():
+    cm, fs = _manager()
+    listing = cm.list_directory('d')
+    for batch_size in (1, 2, 1000):
+        data = json.loads(''.join(listing.iter_json(
+            default=str, batch_size=batch_size)))
+        assert [m['path'] for m in data] == [m['path'] for m in listing]
+    assert ''.join(DirectoryListing('/').iter_json()) == '[]'
+
+
+def test_compact():
+    entry = DirectoryEntry('a.txt', 'file', 1, 1.0, 2.0)
+    assert not hasattr(entry, '__dict__')
+    model = entry.to_model('/d')
+    assert sys.getsizeof(entry) < sys.getsizeof(model)
+    assert model['path'] == 'd/a.txt'
+    assert model['created'] < model['last_modified']
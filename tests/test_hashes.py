@@ -0,0 +1,107 @@
+from fs import open_fs
+from fs.info import Info
+
+import time
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.hashes import (
+    content_hash,
+    ContentHashes,
+)
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+
+
+def _manager():
+    fs = LatencyFS(open_fs('mem://'))
+    cm = FsContentsManager()
+    cm.fs = fs
+    return cm, fs
+
+
+def _text(content):
+    return {'type': 'file', 'format': 'text', 'content': content}
+
+
+def test_hash_in_models():
+    cm, fs = _manager()
+    saved = cm.save(_text('abc'), 'a.txt')
+    assert saved['hash'] == content_hash(b'abc')
+    assert saved['hash_algorithm'] == 'sha256'
+    assert cm.get('a.txt', content=False)['hash'] == saved['hash']
+    listing = cm.get('', type='directory')['content']
+    assert [m['hash'] for m in listing] == [saved['hash']]
+
+    # Unknown until the file is read
+    fs.writebytes('b.txt', b'xyz')
+    assert cm.get('b.txt', content=False)['hash'] is None
+    assert cm.get('b.txt')['hash'] == content_hash(b'xyz')
+    assert cm.get('b.txt', content=False)['hash'] == content_hash(b'xyz')
+
+
+def test_known_hash():
+    cm, fs = _manager()
+    h = cm.save(_text('abc'), 'a.txt')['hash']
+    fs.reset_calls()
+    model = cm.get('a.txt', known_hash=h)
+    assert model['content'] is None
+    assert model['hash'] == h
+    assert fs.calls['openbin'] == 0
+
+    cm.save(_text('abcd'), 'a.txt')
+    model = cm.get('a.txt', known_hash=h)
+    assert model['content'] == 'abcd'
+    assert model['hash'] == content_hash(b'abcd')
+
+
+def test_known_hash_notebook():
+    cm, fs = _manager()
+    h = cm.new_untitled(type='notebook')
+    model = cm.get(h['path'])
+    assert model['hash']
+    unchanged = cm.get(h['path'], known_hash=model['hash'])
+    assert unchanged['content'] is None
+    assert unchanged['type'] == 'notebook'
+
+
+def test_invalidated():
+    cm, fs = _manager()
+    h = cm.save(_text('abc'), 'a.txt')['hash']
+    cm.delete('a.txt')
+    fs.writebytes('a.txt', b'xyz')
+    assert cm.get('a.txt', known_hash=h)['content'] == 'xyz'
+
+
+def _info(size, modified):
+    return Info({'basic': {'name': 'a', 'is_dir': False},
+                 'details': {'size': size, 'modified': modified}})
+
+
+def test_content_hashes():
+    hashes = ContentHashes(max_size=3)
+    old = time.time() - 60
+    for p in ('d/a', 'd/e/b', 'd/e/c', 'f'):
+        hashes.update(p, _info(1, old), p.encode())
+    # Least recently used is forgotten
+    assert hashes.get('d/a', _info(1, old)) is None
+    assert hashes.get('d/e/b', _info(1, old)) == content_hash(b'd/e/b')
+    assert hashes.get('d/e/b', _info(2, old)) is None
+    hashes.discard('d')
+    assert len(hashes) == 1
+    assert hashes._children == {'/': {'/f'}}
+    hashes.discard('f')
+    assert len(hashes) == 0
+    assert hashes._children == {}
+
+
+def test_recent_coarse_mtime_not_remembered():
+    hashes = ContentHashes()
+    now = time.time()
+    hashes.update('a', _info(1, float(int(now))), b'a')
+    assert hashes.get('a', _info(1, float(int(now)))) is None
+    hashes.update('a', _info(1, None), b'a')
+    assert hashes.get('a', _info(1, None)) is None
+    hashes.update('a', _info(1, int(now) - 10), b'a')
+    assert hashes.get('a', _info(1, int(now) - 10)) == content_hash(b'a')
+    # Sub-second times are precise enough
+    hashes.update('b', _info(1, now), b'b')
+    assert hashes.get('b', _info(1, now)) == content_hash(b'b')
@@ -0,0 +1,33 @@
+from fs import open_fs
+import time
+
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+
+
+def test_counts_calls():
+    fs = LatencyFS(open_fs('mem://'))
+    fs.writebytes('/a', b'abc')
+    fs.getdetails('/a')
+    fs.isfile('/a')
+    assert fs.calls['getdetails'] == 1
+    assert fs.calls['isfile'] == 1
+    fs.reset_calls()
+    assert fs.total_calls == 0
+
+
+def test_latency():
+    fs = LatencyFS(open_fs('mem://'), latency=0.02, jitter=0.01, seed=1)
+    start = time.perf_counter()
+    fs.isdir('/')
+    fs.isdir('/')
+    assert time.perf_counter() - start >= 0.04
+
+
+def test_bandwidth():
+    fs = LatencyFS(open_fs('mem://'), bandwidth=10000)
+    with fs.openbin('/a', 'w') as f:
+        f.write(b'x' * 500)
+    start = time.perf_counter()
+    with fs.openbin('/a') as f:
+        assert f.read() == b'x' * 500
+    assert time.perf_counter() - start >= 0.05
@@ -0,0 +1,117 @@
+from fs import open_fs
+from fs.errors import ResourceNotFound
+import pytest
+
+import shutil
+import tempfile
+import time
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+from jupyter_pyfilesystem.metacache import (
+    MetadataCacheFS,
+    MetadataStore,
+)
+from . import test_pyfilesystem
+
+
+class MetadataCacheManagerTestCase(test_pyfilesystem.FSManagerTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.contents_manager = FsContentsManager(
+            fs_url='mem://', metadata_cache=True,
+            metadata_cache_path='{}/metadata.db'.format(self.tmpdir),
+            metadata_cache_max_age=60, closeonexit=False)
+
+    def tearDown(self):
+        if self.contents_manager.fs_handle is not None:
+            self.contents_manager.fs_handle.close()
+        shutil.rmtree(self.tmpdir)
+
+
+def _wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def backend():
+    fs = open_fs('mem://')
+    fs.makedirs('/d/e')
+    fs.writetext('/d/a.txt', 'a')
+    return fs
+
+
+def _cached(backend, db_path, max_age=0):
+    latency = LatencyFS(backend)
+    fs = MetadataCacheFS(
+        latency, MetadataStore(db_path, 'mem://test'), max_age=max_age)
+    return fs, latency
+
+
+def test_restart(backend, tmp_path):
+    db_path = str(tmp_path / 'metadata.db')
+    fs, latency = _cached(backend, db_path)
+    assert sorted(fs.listdir('/d')) == ['a.txt', 'e']
+    assert latency.calls['scandir'] == 1
+    fs.close()
+
+    # Changed by another server
+    backend.writetext('/d/b.txt', 'b')
+
+    fs, latency = _cached(backend, db_path)
+    # Slow enough that the stored listing is used before it's refreshed
+    latency.latency = 0.5
+    assert sorted(fs.listdir('/d')) == ['a.txt', 'e']
+    assert fs.getdetails('/d/a.txt').size == 1
+    assert fs.isdir('/d/e')
+    # Refreshed in the background
+    _wait_until(lambda: '/d' in fs._validated)
+    assert latency.calls['scandir'] == 1
+    assert latency.calls['getinfo'] == 0
+    assert sorted(fs.listdir('/d')) == ['a.txt', 'b.txt', 'e']
+    fs.close()
+
+
+def test_max_age(backend, tmp_path):
+    fs, latency = _cached(backend, str(tmp_path / 'metadata.db'), 60)
+    fs.listdir('/d')
+    assert fs.getinfo('/d/a.txt').name == 'a.txt'
+    assert not fs.exists('/d/missing')
+    assert latency.total_calls == 1
+
+    fs.max_age = 0
+    fs.listdir('/d')
+    fs.getinfo('/d/a.txt')
+    assert latency.calls['scandir'] == 2
+    assert latency.calls['getinfo'] == 1
+    with pytest.raises(ResourceNotFound):
+        fs.getinfo('/d/missing')
+
+
+def test_changes_are_seen(backend, tmp_path):
+    fs, _ = _cached(backend, str(tmp_path / 'metadata.db'), 60)
+    fs.listdir('/d')
+    fs.listdir('/d/e')
+    fs.writetext('/d/b.txt', 'bb')
+    assert sorted(fs.listdir('/d')) == ['a.txt', 'b.txt', 'e']
+    with fs.openbin('/d/b.txt', 'w') as f:
+        f.write(b'bbb')
+    assert fs.getdetails('/d/b.txt').size == 3
+    fs.move('/d/b.txt', '/d/e/c.txt')
+    assert fs.listdir('/d/e') == ['c.txt']
+    fs.removetree('/d')
+    assert not fs.exists('/d/a.txt')
+    assert fs.listdir('/') == []
+
+
+def test_other_namespaces_not_cached(backend, tmp_path):
+    fs, latency = _cached(backend, str(tmp_path / 'metadata.db'), 60)
+    fs.listdir('/d')
+    fs.getinfo('/d/a.txt', ['access'])
+    list(fs.scandir('/d', ['access']))
+    assert latency.calls['scandir'] == 2
+    assert latency.calls['getinfo'] == 1
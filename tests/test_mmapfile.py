@@ -0,0 +1,68 @@
+from base64 import b64encode
+from fs import open_fs
+import pytest
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.hashes import content_hash
+from jupyter_pyfilesystem.mmapfile import map_file
+
+
+def test_map_local_file(tmp_path):
+    fs = open_fs(str(tmp_path))
+    fs.writebytes('a.bin', b'abcdef')
+    fs.writebytes('empty.bin', b'')
+    with fs.openbin('a.bin') as f, map_file(f, 6) as mapped:
+        assert mapped[:] == b'abcdef'
+    assert mapped.closed
+    with fs.openbin('a.bin') as f, map_file(f, 7) as mapped:
+        assert mapped is None
+    with fs.openbin('a.bin') as f, map_file(f, 0) as mapped:
+        assert mapped is None
+    # Empty files can't be mapped
+    with fs.openbin('empty.bin') as f, map_file(f) as mapped:
+        assert mapped is None
+
+
+def test_not_mapped_without_fileno():
+    fs = open_fs('mem://')
+    fs.writebytes('a.bin', b'abcdef')
+    with fs.openbin('a.bin') as f, map_file(f) as mapped:
+        assert mapped is None
+
+
+@pytest.mark.parametrize('threshold', [0, 1])
+def test_manager_reads(tmp_path, threshold):
+    cm = FsContentsManager(
+        fs_url='osfs://{}'.format(tmp_path), mmap_threshold=threshold,
+        closeonexit=False)
+    text = 'héllo\n' * 1000
+    binary = bytes(range(256)) * 100
+    (tmp_path / 'a.txt').write_text(text, encoding='utf8')
+    (tmp_path / 'b.bin').write_bytes(binary)
+
+    model = cm.get('a.txt')
+    assert (model['content'], model['format']) == (text, 'text')
+    assert model['hash'] == content_hash(text.encode('utf8'))
+    model = cm.get('b.bin')
+    assert model['format'] == 'base64'
+    assert model['content'] == b64encode(binary).decode('ascii')
+    assert cm.get('b.bin', format='base64')['content'] == model['content']
+
+
+def test_download_file(tmp_path):
+    cm = FsContentsManager(
+        fs_url='osfs://{}'.format(tmp_path), closeonexit=False,
+        download_chunk_size=4)
+    (tmp_path / 'a.bin').write_bytes(b'0123456789')
+
+    class Chunks(object):
+        def __init__(self):
+            self.chunks = []
+
+        def write(self, b):
+            self.chunks.append(b)
+            return len(b)
+
+    out = Chunks()
+    assert cm.download_file('a.bin', out) == 10
+    assert out.chunks == [b'0123', b'4567', b'89']
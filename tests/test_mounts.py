@@ -0,0 +1,156 @@
+from fs import open_fs
+from fs.wrap import WrapReadOnly
+from tornado.web import HTTPError
+from traitlets import TraitError
+from traitlets.config import Config
+import pytest
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.mounts import PrefixMountFS
+from jupyter_pyfilesystem.pool import PooledFS
+from . import test_pyfilesystem
+from .utils import TEST_FS_URL
+
+
+class MountManagerTestCase(test_pyfilesystem.FSManagerTestCase):
+
+    def setUp(self):
+        fs = PrefixMountFS()
+        fs.mount('/', open_fs(TEST_FS_URL))
+        fs.mount('/mnt', open_fs(TEST_FS_URL))
+        self.contents_manager = FsContentsManager()
+        self.contents_manager.fs = fs
+
+
+def _manager(mounts, **config):
+    c = Config()
+    c.FsContentsManager.mounts = mounts
+    c.FsContentsManager.closeonexit = False
+    for k, v in config.items():
+        setattr(c.FsContentsManager, k, v)
+    return FsContentsManager(config=c)
+
+
+def test_longest_prefix():
+    root = open_fs('mem://')
+    a = open_fs('mem://')
+    ab = open_fs('mem://')
+    fs = PrefixMountFS()
+    fs.mount('/', root)
+    fs.mount('/a', a)
+    fs.mount('/a/b', ab)
+    assert fs.delegate('/x') == (root, '/x')
+    assert fs.delegate('/a') == (a, '/')
+    assert fs.delegate('/a/bc') == (a, '/bc')
+    assert fs.delegate('/a/b/c/d') == (ab, '/c/d')
+    assert sorted(fs.listdir('/')) == ['a']
+    assert sorted(fs.listdir('/a')) == ['b']
+    assert fs.getinfo('/a/b').name == 'b'
+
+
+def test_nested_mount_under_root():
+    cm = _manager({'/a/b': 'mem://'}, fs_url='mem://')
+    cm.save({'type': 'file', 'format': 'text', 'content': 'x'}, 'a/b/f.txt')
+    assert [m['name'] for m in cm.get('')['content']] == ['a']
+    model = cm.get('a')
+    assert model['type'] == 'directory'
+    assert [m['name'] for m in model['content']] == ['b']
+    assert cm.dir_exists('a')
+    assert cm.get('a/b/f.txt')['content'] == 'x'
+    # Directories in the root filesystem are listed with the mounts
+    cm.save({'type': 'directory'}, 'a/c')
+    assert sorted(m['name'] for m in cm.get('a')['content']) == ['b', 'c']
+
+
+def test_nested_mount_under_read_only_root():
+    root = open_fs('mem://')
+    root.makedir('/d')
+    fs = PrefixMountFS()
+    fs.mount('/', WrapReadOnly(root))
+    fs.mount('/a/b', open_fs('mem://'))
+    assert sorted(fs.listdir('/')) == ['a', 'd']
+    assert fs.isdir('/a')
+    assert fs.getinfo('/a', ['details']).is_dir
+    assert fs.listdir('/a') == ['b']
+
+
+def test_mount_table_config():
+    cm = _manager({
+        '/scratch': 'mem://',
+        '/shared': {'fs_url': 'mem://', 'keepalive': 0},
+    }, fs_url='mem://')
+    assert isinstance(cm.fs, PrefixMountFS)
+    assert sorted(cm.fs_handles) == ['/', '/scratch', '/shared']
+    names = [m['name'] for m in cm.get('')['content']]
+    assert sorted(names) == ['scratch', 'shared']
+    assert cm.backend_name('/shared/a.txt') == 'mem://'
+
+
+def test_invalid_mount_options():
+    cm = _manager({'/scratch': {'fs_url': 'mem://', 'unknown': 1}})
+    with pytest.raises(TraitError):
+        cm.fs
+
+
+def test_pool_size(tmpdir):
+    cm = _manager({'/data': {
+        'fs_url': 'osfs://' + str(tmpdir), 'pool_size': 3}})
+    cm.fs
+    assert isinstance(cm.fs_handles['/data'].fs, PooledFS)
+    assert len(cm.fs_handles['/data'].pool) == 3
+    cm.save({'type': 'file', 'format': 'text', 'content': 'a'}, 'data/a.txt')
+    for n in range(3):
+        assert cm.get('data/a.txt')['content'] == 'a'
+
+
+def test_rename_across_mounts():
+    cm = _manager({'/a': 'mem://', '/b': 'mem://'})
+    cm.save({'type': 'file', 'format': 'text', 'content': 'x'}, 'a/f.txt')
+    cm.save({'type': 'directory'}, 'a/d')
+    cm.save({'type': 'file', 'format': 'text', 'content': 'y'}, 'a/d/g.txt')
+
+    cm.rename_file('a/f.txt', 'b/f.txt')
+    assert cm.get('b/f.txt')['content'] == 'x'
+    assert not cm.file_exists('a/f.txt')
+
+    cm.rename_file('a/d', 'b/d')
+    assert cm.get('b/d/g.txt')['content'] == 'y'
+    assert not cm.dir_exists('a/d')
+
+
+def test_unmounted_paths_read_only():
+    cm = _manager({'/a': 'mem://'})
+    with pytest.raises(HTTPError) as e:
+        cm.save({'type': 'file', 'format': 'text', 'content': 'x'},
+                'root.txt')
+    assert e.value.status_code == 409
+    assert [m['name'] for m in cm.get('')['content']] == ['a']
+    cm.save({'type': 'file', 'format': 'text', 'content': 'x'}, 'a/f.txt')
+
+    cm = _manager({'/a': 'mem://'}, blob_threshold=100)
+    with pytest.raises(TraitError):
+        cm.fs
+    cm = _manager({'/a': 'mem://'}, blob_threshold=100,
+                  blob_dir='/a/.ipynb_blobs')
+    cm.fs
+    assert sorted(cm.fs_handles) == ['/a']
+
+
+def test_mount_points_not_renamed_or_deleted():
+    cm = _manager({'/a': 'mem://', '/b': 'mem://'}, fs_url='mem://')
+    cm.save({'type': 'file', 'format': 'text', 'content': 'x'}, 'a/f.txt')
+    for call in (lambda: cm.rename_file('a', 'b/a'),
+                 lambda: cm.delete_file('a')):
+        with pytest.raises(HTTPError) as e:
+            call()
+        assert e.value.status_code == 409
+    assert cm.get('a/f.txt')['content'] == 'x'
+    assert not cm.file_exists('b/a')
+
+
+def test_delete_root_conflicts():
+    cm = FsContentsManager()
+    cm.fs = open_fs('mem://')
+    with pytest.raises(HTTPError) as e:
+        cm.delete_file('')
+    assert e.value.status_code == 409
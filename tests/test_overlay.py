@@ -0,0 +1,166 @@
+from fs import open_fs
+from fs.errors import (
+    DirectoryNotEmpty,
+    ResourceNotFound,
+)
+import pytest
+
+import shutil
+import tempfile
+import threading
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.overlay import (
+    OverlayFS,
+    WHITEOUTS_FILE,
+    write_archive,
+)
+from . import test_pyfilesystem
+
+
+class OverlayManagerTestCase(test_pyfilesystem.FSManagerTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.contents_manager = FsContentsManager(
+            fs_url='zip://{}/test.zip'.format(self.tmpdir),
+            overlay_url='mem://', closeonexit=False)
+
+    def tearDown(self):
+        if self.contents_manager.fs_handle is not None:
+            self.contents_manager.fs_handle.close()
+        shutil.rmtree(self.tmpdir)
+
+
+def _lower():
+    lower = open_fs('mem://')
+    lower.makedirs('/d/e')
+    lower.writetext('/d/e/a.txt', 'a')
+    lower.writetext('/d/b.txt', 'b')
+    lower.writetext('/c.txt', 'c')
+    return lower
+
+
+@pytest.fixture
+def overlay():
+    return OverlayFS(_lower(), open_fs('mem://'))
+
+
+def test_read_through(overlay):
+    assert sorted(overlay.listdir('/')) == ['c.txt', 'd']
+    assert overlay.readtext('/d/e/a.txt') == 'a'
+    assert overlay.isdir('/d/e')
+    assert not overlay.modified
+
+
+def test_copy_on_write(overlay):
+    overlay.writetext('/c.txt', 'new')
+    overlay.appendtext('/d/b.txt', '+')
+    overlay.writetext('/d/new.txt', 'n')
+    assert overlay.readtext('/c.txt') == 'new'
+    assert overlay.readtext('/d/b.txt') == 'b+'
+    assert sorted(overlay.listdir('/d')) == ['b.txt', 'e', 'new.txt']
+    assert overlay.lower.readtext('/c.txt') == 'c'
+    assert not overlay.lower.exists('/d/new.txt')
+    assert overlay.modified
+
+
+def test_whiteouts(overlay):
+    overlay.remove('/c.txt')
+    overlay.move('/d/b.txt', '/b.txt')
+    assert sorted(overlay.listdir('/')) == ['b.txt', 'd']
+    assert overlay.readtext('/b.txt') == 'b'
+    assert not overlay.exists('/c.txt')
+    assert not overlay.exists('/d/b.txt')
+    with pytest.raises(ResourceNotFound):
+        overlay.readtext('/c.txt')
+
+    overlay.writetext('/c.txt', 'again')
+    assert overlay.readtext('/c.txt') == 'again'
+
+    # Whiteouts are kept in the upper filesystem
+    reopened = OverlayFS(overlay.lower, overlay.upper)
+    assert sorted(reopened.listdir('/')) == ['b.txt', 'c.txt', 'd']
+    assert sorted(reopened.listdir('/d')) == ['e']
+    assert WHITEOUTS_FILE.lstrip('/') in overlay.upper.listdir('/')
+
+
+def test_remove_and_recreate_directory(overlay):
+    with pytest.raises(DirectoryNotEmpty):
+        overlay.removedir('/d/e')
+    overlay.removetree('/d')
+    assert overlay.listdir('/') == ['c.txt']
+    overlay.makedir('/d')
+    assert overlay.listdir('/d') == []
+    overlay.movedir('/d', '/f', create=True)
+    assert sorted(overlay.listdir('/')) == ['c.txt', 'f']
+
+
+@pytest.mark.parametrize('name,kind', [
+    ('a.zip', 'zip'), ('a.tar', 'tar'), ('a.tar.gz', 'tar')])
+def test_write_archive(tmp_path, name, kind):
+    path = str(tmp_path / name)
+    write_archive(_lower(), path, kind)
+    with open_fs('{}://{}'.format(kind, path)) as archive:
+        assert archive.readtext('/d/e/a.txt') == 'a'
+        assert sorted(archive.listdir('/d')) == ['b.txt', 'e']
+    with open(path, 'rb') as f:
+        assert (f.read(2) == b'\x1f\x8b') == name.endswith('.gz')
+
+
+def test_write_archive_before_1980(tmp_path):
+    lower = _lower()
+    lower.setinfo('/d/b.txt', {'details': {'modified': 365 * 86400}})
+    path = str(tmp_path / 'a.zip')
+    write_archive(lower, path, 'zip')
+    with open_fs('zip://' + path) as archive:
+        assert archive.getinfo(
+            '/d/b.txt', ['details']).modified.year == 1980
+
+
+@pytest.mark.parametrize('kind', ['zip', 'tar'])
+def test_compact(tmp_path, kind):
+    url = '{}://{}/test.{}'.format(kind, tmp_path, kind)
+    cm = FsContentsManager(
+        fs_url=url, overlay_url='osfs://{}/upper'.format(tmp_path),
+        closeonexit=False)
+    cm.save({'type': 'directory'}, 'd')
+    cm.save({'type': 'file', 'format': 'text', 'content': 'a'}, 'd/a.txt')
+    cm.save({'type': 'file', 'format': 'text', 'content': 'b'}, 'b.txt')
+    assert cm.compact_archives() == [url]
+    assert cm.compact_archives() == []
+    assert cm.fs_handle.overlay.upper.listdir('/') == []
+
+    cm.rename_file('d/a.txt', 'd/c.txt')
+    cm.delete_file('b.txt')
+    assert [m['name'] for m in cm.get('')['content']] == ['d']
+    assert cm.compact_archives() == [url]
+    with open_fs(url) as archive:
+        assert archive.listdir('/') == ['d']
+        assert archive.readtext('/d/c.txt') == 'a'
+    assert cm.get('d/c.txt')['content'] == 'a'
+    assert [m['name'] for m in cm.get('d')['content']] == ['c.txt']
+    cm.fs_handle.close()
+
+
+def test_compact_waits_for_writers(tmp_path):
+    url = 'zip://{}/test.zip'.format(tmp_path)
+    cm = FsContentsManager(fs_url=url, overlay_url='mem://',
+                           closeonexit=False)
+    cm.fs
+    overlay = cm.fs_handle.overlay
+    f = overlay.openbin('/a.txt', 'w')
+    f.write(b'a')
+    compacted = []
+    compacting = threading.Thread(
+        target=lambda: compacted.append(cm.compact_archives()))
+    compacting.start()
+    compacting.join(0.2)
+    assert compacting.is_alive()
+    f.write(b'b')
+    f.close()
+    compacting.join(5)
+    assert compacted == [[url]]
+    assert cm.get('a.txt')['content'] == 'ab'
+    with open_fs(url) as archive:
+        assert archive.readtext('/a.txt') == 'ab'
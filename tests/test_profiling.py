@@ -0,0 +1,73 @@
+from fs import open_fs
+from traitlets.config import Config
+import json
+import logging
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.profiling import SORT_KEYS
+from .utils import (
+    get_test_notebook,
+    TEST_FS_URL,
+)
+
+
+def _manager(**config):
+    c = Config()
+    for k, v in config.items():
+        setattr(c.FsContentsManager, k, v)
+    cm = FsContentsManager(config=c)
+    cm.fs = open_fs(TEST_FS_URL)
+    return cm
+
+
+def test_no_tracer_by_default():
+    cm = _manager()
+    assert cm.tracer is None
+    assert cm.profiler is None
+
+
+def test_slow_operation_log(caplog):
+    cm = _manager(slow_operation_threshold=1e-9)
+    caplog.set_level(logging.WARNING)
+    cm.save({'type': 'notebook', 'content': get_test_notebook('a')},
+            'a.ipynb')
+    cm.get('a.ipynb')
+
+    records = [json.loads(r.getMessage().split(': ', 1)[1])
+               for r in caplog.records
+               if r.getMessage().startswith('Slow operation')]
+    get = [r for r in records if r['operation'] == 'get'][-1]
+    assert get['path'] == 'a.ipynb'
+    assert get['backend'] == 'MemoryFS'
+    assert get['size'] > 0
+    assert get['io'] > 0
+    assert get['parse'] > 0
+    assert get['validate'] > 0
+    assert get['sign'] > 0
+    assert get['io'] + get['parse'] + get['validate'] + get['sign'] <= (
+        get['duration'])
+
+
+def test_profiler():
+    cm = _manager(allow_profiling=True)
+    cm.profiler.start(60)
+    cm.save({'type': 'file', 'format': 'text', 'content': 'a'}, 'a.txt')
+    cm.get('a.txt')
+    cm.profiler.stop()
+    cm.get('a.txt')
+    stats = cm.profiler.stats()
+    assert not stats['active']
+    assert stats['operations'] + stats['skipped'] == 2
+    if stats['operations']:
+        assert '_get_file' in stats['stats']
+
+
+def test_sort_keys():
+    cm = _manager(allow_profiling=True)
+    cm.profiler.start(60)
+    cm.save({'type': 'file', 'format': 'text', 'content': 'a'}, 'a.txt')
+    cm.profiler.stop()
+    assert 'cumulative' in SORT_KEYS
+    assert 'unknown' not in SORT_KEYS
+    for sort in SORT_KEYS:
+        cm.profiler.stats(sort=sort, limit=1)
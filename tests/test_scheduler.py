@@ -0,0 +1,181 @@
+from fs import open_fs
+from traitlets.config import Config
+
+import threading
+import time
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.scheduler import (
+    BACKGROUND,
+    LIST,
+    PriorityLimiter,
+    priority,
+    SAVE,
+    ScheduledFS,
+)
+from . import test_pyfilesystem
+from .utils import TEST_FS_URL
+
+
+class ScheduledManagerTestCase(test_pyfilesystem.FSManagerTestCase):
+
+    def setUp(self):
+        # A limit of one checks nested calls can't deadlock
+        self.contents_manager = FsContentsManager(user_concurrency=1)
+        self.contents_manager.fs = open_fs(TEST_FS_URL)
+
+
+def _wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_priority_order():
+    limiter = PriorityLimiter(1)
+    order = []
+
+    def wait(level):
+        with limiter.slot(level):
+            order.append(level)
+
+    token = limiter.acquire(SAVE)
+    threads = []
+    for level in (BACKGROUND, LIST, BACKGROUND, SAVE):
+        t = threading.Thread(target=wait, args=(level,))
+        t.start()
+        threads.append(t)
+        _wait_until(lambda: limiter.queue_depth == len(threads))
+
+    metrics = limiter.metrics()
+    assert metrics['active'] == 1
+    assert metrics['queue_depth'] == 4
+    assert metrics['queued'] == {
+        'save': 1, 'open': 0, 'list': 1, 'checkpoint': 0, 'background': 2}
+
+    limiter.release(token)
+    for t in threads:
+        t.join(5)
+    assert order == [SAVE, LIST, BACKGROUND, BACKGROUND]
+    metrics = limiter.metrics()
+    assert metrics['active'] == 0
+    assert metrics['queue_depth'] == 0
+    assert metrics['max_queue_depth'] == 4
+    assert metrics['waited']['background'] == 2
+    assert metrics['wait_seconds']['background'] > 0
+
+
+def test_reentrant():
+    limiter = PriorityLimiter(1)
+    with limiter.slot():
+        with limiter.slot():
+            assert limiter.active == 1
+    assert limiter.active == 0
+
+
+def test_open_file_holds_slot():
+    limiter = PriorityLimiter(1)
+    fs = ScheduledFS(open_fs('mem://'), limiter)
+    fs.writetext('/a.txt', 'a')
+    with fs.openbin('/a.txt') as f:
+        assert limiter.active == 1
+        assert fs.exists('/a.txt')
+        assert f.read() == b'a'
+    assert limiter.active == 0
+
+
+def test_release_from_other_thread():
+    limiter = PriorityLimiter(1)
+    fs = ScheduledFS(open_fs('mem://'), limiter)
+    f = fs.openbin('/a.txt', 'w')
+    t = threading.Thread(target=f.close)
+    t.start()
+    t.join(5)
+    assert limiter.active == 0
+    assert fs.exists('/a.txt')
+
+
+def test_outer_priority_wins():
+    limiter = PriorityLimiter(1)
+    fs = ScheduledFS(open_fs('mem://'), limiter)
+    with priority(LIST):
+        with priority(SAVE):
+            fs.exists('/')
+    fs.exists('/')
+    assert limiter.metrics()['acquired'] == {
+        'save': 0, 'open': 0, 'list': 1, 'checkpoint': 0, 'background': 1}
+
+
+def test_manager_priorities():
+    cm = FsContentsManager(user_concurrency=2)
+    cm.fs = open_fs('mem://')
+    cm.save({'type': 'file', 'format': 'text', 'content': 'a'}, 'a.txt')
+    cm.get('')
+    cm.get('a.txt')
+    cm.create_checkpoint('a.txt')
+    acquired = cm.user_limiter.metrics()['acquired']
+    assert acquired['save'] > 0
+    assert acquired['list'] > 0
+    assert acquired['open'] > 0
+    assert acquired['checkpoint'] > 0
+    assert acquired['background'] == 0
+
+
+def _shared_manager(subpath):
+    c = Config()
+    c.FsContentsManager.fs_url = 'mem://'
+    c.FsContentsManager.share_filesystem = True
+    c.FsContentsManager.closeonexit = False
+    c.FsContentsManager.backend_concurrency = 3
+    c.FsContentsManager.user_concurrency = 2
+    c.FsContentsManager.fs_subpath = subpath
+    return FsContentsManager(config=c)
+
+
+def test_backend_limiter_shared():
+    alice = _shared_manager('scheduler/alice')
+    bob = _shared_manager('scheduler/bob')
+    alice.save({'type': 'directory'}, 'd')
+    bob.save({'type': 'directory'}, 'd')
+    backend = alice.fs_handle.limiter
+    assert backend is bob.fs_handle.limiter
+    assert alice.user_limiter is not bob.user_limiter
+
+    metrics = alice.scheduler_metrics()
+    assert [m['name'] for m in metrics] == ['user:scheduler/alice', 'mem://']
+    assert metrics[0]['limit'] == 2
+    assert metrics[1]['limit'] == 3
+    assert metrics[0]['acquired']['save'] > 0
+    assert metrics[1]['acquired']['save'] > metrics[0]['acquired']['save']
+
+
+def test_download_does_not_hold_slot_while_sending():
+    cm = FsContentsManager(user_concurrency=1, download_chunk_size=2)
+    cm.fs = open_fs('mem://')
+    cm.fs.writebytes('a.bin', b'0123')
+    sending = threading.Event()
+    saved = threading.Event()
+
+    class SlowClient(object):
+        def __init__(self):
+            self.chunks = []
+
+        def write(self, b):
+            sending.set()
+            # A save must get the only slot while a chunk is being sent
+            assert saved.wait(5)
+            self.chunks.append(b)
+            return len(b)
+
+    def save():
+        sending.wait(5)
+        cm.save({'type': 'file', 'format': 'text', 'content': 'b'}, 'b.txt')
+        saved.set()
+
+    t = threading.Thread(target=save)
+    t.start()
+    out = SlowClient()
+    assert cm.download_file('a.bin', out) == 4
+    t.join(5)
+    assert out.chunks == [b'01', b'23']
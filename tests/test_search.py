@@ -0,0 +1,129 @@
+from fs import open_fs
+from fs.errors import DirectoryNotEmpty
+from nbformat.v4 import (
+    new_code_cell,
+    new_notebook,
+)
+import pytest
+from traitlets.config import Config
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+from jupyter_pyfilesystem.search import SearchIndex
+
+
+def _text(content):
+    return {'type': 'file', 'format': 'text', 'content': content}
+
+
+def _notebook(*sources):
+    return new_notebook(cells=[new_code_cell(s) for s in sources])
+
+
+def _manager(fs, **config):
+    c = Config()
+    c.FsContentsManager.search_index = True
+    c.FsContentsManager.search_crawl_interval = 0
+    for k, v in config.items():
+        setattr(c.FsContentsManager, k, v)
+    cm = FsContentsManager(config=c)
+    cm.fs = fs
+    return cm
+
+
+def _paths(results):
+    return sorted(r['path'] for r in results)
+
+
+def test_crawl():
+    fs = open_fs('mem://')
+    fs.makedirs('/projects/analysis')
+    fs.writetext('/projects/README.md', 'Quarterly revenue report')
+    fs.writetext('/projects/data.csv', 'revenue,1')
+    fs.makedirs('/.hidden')
+    fs.writetext('/.hidden/secret.md', 'revenue')
+    cm = _manager(fs)
+    cm.save({'type': 'notebook', 'content': _notebook(
+        '# Revenue forecast', 'import pandas')},
+        'projects/analysis/forecast.ipynb')
+    assert cm.crawler.crawled.wait(10)
+    search = cm.search
+    assert _paths(search.search('revenue')) == [
+        'projects/README.md', 'projects/analysis/forecast.ipynb']
+    assert _paths(search.search('analysis')) == [
+        'projects/analysis', 'projects/analysis/forecast.ipynb']
+    assert _paths(search.search('pand')) == [
+        'projects/analysis/forecast.ipynb']
+    assert _paths(search.search('data.csv')) == ['projects/data.csv']
+    assert search.search('') == []
+    assert search.search('"unbalanced AND (') == []
+
+    # Changes outside the server are found by the next crawl
+    fs.remove('/projects/README.md')
+    fs.writetext('/projects/notes.txt', 'revenue notes')
+    assert search.crawl(cm.walker(), cm.guess_type, cm.index_content)
+    assert _paths(search.search('revenue')) == [
+        'projects/analysis/forecast.ipynb', 'projects/notes.txt']
+
+
+def test_crawl_files_not_checked_for_directories():
+    fs = LatencyFS(open_fs('mem://'))
+    cm = _manager(fs)
+    assert cm.search is not None
+    assert cm.crawler.crawled.wait(10)
+    for n in range(5):
+        fs.writetext('/{}.txt'.format(n), 'text')
+    fs.reset_calls()
+    assert cm.search.crawl(cm.walker(), cm.guess_type, cm.index_content)
+    assert fs.calls['isdir'] == 0
+    assert _paths(cm.search.search('text')) == [
+        '{}.txt'.format(n) for n in range(5)]
+
+
+def test_incremental():
+    cm = _manager(open_fs('mem://'))
+    assert cm.search is not None
+    assert cm.crawler.crawled.wait(10)
+    cm.save({'type': 'directory'}, 'd')
+    cm.save(_text('hello world'), 'd/a.txt')
+    cm.save({'type': 'notebook', 'content': _notebook('print(1)')},
+            'd/n.ipynb')
+    search = cm.search
+    assert _paths(search.search('hello')) == ['d/a.txt']
+    result = search.search('print')[0]
+    assert result['type'] == 'notebook'
+    assert result['last_modified'] == cm.get('d/n.ipynb')['last_modified']
+    assert 'print(1)' in result['snippet']
+
+    cm.save(_text('goodbye'), 'd/a.txt')
+    assert search.search('hello') == []
+    cm.rename('d', 'e')
+    assert _paths(search.search('goodbye')) == ['e/a.txt']
+    cm.rename('e/a.txt', 'e/b.txt')
+    assert _paths(search.search('goodbye')) == ['e/b.txt']
+    cm.delete('e/n.ipynb')
+    assert search.search('print') == []
+    # Deleting a directory that isn't empty fails and leaves it indexed
+    with pytest.raises(DirectoryNotEmpty):
+        cm.delete_file('e')
+    assert _paths(search.search('goodbye')) == ['e/b.txt']
+    cm.delete('e/b.txt')
+    cm.delete('e')
+    assert len(search) == 0
+
+
+def test_persistent(tmp_path):
+    db_path = str(tmp_path / 'index.db')
+    index = SearchIndex(db_path=db_path)
+    index.add('a.md', 'file', 3, 1.0, 'persistent text')
+    index.close()
+    index = SearchIndex(db_path=db_path)
+    assert _paths(index.search('persistent')) == ['a.md']
+
+
+def test_disabled():
+    cm = FsContentsManager()
+    cm.fs = open_fs('mem://')
+    cm.save(_text('hello'), 'a.txt')
+    assert cm.search is None
+    assert cm.crawler is None
@@ -0,0 +1,43 @@
+from traitlets.config import Config
+
+from jupyter_pyfilesystem import FsContentsManager
+from .utils import assertRaisesHTTPError
+
+import unittest
+
+
+def _manager(subpath):
+    c = Config()
+    c.FsContentsManager.fs_url = 'mem://'
+    c.FsContentsManager.share_filesystem = True
+    c.FsContentsManager.closeonexit = False
+    c.FsContentsManager.fs_subpath = subpath
+    return FsContentsManager(config=c)
+
+
+class SharedFilesystemTestCase(unittest.TestCase):
+
+    def test_shared_connection(self):
+        alice = _manager('users/alice')
+        bob = _manager('users/bob')
+        alice.save({'type': 'file', 'format': 'text', 'content': 'a'},
+                   'a.txt')
+        bob.save({'type': 'file', 'format': 'text', 'content': 'b'},
+                 'b.txt')
+
+        assert alice.fs_handle is bob.fs_handle
+        root = alice.fs_handle.fs
+        assert sorted(root.listdir('users')) == ['alice', 'bob']
+        assert root.readtext('users/alice/a.txt') == 'a'
+
+        assert [m['name'] for m in alice.get('')['content']] == ['a.txt']
+        assert [m['name'] for m in bob.get('')['content']] == ['b.txt']
+
+    def test_isolation(self):
+        alice = _manager('users/alice')
+        _manager('users/bob').save(
+            {'type': 'file', 'format': 'text', 'content': 'b'}, 'b.txt')
+        with assertRaisesHTTPError(self, 404):
+            alice.get('../bob/b.txt')
+        with assertRaisesHTTPError(self, 404):
+            alice.get('/../../users/bob/b.txt')
@@ -0,0 +1,156 @@
+from nbformat import v4
+from nbformat.sign import (
+    MemorySignatureStore,
+    SQLiteSignatureStore,
+)
+import pytest
+from tornado.web import HTTPError
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.signing import (
+    BatchedSignatureStore,
+    TrustedDigests,
+)
+
+
+def test_trusted_digests():
+    digests = TrustedDigests(2)
+    digests.add('a')
+    digests.add('b')
+    assert 'a' in digests
+    digests.add('c')
+    # b was least recently used
+    assert 'b' not in digests
+    assert 'a' in digests
+    assert len(digests) == 2
+
+    disabled = TrustedDigests(0)
+    disabled.add('a')
+    assert 'a' not in disabled
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    store = SQLiteSignatureStore(str(tmp_path / 'nbsignatures.db'))
+    yield store
+    store.close()
+
+
+def _count(store):
+    return store.db.execute('SELECT Count(*) FROM nbsignatures').fetchone()[0]
+
+
+def test_batched_store(sqlite_store):
+    store = BatchedSignatureStore(sqlite_store)
+    store.store_signature('d1', 'sha256')
+    store.store_signature('d2', 'sha256')
+    assert store.check_signature('d1', 'sha256')
+    assert _count(sqlite_store) == 0
+    assert store.flush() == 2
+    assert _count(sqlite_store) == 2
+    assert store.flush() == 0
+
+    # Checks only read the database, the last seen time is written later
+    assert store.check_signature('d1', 'sha256')
+    assert not store.check_signature('d3', 'sha256')
+    assert len(store) == 1
+    assert store.flush() == 1
+    assert _count(sqlite_store) == 2
+
+    store.remove_signature('d1', 'sha256')
+    assert not store.check_signature('d1', 'sha256')
+    assert sqlite_store.check_signature('d2', 'sha256')
+
+
+def test_batched_store_culls(sqlite_store):
+    sqlite_store.cache_size = 4
+    store = BatchedSignatureStore(sqlite_store)
+    for n in range(6):
+        store.store_signature('d{}'.format(n), 'sha256')
+    store.flush()
+    assert _count(sqlite_store) < 6
+
+
+def test_batched_other_store():
+    memory = MemorySignatureStore()
+    store = BatchedSignatureStore(memory)
+    store.store_signature('d1', 'sha256')
+    assert not memory.check_signature('d1', 'sha256')
+    store.close()
+    assert memory.check_signature('d1', 'sha256')
+
+
+def _trusted_notebook():
+    nb = v4.new_notebook()
+    nb.cells.append(v4.new_code_cell(
+        'print(1)', outputs=[v4.new_output('display_data', {
+            'text/html': '<b>1</b>'})],
+        metadata={'trusted': True}))
+    return nb
+
+
+def _manager(**kwargs):
+    cm = FsContentsManager(fs_url='mem://', **kwargs)
+    cm.notary.store = MemorySignatureStore()
+    return cm
+
+
+def test_unchanged_notebook_not_resigned(monkeypatch):
+    cm = _manager()
+    cm.save({'type': 'notebook', 'content': _trusted_notebook()}, 'a.ipynb')
+    assert len(cm.trusted_digests) == 1
+
+    signatures = []
+    monkeypatch.setattr(cm.notary, 'compute_signature',
+                        lambda nb: signatures.append(nb))
+    model = cm.get('a.ipynb')
+    assert model['content'].cells[0].metadata.trusted
+    cm.save(model, 'a.ipynb')
+    assert signatures == []
+
+
+def test_untrusted_notebook():
+    cm = _manager()
+    nb = _trusted_notebook()
+    nb.cells[0].metadata.trusted = False
+    cm.save({'type': 'notebook', 'content': nb}, 'a.ipynb')
+    assert len(cm.trusted_digests) == 0
+    model = cm.get('a.ipynb')
+    assert not model['content'].cells[0].metadata.trusted
+
+
+def test_trusted_on_open():
+    cm = _manager()
+    cm.save({'type': 'notebook', 'content': _trusted_notebook()}, 'a.ipynb')
+    cm.trusted_digests.clear()
+    assert cm.get('a.ipynb')['content'].cells[0].metadata.trusted
+    assert len(cm.trusted_digests) == 1
+
+
+def test_cache_disabled():
+    cm = _manager(trusted_digest_cache_size=0)
+    cm.save({'type': 'notebook', 'content': _trusted_notebook()}, 'a.ipynb')
+    assert len(cm.trusted_digests) == 0
+    assert cm.get('a.ipynb')['content'].cells[0].metadata.trusted
+
+
+def test_signed_before_offload():
+    cm = _manager(blob_threshold=1)
+    cm.save({'type': 'notebook', 'content': _trusted_notebook()}, 'a.ipynb')
+    cm.trusted_digests.clear()
+    assert cm.get('a.ipynb')['content'].cells[0].metadata.trusted
+
+
+@pytest.mark.parametrize('config', [
+    {'blob_threshold': 1}, {'chunked_notebooks': True}])
+def test_modified_blob_not_trusted(config):
+    cm = _manager(**config)
+    cm.save({'type': 'notebook', 'content': _trusted_notebook()}, 'a.ipynb')
+    assert len(cm.trusted_digests) == 1
+    for path in cm.fs.walk.files(cm.blob_dir):
+        data = cm.fs.readbytes(path)
+        cm.fs.writebytes(path, data.replace(b'<b>1</b>', b'<b>2</b>'))
+    cm._cell_records.clear()
+    with pytest.raises(HTTPError) as e:
+        cm.get('a.ipynb')
+    assert e.value.status_code == 500
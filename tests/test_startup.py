@@ -0,0 +1,47 @@
+import logging
+import subprocess
+import sys
+
+from fs.opener.errors import UnsupportedProtocol
+import pytest
+
+from jupyter_pyfilesystem import FsContentsManager
+
+
+def test_open_in_background(caplog):
+    cm = FsContentsManager(fs_url='mem://', closeonexit=False,
+                           log=logging.getLogger('test_startup'))
+    with caplog.at_level(logging.INFO, 'test_startup'):
+        cm.open_in_background()
+        opening = cm._opening
+        assert opening.result(timeout=10) is cm.fs
+        assert cm.fs_handle.fsname == 'mem://'
+        # Already opening or opened
+        cm.open_in_background()
+        assert cm._opening is opening
+
+        cm.get('')
+        cm.get('')
+    messages = [r.getMessage() for r in caplog.records]
+    assert 'Verified filesystem' in messages
+    assert len([m for m in messages if m.startswith('First contents')]) == 1
+
+
+def test_open_in_background_fails():
+    cm = FsContentsManager(fs_url='unknown://', closeonexit=False)
+    cm.open_in_background()
+    with pytest.raises(UnsupportedProtocol):
+        cm._opening.result(timeout=10)
+    # Opening is retried when the filesystem is used
+    with pytest.raises(UnsupportedProtocol):
+        cm.fs
+
+
+def test_optional_features_not_imported():
+    subprocess.check_call([sys.executable, '-c', '''
+import sys
+from jupyter_pyfilesystem import FsContentsManager
+FsContentsManager(fs_url='mem://').get('')
+for name in ('bulk', 'metacache', 'overlay', 'profiling', 'search', 'tiered'):
+    assert 'jupyter_pyfilesystem.' + name not in sys.modules, name
+'''])
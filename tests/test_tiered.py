@@ -0,0 +1,195 @@
+from fs import open_fs
+import pytest
+
+import json
+import threading
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.contents import FilesystemHandle
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+from jupyter_pyfilesystem.tiered import (
+    TieredFS,
+    WRITE_BACK,
+    WRITE_THROUGH,
+)
+from . import test_pyfilesystem
+from .utils import TEST_FS_URL
+
+
+class TieredWriteThroughManagerTestCase(
+        test_pyfilesystem.FSManagerTestCase):
+
+    mode = WRITE_THROUGH
+
+    def setUp(self):
+        fs = TieredFS(open_fs(TEST_FS_URL), open_fs('mem://'), self.mode)
+        self.contents_manager = FsContentsManager()
+        self.contents_manager.fs = fs
+
+    def tearDown(self):
+        self.contents_manager.fs.close()
+
+
+class TieredWriteBackManagerTestCase(TieredWriteThroughManagerTestCase):
+
+    mode = WRITE_BACK
+
+
+@pytest.fixture
+def remote():
+    return LatencyFS(open_fs('mem://'))
+
+
+def test_read_from_cache(remote):
+    remote.writebytes('/a', b'abc')
+    fs = TieredFS(remote, open_fs('mem://'))
+    assert fs.readbytes('/a') == b'abc'
+    remote.reset_calls()
+    assert fs.readbytes('/a') == b'abc'
+    assert remote.calls['openbin'] == 0
+    assert remote.calls['getdetails'] == 1
+
+    # Changed remotely
+    remote.writebytes('/a', b'abcd')
+    assert fs.readbytes('/a') == b'abcd'
+
+
+def test_write_through(remote):
+    fs = TieredFS(remote, open_fs('mem://'), WRITE_THROUGH)
+    fs.writebytes('/a', b'abc')
+    assert remote.readbytes('/a') == b'abc'
+    remote.reset_calls()
+    assert fs.readbytes('/a') == b'abc'
+    assert remote.calls['openbin'] == 0
+
+
+def test_write_back(remote):
+    cache = open_fs('mem://')
+    fs = TieredFS(remote, cache, WRITE_BACK)
+    fs.writebytes('/a', b'abc')
+    assert not remote.exists('/a')
+    assert fs.exists('/a')
+    assert fs.getinfo('/a', ['details']).size == 3
+    assert fs.listdir('/') == ['a']
+    fs.flush()
+    assert remote.readbytes('/a') == b'abc'
+
+
+def test_write_back_recovered_on_startup(remote):
+    cache = open_fs('mem://')
+    fs = TieredFS(remote, cache, WRITE_BACK)
+    fs.writebytes('/a', b'abc')
+    # Not flushed, e.g. the server crashed
+    assert not remote.exists('/a')
+    TieredFS(remote, cache, WRITE_BACK)
+    assert remote.readbytes('/a') == b'abc'
+
+
+def test_consistency_check(remote):
+    cache = open_fs('mem://')
+    remote.writebytes('/a', b'abc')
+    remote.writebytes('/b', b'abc')
+    fs = TieredFS(remote, cache)
+    fs.readbytes('/a')
+    fs.readbytes('/b')
+    fs.close()
+    cache.writebytes('/files/a', b'corrupt')
+    cache.writebytes('/files/c', b'unknown')
+    fs = TieredFS(remote, cache)
+    assert list(fs._index) == ['/b']
+    assert not cache.exists('/files/c')
+
+
+def test_lru_eviction(remote):
+    for name in 'abc':
+        remote.writebytes('/' + name, b'x' * 10)
+    fs = TieredFS(remote, open_fs('mem://'), max_size=20)
+    fs.readbytes('/a')
+    fs.readbytes('/b')
+    fs.readbytes('/a')
+    fs.readbytes('/c')
+    assert list(fs._index) == ['/a', '/c']
+    assert fs.cache_size == 20
+
+
+def test_larger_than_cache_not_cached(remote):
+    remote.writebytes('/a', b'x' * 100)
+    fs = TieredFS(remote, open_fs('mem://'), max_size=50)
+    assert fs.readbytes('/a') == b'x' * 100
+    assert list(fs._index) == []
+    fs.appendbytes('/a', b'y')
+    assert remote.readbytes('/a') == b'x' * 100 + b'y'
+
+
+def test_pinned_not_evicted(remote):
+    for name in 'ab':
+        remote.writebytes('/' + name, b'x' * 10)
+    fs = TieredFS(remote, open_fs('mem://'), max_size=10)
+    # Cached but not opened yet
+    fs._cache_file('/a')
+    fs.readbytes('/b')
+    assert list(fs._index) == ['/a', '/b']
+    fs._unpin('/a')
+    with fs.openbin('/a') as f:
+        assert f.read() == b'x' * 10
+    assert fs._pinned == {}
+
+
+def test_concurrent_misses_download_once(remote):
+    remote.writebytes('/a', b'abc')
+    remote.latency = 0.1
+    fs = TieredFS(remote, open_fs('mem://'))
+    remote.reset_calls()
+    threads = [threading.Thread(target=fs.readbytes, args=('/a',))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert remote.calls['openbin'] == 1
+    assert fs.cache_size == 3
+
+
+def test_index_saved_in_batches(remote):
+    cache = open_fs('mem://')
+    for name in 'ab':
+        remote.writebytes('/' + name, b'x')
+    fs = TieredFS(remote, cache, index_save_interval=60)
+    fs.readbytes('/a')
+    fs.readbytes('/b')
+    assert json.loads(cache.readtext('/index.json')) == []
+    fs.close()
+    assert [p for (p, _) in json.loads(cache.readtext('/index.json'))] == [
+        '/a', '/b']
+
+    fs = TieredFS(remote, cache, WRITE_BACK, index_save_interval=60)
+    fs.writebytes('/c', b'c')
+    # Modified files are saved immediately
+    assert '/c' in dict(json.loads(cache.readtext('/index.json')))
+
+
+def test_handle_flushes_in_background():
+    handle = FilesystemHandle(
+        'mem://', create=True, writeable=True, closeonexit=False,
+        keepalive=0, cache_url='mem://', cache_mode=WRITE_BACK,
+        cache_flush_interval=60)
+    handle.fs.writetext('/a.txt', 'a')
+    handle.flush_cb.callback()
+    handle._running['flush'].result(timeout=5)
+    assert handle.pool.instances[0].readtext('/a.txt') == 'a'
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 1
+
+    running = handle.in_background('flush', slow)
+    assert started.wait(5)
+    # Not called again until the previous call finishes
+    assert handle.in_background('flush', slow) is running
+    release.set()
+    assert running.result(timeout=5) == 1
+    handle.close()
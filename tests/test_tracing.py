@@ -0,0 +1,90 @@
+from fs import open_fs
+from traitlets.config import Config
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.tracing import (
+    JsonLinesSpanExporter,
+    SpanExporter,
+)
+from .utils import (
+    populate,
+    TEST_FS_URL,
+)
+import json
+
+
+class ListSpanExporter(SpanExporter):
+    spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+def _traced_manager(exporter_class, **config):
+    c = Config()
+    c.FsContentsManager.tracing = True
+    c.FsContentsManager.trace_exporter_class = exporter_class
+    for k, v in config.items():
+        setattr(c.JsonLinesSpanExporter, k, v)
+    cm = FsContentsManager(config=c)
+    cm.fs = open_fs(TEST_FS_URL)
+    return cm
+
+
+def test_spans_nested():
+    ListSpanExporter.spans = []
+    cm = _traced_manager(ListSpanExporter)
+    populate(cm)
+    ListSpanExporter.spans = []
+
+    cm.get('foo')
+    spans = ListSpanExporter.spans
+    root = spans[-1]
+    assert root.name == 'get'
+    assert root.parent_id is None
+    assert root.attributes['path'] == 'foo'
+    names = [s.name for s in spans]
+    assert 'fs.scandir' in names
+    assert 'fs.getdetails' in names
+    assert all(s.trace_id == root.trace_id for s in spans)
+    scandir = next(s for s in spans if s.name == 'fs.scandir')
+    assert scandir.attributes['count'] == 4
+
+
+def test_read_size_attribute():
+    ListSpanExporter.spans = []
+    cm = _traced_manager(ListSpanExporter)
+    cm.save({'type': 'file', 'format': 'text', 'content': 'abc'}, 'a.txt')
+    ListSpanExporter.spans = []
+    cm.get('a.txt')
+    root = ListSpanExporter.spans[-1]
+    assert root.attributes['size'] == 3
+
+
+def test_jsonlines_exporter(tmpdir):
+    filename = str(tmpdir.join('trace.jsonl'))
+    cm = _traced_manager(JsonLinesSpanExporter, filename=filename)
+    cm.file_exists('missing.txt')
+    cm.tracer.close()
+    with open(filename) as f:
+        spans = [json.loads(line) for line in f]
+    assert [s['name'] for s in spans] == [
+        'fs.validatepath', 'fs.isfile', 'file_exists']
+    assert spans[0]['parent_id'] == spans[2]['span_id']
+
+
+def test_openbin_span_ends_on_close():
+    ListSpanExporter.spans = []
+    cm = _traced_manager(ListSpanExporter)
+    cm.save({'type': 'file', 'format': 'text', 'content': 'abc'}, 'a.txt')
+    ListSpanExporter.spans = []
+    with cm.tracer.span('read'):
+        f = cm.fs.openbin('a.txt')
+        assert 'fs.openbin' not in [s.name for s in ListSpanExporter.spans]
+        assert f.read() == b'abc'
+        f.close()
+    names = [s.name for s in ListSpanExporter.spans]
+    assert names[-2:] == ['fs.openbin', 'read']
+    openbin = ListSpanExporter.spans[-2]
+    assert openbin.attributes['bytes'] == 3
+    assert openbin.parent_id == ListSpanExporter.spans[-1].span_id
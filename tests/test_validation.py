@@ -0,0 +1,109 @@
+from nbformat import (
+    v4,
+    ValidationError,
+)
+import pytest
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.validation import (
+    compiled_validator,
+    validate_notebook,
+)
+
+
+def _notebook():
+    nb = v4.new_notebook()
+    nb.cells.append(v4.new_code_cell('print(1)'))
+    return nb
+
+
+def test_compiled_validator():
+    pytest.importorskip('fastjsonschema')
+    assert compiled_validator(4, 5).name == 'fastjsonschema'
+
+
+def test_validate_notebook():
+    nb = _notebook()
+    validate_notebook(nb)
+    nb.cells[0]['cell_type'] = 'unknown'
+    with pytest.raises(ValidationError):
+        validate_notebook(nb)
+
+
+def test_duplicate_ids_repaired():
+    nb = _notebook()
+    nb.cells.append(v4.new_code_cell('print(2)', id=nb.cells[0].id))
+    validate_notebook(nb)
+    assert nb.cells[0].id != nb.cells[1].id
+
+
+@pytest.fixture
+def validations(monkeypatch):
+    validated = []
+
+    def validate(nb):
+        validated.append(nb)
+        validate_notebook(nb)
+
+    monkeypatch.setattr(
+        'jupyter_pyfilesystem.contents.validate_notebook', validate)
+    return validated
+
+
+def _manager(**kwargs):
+    cm = FsContentsManager(fs_url='mem://', **kwargs)
+    cm.save({'type': 'notebook', 'content': _notebook()}, 'a.ipynb')
+    return cm
+
+
+def test_always(validations):
+    cm = _manager()
+    cm.get('a.ipynb')
+    cm.get('a.ipynb')
+    assert len(validations) == 3
+
+
+def test_on_change(validations):
+    cm = _manager(notebook_validation='on-change')
+    cm.get('a.ipynb')
+    assert len(validations) == 1
+
+    # Changed by another server
+    cm.fs.writetext('a.ipynb', cm.fs.readtext('a.ipynb').replace(
+        'print(1)', 'print(2)'))
+    cm.get('a.ipynb')
+    cm.get('a.ipynb')
+    assert len(validations) == 2
+
+
+def test_sampled(validations, monkeypatch):
+    cm = _manager(notebook_validation='sampled', validation_sample_rate=0.5)
+    monkeypatch.setattr('random.random', lambda: 0.6)
+    cm.get('a.ipynb')
+    assert len(validations) == 1
+    monkeypatch.setattr('random.random', lambda: 0.4)
+    cm.get('a.ipynb')
+    assert len(validations) == 2
+
+
+def test_checkpoints_not_validated(validations):
+    cm = _manager()
+    checkpoint = cm.create_checkpoint('a.ipynb')
+    del validations[:]
+    model = cm.checkpoints.get_notebook_checkpoint(
+        checkpoint['id'], 'a.ipynb')
+    assert model['content']['cells'][0]['source'] == 'print(1)'
+    assert validations == []
+    cm.restore_checkpoint(checkpoint['id'], 'a.ipynb')
+    assert len(validations) == 1
+
+
+def test_invalid_not_remembered():
+    cm = FsContentsManager(fs_url='mem://', notebook_validation='on-change')
+    nb = _notebook()
+    nb.cells[0]['cell_type'] = 'unknown'
+    cm.save({'type': 'notebook', 'content': nb}, 'a.ipynb')
+    assert len(cm.validated_digests) == 0
+    model = cm.get('a.ipynb')
+    assert model['message'].startswith('Notebook validation failed')
+    assert 'message' in cm.get('a.ipynb')
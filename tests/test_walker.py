@@ -0,0 +1,126 @@
+from fs import open_fs
+import pytest
+import time
+
+from jupyter_pyfilesystem import FsContentsManager
+from jupyter_pyfilesystem.latencyfs import LatencyFS
+from jupyter_pyfilesystem.pool import FilesystemPool
+from jupyter_pyfilesystem.scheduler import (
+    current_priority,
+    LIST,
+    priority,
+)
+from jupyter_pyfilesystem.walker import ParallelWalker
+
+
+def _tree(fs, depth=3, width=3):
+    def make(path, level):
+        fs.writetext(path + '/file.txt', 'x')
+        fs.writetext(path + '/.hidden.txt', 'x')
+        if level < depth:
+            for n in range(width):
+                child = '{}/d{}'.format(path, n)
+                fs.makedir(child)
+                make(child, level + 1)
+    make('', 0)
+    fs.makedirs('/.ipynb_checkpoints')
+    fs.writetext('/.ipynb_checkpoints/a.txt', 'x')
+    return fs
+
+
+def _serial(fs, **kwargs):
+    return sorted(fs.walk.files('/', **kwargs))
+
+
+def test_same_as_fs_walk():
+    fs = _tree(open_fs('mem://'))
+    walker = ParallelWalker(fs, workers=4)
+    assert sorted(walker.files()) == _serial(fs)
+    assert sorted(walker.dirs()) == sorted(fs.walk.dirs('/'))
+    assert sorted(walker.files('/d1')) == sorted(fs.walk.files('/d1'))
+
+
+def test_depth_and_excludes():
+    fs = _tree(open_fs('mem://'))
+    walker = ParallelWalker(fs, max_depth=1, exclude_hidden=True)
+    assert sorted(walker.files()) == [
+        '/d0/file.txt', '/d1/file.txt', '/d2/file.txt', '/file.txt']
+    walker = ParallelWalker(fs, exclude_dirs=['d1', '.ipynb*'],
+                            exclude=['*.txt'])
+    dirs = list(walker.dirs())
+    assert '/d1' not in dirs and '/d0/d1' not in dirs
+    assert '/.ipynb_checkpoints' not in dirs
+    assert list(walker.files()) == []
+
+
+def test_errors():
+    fs = open_fs('mem://')
+    with pytest.raises(Exception):
+        list(ParallelWalker(fs).walk('/missing'))
+    assert list(ParallelWalker(fs, ignore_errors=True).walk('/missing')) == []
+
+
+def test_streaming_and_concurrent():
+    fs = LatencyFS(_tree(open_fs('mem://'), depth=2, width=8),
+                   latency=0.05)
+    walker = ParallelWalker(fs, workers=8, exclude_hidden=True)
+    start = time.perf_counter()
+    walk = walker.walk()
+    first = next(walk)
+    assert first[0] == '/'
+    assert time.perf_counter() - start < 0.5
+    rest = list(walk)
+    # 73 directories listed in 3 levels of concurrent listings
+    assert len(rest) == 72
+    assert time.perf_counter() - start < 1.5
+
+
+def test_stop_early():
+    fs = _tree(open_fs('mem://'))
+    walk = ParallelWalker(fs, workers=2).walk()
+    next(walk)
+    walk.close()
+
+
+def test_pool():
+    instances = [_tree(open_fs('mem://')) for _ in range(2)]
+    pool = FilesystemPool(instances)
+    walker = ParallelWalker(pool, workers=2)
+    assert sorted(walker.files()) == _serial(instances[0])
+
+
+def test_priority():
+    fs = _tree(open_fs('mem://'), depth=1)
+    levels = set()
+    scandir = fs.scandir
+
+    def recorded(*args, **kwargs):
+        levels.add(current_priority())
+        return scandir(*args, **kwargs)
+
+    fs.scandir = recorded
+    with priority(LIST):
+        list(ParallelWalker(fs, workers=2).walk())
+    assert levels == {LIST}
+
+
+def test_manager_pool(tmpdir):
+    tmpdir.mkdir('sub')
+    _tree(open_fs(str(tmpdir.join('sub'))), depth=1)
+    cm = FsContentsManager(
+        fs_url='osfs://' + str(tmpdir), fs_subpath='sub', pool_size=2)
+    walker = cm.walker()
+    assert isinstance(walker.fs, FilesystemPool)
+    assert len(walker.fs) == 2
+    assert sorted(walker.files()) == [
+        '/d0/file.txt', '/d1/file.txt', '/d2/file.txt', '/file.txt']
+
+
+def test_manager_walker():
+    cm = FsContentsManager()
+    cm.fs = _tree(open_fs('mem://'), depth=1)
+    assert sorted(cm.walker().files()) == [
+        '/d0/file.txt', '/d1/file.txt', '/d2/file.txt', '/file.txt']
+    cm.allow_hidden = True
+    assert '/.hidden.txt' in set(cm.walker().files())
+    assert '/.ipynb_checkpoints/a.txt' not in set(cm.walker().files())